@@ -0,0 +1,175 @@
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+ACCIDENTS_DIR = Path("data/staged/accidents")
+# Area kept from the nationwide files: (min_lon, min_lat, max_lon, max_lat) around Düsseldorf
+BBOX = (6.68, 51.12, 6.94, 51.35)
+# Accidents this far outside the area are kept too, so stops at its edge still see every
+# accident within the risk radius of int_network_risk
+MARGIN_M = 1000
+BLOCK_SIZE = 16 << 20
+
+# Output column -> Unfallatlas column names (they differ between years and upper/lower case)
+COLUMNS = {
+    "month": ["UMONAT"],
+    "hour": ["USTUNDE"],
+    "weekday": ["UWOCHENTAG", "WOCHENTAG"],
+    "category": ["UKATEGORIE"],
+    "lon": ["XGCSWGS84"],
+    "lat": ["YGCSWGS84"],
+}
+SCHEMA = pa.schema([
+    ("month", pa.int8()), ("hour", pa.int8()), ("weekday", pa.int8()), ("category", pa.int8()),
+    ("lon", pa.float64()), ("lat", pa.float64()),
+])
+
+
+class AreaFilter:
+    """Bounding box, optionally refined by a polygon (GeoJSON geometry in lon/lat), plus a margin in metres."""
+
+    def __init__(self, bbox: Tuple[float, float, float, float] = BBOX, polygon: Optional[dict] = None,
+                 margin_m: float = MARGIN_M):
+        self.polygon = None
+        if polygon is not None:
+            import shapely
+            from shapely.geometry import shape
+
+            geometry = shape(polygon)
+            if margin_m:
+                # Degrees of latitude as the unit: approximate, but only widens the area
+                geometry = geometry.buffer(margin_m / 111195.0 / math.cos(math.radians(geometry.centroid.y)))
+            shapely.prepare(geometry)
+            self.polygon = geometry
+            bbox = geometry.bounds
+            margin_m = 0
+
+        min_lon, min_lat, max_lon, max_lat = bbox
+        dlat = margin_m / 111195.0
+        dlon = dlat / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+        self.bbox = (min_lon - dlon, min_lat - dlat, max_lon + dlon, max_lat + dlat)
+
+    def mask(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        inside = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        if self.polygon is not None and inside.any():
+            import shapely
+
+            idx = np.flatnonzero(inside)
+            inside[idx] = shapely.contains_xy(self.polygon, lon[idx], lat[idx])
+        return inside
+
+
+def _number(column: pa.Array, type_: pa.DataType) -> pa.Array:
+    # German CSVs write decimals with a comma
+    column = pc.replace_substring(pc.utf8_trim_whitespace(column), ",", ".")
+    column = pc.if_else(pc.equal(column, ""), pa.scalar(None, pa.string()), column)
+    return pc.cast(column, pa.float64() if pa.types.is_floating(type_) else type_)
+
+
+def read_header(stream) -> Tuple[list, str]:
+    """Column names and delimiter (";" in the Unfallatlas files) from the first line."""
+    line = stream.readline().decode("utf-8-sig", errors="replace")
+    delimiter = ";" if line.count(";") > line.count(",") else ","
+    return next(csv.reader(io.StringIO(line), delimiter=delimiter)), delimiter
+
+
+def convert_year(stream, header: list, delimiter: str, year: int, area: AreaFilter,
+                 output_dir: Path = ACCIDENTS_DIR) -> Tuple[int, int]:
+    """
+    Stream one year's accident CSV and write the rows inside `area` to
+    <output_dir>/year=<year>/accidents.parquet; returns (rows read, rows kept).
+    """
+    by_upper = {name.strip().upper(): name for name in header}
+    source = {}
+    for column, candidates in COLUMNS.items():
+        found = [by_upper[c] for c in candidates if c in by_upper]
+        if not found:
+            raise ValueError(f"Accident file for {year} has no {' or '.join(candidates)} column")
+        source[column] = found[0]
+
+    # Only the needed columns are parsed, the rest of each (wide) row is skipped
+    reader = pv.open_csv(
+        stream,
+        read_options=pv.ReadOptions(block_size=BLOCK_SIZE, column_names=header, skip_rows=1),
+        parse_options=pv.ParseOptions(delimiter=delimiter),
+        convert_options=pv.ConvertOptions(
+            include_columns=list(source.values()),
+            column_types={name: pa.string() for name in source.values()},
+            strings_can_be_null=True,
+        ),
+    )
+    batches, total = [], 0
+    for batch in reader:
+        total += batch.num_rows
+        columns = [_number(batch.column(source[f.name]), f.type) for f in SCHEMA]
+        lon, lat = columns[4].to_numpy(zero_copy_only=False), columns[5].to_numpy(zero_copy_only=False)
+        keep = pa.array(area.mask(np.nan_to_num(lon, nan=1e9), np.nan_to_num(lat, nan=1e9)))
+        columns = [pc.filter(c, keep) for c in columns]
+        batches.append(pa.RecordBatch.from_arrays(columns, schema=SCHEMA))
+
+    table = pa.Table.from_batches(batches, schema=SCHEMA).sort_by([("lat", "ascending"), ("lon", "ascending")])
+    partition = Path(output_dir) / f"year={year}"
+    partition.mkdir(parents=True, exist_ok=True)
+    tmp = partition / ".accidents.parquet.tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, partition / "accidents.parquet")
+    return total, table.num_rows
+
+
+def convert_archive(zip_path: Path, year: int, area: Optional[AreaFilter] = None,
+                    output_dir: Path = ACCIDENTS_DIR) -> Tuple[int, int]:
+    """Filter the accident CSV inside an Unfallatlas zip into the store, without extracting it."""
+    area = area or AreaFilter()
+    start = time.perf_counter()
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [n for n in archive.namelist()
+                   if n.lower().endswith((".csv", ".txt")) and not Path(n).name.startswith(".")]
+        if not members:
+            raise ValueError(f"No CSV in {zip_path}")
+        # The archives may carry a readme next to the data, which is by far the largest member
+        member = max(members, key=lambda n: archive.getinfo(n).file_size)
+        with archive.open(member) as stream:
+            header, delimiter = read_header(stream)
+        with archive.open(member) as stream:
+            total, kept = convert_year(stream, header, delimiter, year, area, output_dir)
+    print(f"Accidents {year}: kept {kept} of {total} rows in {time.perf_counter() - start:.1f}s")
+    return total, kept
+
+
+def load_polygon(path: str) -> dict:
+    """Geometry of a GeoJSON file (Feature, FeatureCollection with one feature, or bare geometry)."""
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("type") == "FeatureCollection":
+        data = data["features"][0]
+    return data.get("geometry", data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filter Unfallatlas archives into the year-partitioned accident store")
+    parser.add_argument("archives", nargs="+", help="Unfallorte<year>*.zip files (year is read from the name)")
+    parser.add_argument("--bbox", type=float, nargs=4, default=BBOX, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"))
+    parser.add_argument("--polygon", default=None, help="GeoJSON file with the area to keep instead of the bbox")
+    parser.add_argument("--margin-m", type=float, default=MARGIN_M)
+    parser.add_argument("--output", default=str(ACCIDENTS_DIR))
+    args = parser.parse_args()
+
+    area = AreaFilter(tuple(args.bbox), load_polygon(args.polygon) if args.polygon else None, args.margin_m)
+    for archive_path in args.archives:
+        digits = "".join(c if c.isdigit() else " " for c in Path(archive_path).name).split()
+        year = next(int(d) for d in digits if len(d) == 4)
+        convert_archive(Path(archive_path), year, area, Path(args.output))
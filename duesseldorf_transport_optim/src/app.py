@@ -1,6 +1,11 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from router import router
+import argparse
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Literal, Optional
+import numpy as np
+from router import GraphNotLoaded, router
 import uvicorn
 
 app = FastAPI(title="Düsseldorf Public Transport Optimizer")
@@ -12,15 +17,67 @@ class GeoPoint(BaseModel):
 class RouteRequest(BaseModel):
     start: GeoPoint
     destination: GeoPoint
-    # time: str  # Not used in this static version yet
+    # With a departure time the route is planned on the timetable (earliest arrival),
+    # without one on the static risk-weighted graph
+    departure_time: Optional[datetime] = None
+    # False: static graph with the risk of the departure hour instead of the timetable
+    use_timetable: bool = True
+
+class AlternativesRequest(BaseModel):
+    start: GeoPoint
+    destination: GeoPoint
+    # Weights risk for this hour of the week instead of the all-day score
+    departure_time: Optional[datetime] = None
+    max_routes: int = Field(8, ge=2, le=32)
+
+class MatrixRequest(BaseModel):
+    origins: List[GeoPoint]
+    destinations: List[GeoPoint]
+    # Points further than this from any stop get empty rows/columns
+    max_snap_distance_m: Optional[float] = None
+    # Weights risk for this hour of the week instead of the all-day score
+    departure_time: Optional[datetime] = None
+    format: Literal["json", "arrow"] = "json"
 
 @app.on_event("startup")
 def startup_event():
-    router.load_graph()
+    try:
+        router.load_graph()
+    except Exception as e:
+        # Requests get 503 until the watcher manages to load the graph
+        print(f"Graph load failed, retrying in the background: {e}")
+    # Picks up new dbt outputs without a restart
+    router.start_watcher()
+
+@app.exception_handler(GraphNotLoaded)
+def graph_not_loaded(request, exc: GraphNotLoaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+@app.on_event("shutdown")
+def shutdown_event():
+    router.stop_watcher()
+    router.matrix_pool.shutdown()
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "nodes_loaded": len(router.stops)}
+    version = router.version
+    return {
+        "status": "ok",
+        "nodes_loaded": len(router.stops),
+        "graph_fingerprint": version.fingerprint if version else None
+    }
+
+@app.post("/admin/reload")
+def reload_graph(rebuild: bool = False):
+    """
+    Load the graph for the current dbt outputs and swap it in; requests keep being served by
+    the previous graph meanwhile. Without `rebuild` an unchanged database is a no-op and an
+    existing snapshot is reused. Reports the build time.
+    """
+    try:
+        return router.load_graph(rebuild=rebuild, if_changed=not rebuild)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving the previous graph: {e}")
 
 @app.post("/route")
 def get_optimal_route(request: RouteRequest):
@@ -28,18 +85,121 @@ def get_optimal_route(request: RouteRequest):
     Find optimal route avoiding accident hotspots.
     """
     try:
-        route = router.get_route(
-            request.start.lat, request.start.lon,
-            request.destination.lat, request.destination.lon
-        )
+        if request.departure_time is not None and request.use_timetable:
+            route = router.get_journey(
+                request.start.lat, request.start.lon,
+                request.destination.lat, request.destination.lon,
+                request.departure_time
+            )
+        else:
+            route = router.get_route(
+                request.start.lat, request.start.lon,
+                request.destination.lat, request.destination.lon,
+                departure=request.departure_time
+            )
 
         if not route:
             raise HTTPException(status_code=404, detail="No route found or stops too far.")
 
         return route
 
+    except (HTTPException, GraphNotLoaded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/route/alternatives")
+def get_route_alternatives(request: AlternativesRequest):
+    """
+    Pareto-optimal routes from fastest to safest: each one is faster or less risky than
+    every other.
+    """
+    result = router.get_route_alternatives(
+        request.start.lat, request.start.lon,
+        request.destination.lat, request.destination.lon,
+        request.departure_time, request.max_routes
+    )
+    if not result:
+        raise HTTPException(status_code=404, detail="No route found or stops too far.")
+    return result
+
+def _matrix_arrow(result):
+    """Long-format Arrow IPC stream: one row per origin/destination pair, nulls where unreachable."""
+    import pyarrow as pa
+
+    n_origins, n_destinations = result["duration_minutes"].shape
+    stop_id = lambda point: point["stop_id"] if point else None
+    table = pa.table({
+        "origin": np.repeat(np.arange(n_origins), n_destinations),
+        "destination": np.tile(np.arange(n_destinations), n_origins),
+        "origin_stop_id": pa.array([stop_id(p) for p in result["origins"]]).take(np.repeat(np.arange(n_origins), n_destinations)),
+        "destination_stop_id": pa.array([stop_id(p) for p in result["destinations"]]).take(np.tile(np.arange(n_destinations), n_origins)),
+        "duration_minutes": pa.array(result["duration_minutes"].ravel(), from_pandas=True),
+        "risk": pa.array(result["risk"].ravel(), from_pandas=True),
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(sink.getvalue().to_pybytes(), media_type="application/vnd.apache.arrow.stream")
+
+@app.post("/matrix")
+def get_matrix(request: MatrixRequest):
+    """
+    Travel-time (minutes) and accumulated-risk matrices from every origin to every destination.
+    """
+    if not request.origins or not request.destinations:
+        raise HTTPException(status_code=400, detail="origins and destinations must not be empty")
+
+    result = router.get_matrix(
+        [(p.lat, p.lon) for p in request.origins],
+        [(p.lat, p.lon) for p in request.destinations],
+        request.max_snap_distance_m,
+        request.departure_time
+    )
+    if request.format == "arrow":
+        return _matrix_arrow(result)
+
+    def rows(matrix):
+        # NaN (unreachable) -> null; rounded to keep the payload compact
+        return [[None if np.isnan(v) else round(v, 2) for v in row] for row in matrix.tolist()]
+
+    return {
+        "origins": result["origins"],
+        "destinations": result["destinations"],
+        "duration_minutes": rows(result["duration_minutes"]),
+        "risk": rows(result["risk"])
+    }
+
+@app.get("/isochrone")
+def get_isochrone(
+    lat: float,
+    lon: float,
+    minutes: float = Query(..., gt=0, le=240),
+    departure_time: Optional[datetime] = None,
+    hull: Optional[Literal["convex", "concave"]] = None,
+    concave_ratio: float = Query(0.3, ge=0, le=1),
+    max_snap_distance_m: Optional[float] = None
+):
+    """
+    Stops reachable within `minutes`, with arrival offset and accumulated risk, optionally
+    with the hull polygon around them.
+    """
+    result = router.get_isochrone(lat, lon, minutes, departure_time, hull, concave_ratio, max_snap_distance_m)
+    if not result:
+        raise HTTPException(status_code=404, detail="No stop near the given point.")
+    return result
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8002)
+    parser = argparse.ArgumentParser(description="Run the routing API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes serving requests")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Build the snapshot once up front; each worker only memory-maps it, so the graph,
+        # stop table and spatial index are in memory once however many workers run
+        router.build_snapshot()
+        uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,152 @@
+import argparse
+import json
+import math
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from contraction import contract
+from graph_snapshot import build_graph
+from pathfinding import ShortestPathEngine, haversine_m
+
+# Bounding box of Düsseldorf, the synthetic stops are spread over it
+LAT_RANGE = (51.12, 51.35)
+LON_RANGE = (6.68, 6.94)
+DWELL_SEC = 30
+
+
+def synthetic_network(n_stops: int, seed: int = 42):
+    """
+    City-sized stop graph: a jittered grid whose rows and columns are bidirectional lines
+    with their own speeds, plus a few fast cross-town links. Returns (stops_df, segments_df)
+    in the shape TransportRouter reads from DuckDB.
+    """
+    rng = np.random.default_rng(seed)
+    side = math.ceil(math.sqrt(n_stops))
+    rows, cols = np.divmod(np.arange(side * side), side)
+    lat = LAT_RANGE[0] + (rows + rng.uniform(-0.3, 0.3, rows.size)) * (LAT_RANGE[1] - LAT_RANGE[0]) / side
+    lon = LON_RANGE[0] + (cols + rng.uniform(-0.3, 0.3, cols.size)) * (LON_RANGE[1] - LON_RANGE[0]) / side
+    stop_ids = np.array([f"S{i}" for i in range(side * side)])
+
+    stops_df = pd.DataFrame({
+        "stop_id": stop_ids,
+        "stop_name": [f"Stop {i}" for i in range(side * side)],
+        "stop_lat": lat,
+        "stop_lon": lon,
+        "risk_score": rng.exponential(1.0, side * side).round(2),
+    })
+
+    grid = np.arange(side * side).reshape(side, side)
+    links = [
+        (grid[:, :-1].ravel(), grid[:, 1:].ravel(), np.repeat(np.arange(side), side - 1)),  # east-west lines
+        (grid[:-1, :].ravel(), grid[1:, :].ravel(), side + np.tile(np.arange(side), side - 1)),  # north-south lines
+    ]
+    n_express = max(1, side * side // 50)
+    a, b = rng.integers(0, side * side, n_express), rng.integers(0, side * side, n_express)
+    links.append((a, b, np.full(n_express, 2 * side)))
+
+    u = np.concatenate([l[0] for l in links])
+    v = np.concatenate([l[1] for l in links])
+    line = np.concatenate([l[2] for l in links])
+    speed = rng.uniform(6.0, 15.0, 2 * side + 1)[line]  # m/s per line
+    speed[line == 2 * side] = 25.0
+    duration = (haversine_m(lat[u], lon[u], lat[v], lon[v]) / speed + DWELL_SEC).round()
+
+    keep = u != v
+    segments_df = pd.DataFrame({
+        "from_stop": np.concatenate([stop_ids[u[keep]], stop_ids[v[keep]]]),
+        "to_stop": np.concatenate([stop_ids[v[keep]], stop_ids[u[keep]]]),
+        "avg_duration": np.tile(duration[keep], 2),
+        "route_id": np.tile([f"L{k}" for k in line[keep]], 2),
+    }).drop_duplicates(["from_stop", "to_stop"])
+
+    return stops_df, segments_df
+
+
+def to_networkx(graph):
+    """The DiGraph the router used before the array engine, for comparison."""
+    G = nx.DiGraph()
+    G.add_nodes_from(range(graph.n_stops))
+    G.add_weighted_edges_from(zip(graph.edge_sources().tolist(), graph.indices.tolist(), graph.weight.tolist()))
+    return G
+
+
+def summarize(latencies):
+    ms = np.array(latencies) * 1000
+    return {"mean_ms": float(ms.mean()), "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99))}
+
+
+def run(n_stops: int, n_queries: int, seed: int = 42, with_ch: bool = False):
+    stops_df, segments_df = synthetic_network(n_stops, seed)
+    start = time.perf_counter()
+    graph = build_graph(stops_df, segments_df)
+    build_sec = time.perf_counter() - start
+    print(f"Synthetic network: {graph.n_stops} stops, {graph.n_edges} segments (built in {build_sec:.3f}s)")
+
+    engine = ShortestPathEngine(graph)
+    algorithms = ["bidirectional", "astar"]
+    ch, contract_sec = None, None
+    if with_ch:
+        start = time.perf_counter()
+        ch = contract(graph)
+        contract_sec = time.perf_counter() - start
+        algorithms.append("ch")
+        print(f"Contraction hierarchy: {ch.n_shortcuts} shortcuts in {contract_sec:.1f}s")
+    G = to_networkx(graph)
+    weight = np.asarray(graph.weight)
+
+    rng = np.random.default_rng(seed + 1)
+    pairs = rng.integers(0, graph.n_stops, size=(n_queries, 2)).tolist()
+
+    latencies = {name: [] for name in ["networkx"] + algorithms}
+    for source, target in pairs:
+        t0 = time.perf_counter()
+        try:
+            reference = nx.shortest_path_length(G, source, target, weight="weight")
+        except nx.NetworkXNoPath:
+            reference = None
+        latencies["networkx"].append(time.perf_counter() - t0)
+
+        for algorithm in algorithms:
+            t0 = time.perf_counter()
+            path = ch.shortest_path(source, target) if algorithm == "ch" else engine.shortest_path(source, target, algorithm)
+            latencies[algorithm].append(time.perf_counter() - t0)
+
+            # Paths must be connected sequences of graph edges
+            if path and any(engine.edge_endpoints(a)[1] != engine.edge_endpoints(b)[0] for a, b in zip(path, path[1:])):
+                raise AssertionError(f"{algorithm} returned a broken path for {source}->{target}")
+
+            cost = None if path is None else float(weight[path].sum())
+            if (cost is None) != (reference is None) or (cost is not None and not math.isclose(cost, reference, rel_tol=1e-9, abs_tol=1e-6)):
+                raise AssertionError(f"{algorithm} disagrees with NetworkX for {source}->{target}: {cost} vs {reference}")
+
+    report = {
+        "n_stops": graph.n_stops, "n_edges": graph.n_edges, "n_queries": n_queries,
+        "ch_shortcuts": ch.n_shortcuts if ch else None, "ch_contract_sec": contract_sec, "results": {}
+    }
+    baseline = np.mean(latencies["networkx"])
+    for name, values in latencies.items():
+        report["results"][name] = {**summarize(values), "speedup": float(baseline / np.mean(values))}
+        r = report["results"][name]
+        print(f"{name:>13}: mean {r['mean_ms']:.2f}ms, p50 {r['p50_ms']:.2f}ms, p95 {r['p95_ms']:.2f}ms, "
+              f"{r['speedup']:.1f}x vs NetworkX")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the array routing engine against NetworkX on a synthetic network")
+    parser.add_argument("--stops", type=int, default=20000, help="Approximate number of stops")
+    parser.add_argument("--queries", type=int, default=200, help="Random origin/destination pairs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ch", action="store_true", help="Also contract the network and benchmark CH queries (slow to build)")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    report = run(args.stops, args.queries, args.seed, args.ch)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {args.output}")
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from benchmark import summarize
+from generate_mock_data import BBOX, generate_synthetic
+from router import TransportRouter
+
+TRANSFORM_DIR = Path(__file__).resolve().parent.parent / "transform"
+# Generator parameters per scale: lines, stops per line, weekday trips per line and direction,
+# accidents per year
+SCALES = {
+    "small": {"n_lines": 20, "stops_per_line": 20, "trips_per_day": 40, "n_accidents": 5_000},
+    "medium": {"n_lines": 80, "stops_per_line": 30, "trips_per_day": 80, "n_accidents": 50_000},
+    "large": {"n_lines": 250, "stops_per_line": 40, "trips_per_day": 120, "n_accidents": 200_000},
+}
+
+
+def run_dbt(workdir: Path):
+    """`dbt run` on a copy of the project, so its ../data paths point into `workdir`."""
+    project = workdir / "transform"
+    shutil.copytree(TRANSFORM_DIR, project, ignore=shutil.ignore_patterns("target", "logs", "dbt_packages"))
+    (workdir / "data" / "processed").mkdir(parents=True, exist_ok=True)
+    dbt = Path(sys.executable).with_name("dbt")
+    result = subprocess.run([str(dbt) if dbt.exists() else "dbt", "run", "--profiles-dir", "."],
+                            cwd=project, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"dbt run failed:\n{result.stdout[-2000:]}")
+
+
+def random_points(rng, n: int):
+    min_lon, min_lat, max_lon, max_lat = BBOX
+    return np.column_stack([rng.uniform(min_lat, max_lat, n), rng.uniform(min_lon, max_lon, n)])
+
+
+def timed(fn, args_list):
+    latencies, results = [], []
+    for args in args_list:
+        t0 = time.perf_counter()
+        results.append(fn(*args))
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies), results
+
+
+def run_scale(name: str, params: dict, workdir: Path, n_queries: int, seed: int = 42) -> dict:
+    """
+    Generate one scale's data into `workdir`, build the warehouse and time the router on it:
+    graph loading from the database and from the snapshot, stop snapping, static routes and
+    timetable journeys between random points.
+    """
+    print(f"=== {name}: {params}")
+    workdir.mkdir(parents=True)
+    cwd = os.getcwd()
+    # The generator, dbt and the router all use paths relative to the project root
+    os.chdir(workdir)
+    try:
+        start = time.perf_counter()
+        sizes = generate_synthetic(**params, seed=seed)
+        generate_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_dbt(workdir)
+        dbt_sec = time.perf_counter() - start
+
+        cold = TransportRouter().load_graph(rebuild=True)
+        router = TransportRouter()
+        warm = router.load_graph()
+
+        rng = np.random.default_rng(seed + 3)
+        points = random_points(rng, n_queries)
+        pairs = [(*a, *b) for a, b in zip(random_points(rng, n_queries), random_points(rng, n_queries))]
+        # A weekday morning inside the generated calendar
+        today = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+        departure = today + timedelta(days=(7 - today.weekday()) % 7)
+
+        nearest, _ = timed(router.find_nearest_stop, points.tolist())
+        route, routes = timed(router.get_route, pairs)
+        journey, journeys = timed(router.get_journey, [(*pair, departure) for pair in pairs])
+    finally:
+        os.chdir(cwd)
+
+    report = {
+        "scale": name, "params": params, **sizes,
+        "n_segments": cold["n_segments"], "n_connections": cold["n_connections"], "n_queries": n_queries,
+        "generate_sec": generate_sec, "dbt_sec": dbt_sec,
+        "load_graph_database_sec": cold["build_sec"], "load_graph_snapshot_sec": warm["build_sec"],
+        "find_nearest_stop": nearest,
+        "get_route": {**route, "found": sum(r is not None for r in routes)},
+        "get_journey": {**journey, "found": sum(j is not None for j in journeys)},
+    }
+    print(f"{name}: {report['stops']} stops, {report['n_segments']} segments, {report['n_connections']} connections; "
+          f"load_graph {report['load_graph_database_sec']:.2f}s from the database, "
+          f"{report['load_graph_snapshot_sec']:.3f}s from the snapshot")
+    for query in ["find_nearest_stop", "get_route", "get_journey"]:
+        r = report[query]
+        print(f"{query:>17}: p50 {r['p50_ms']:.2f}ms, p99 {r['p99_ms']:.2f}ms" +
+              (f" ({r['found']}/{n_queries} found)" if "found" in r else ""))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark graph loading, stop snapping and routing on synthetic cities of several sizes")
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES))
+    parser.add_argument("--queries", type=int, default=200, help="Random points / origin-destination pairs per scale")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="Keep the generated data here instead of a temporary directory")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    base = Path(args.workdir).resolve() if args.workdir else Path(tempfile.mkdtemp(prefix="transport-bench-"))
+    try:
+        reports = [run_scale(scale, SCALES[scale], base / scale, args.queries, args.seed) for scale in args.scales]
+    finally:
+        if not args.workdir:
+            shutil.rmtree(base, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Saved report to {args.output}")
@@ -0,0 +1,276 @@
+import argparse
+import heapq
+import math
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from graph_snapshot import TransportGraph, save_component
+
+COMPONENT = "ch"
+# Witness searches give up after settling this many nodes and add the shortcut instead;
+# that only costs a few superfluous shortcuts, never a wrong distance
+WITNESS_SETTLE_LIMIT = 200
+
+ARRAY_NAMES = [
+    "rank", "edge_src", "edge_dst", "edge_weight", "edge_child1", "edge_child2",
+    "up_indptr", "up_edges", "down_indptr", "down_edges",
+]
+
+
+def _view(array):
+    return memoryview(np.ascontiguousarray(array))
+
+
+class ContractionHierarchy:
+    """
+    Query side of a contraction hierarchy over the risk-weighted stop graph.
+
+    Edges 0..n_edges-1 are the graph's CSR edges; later edges are shortcuts u->x replacing
+    the two edges (edge_child1, edge_child2) through a contracted stop. up_* lists, per stop,
+    the edges to higher-ranked stops; down_* the edges arriving from higher-ranked stops.
+    """
+
+    def __init__(self, arrays: dict):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self._src = _view(self.edge_src)
+        self._dst = _view(self.edge_dst)
+        self._weight = _view(self.edge_weight)
+        self._child1 = _view(self.edge_child1)
+        self._child2 = _view(self.edge_child2)
+        self._up = (_view(self.up_indptr), _view(self.up_edges))
+        self._down = (_view(self.down_indptr), _view(self.down_edges))
+
+    @property
+    def n_shortcuts(self) -> int:
+        return int(np.count_nonzero(np.asarray(self.edge_child1) >= 0))
+
+    def arrays(self) -> dict:
+        return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+    def shortest_path(self, source: int, target: int) -> Optional[List[int]]:
+        """Graph edge ids of a minimum-weight path (shortcuts unpacked), or None if unreachable."""
+        if source == target:
+            return []
+
+        weight = self._weight
+        # side 0 climbs upward edges from source, side 1 climbs reversed downward edges from target
+        sides = ((self._up, self._dst), (self._down, self._src))
+        dist = ({source: 0.0}, {target: 0.0})
+        pred = ({source: -1}, {target: -1})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meeting = math.inf, -1
+
+        # Unlike plain bidirectional Dijkstra the searches may not stop when they meet,
+        # only once neither frontier can still beat the best meeting point
+        while (heaps[0] and heaps[0][0][0] < best) or (heaps[1] and heaps[1][0][0] < best):
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            d, u = heapq.heappop(heaps[side])
+            dist_s = dist[side]
+            if d > dist_s[u]:
+                continue
+            if d >= best:
+                heaps[side].clear()
+                continue
+            if u in dist[1 - side] and d + dist[1 - side][u] < best:
+                best, meeting = d + dist[1 - side][u], u
+
+            (indptr, edges), heads = sides[side]
+            pred_s, heap = pred[side], heaps[side]
+            for i in range(indptr[u], indptr[u + 1]):
+                e = edges[i]
+                v = heads[e]
+                nd = d + weight[e]
+                if nd < dist_s.get(v, math.inf):
+                    dist_s[v] = nd
+                    pred_s[v] = e
+                    heapq.heappush(heap, (nd, v))
+
+        if meeting < 0:
+            return None
+
+        up_path = []
+        node = meeting
+        while pred[0][node] >= 0:
+            e = pred[0][node]
+            up_path.append(e)
+            node = self._src[e]
+        up_path.reverse()
+        node = meeting
+        while pred[1][node] >= 0:
+            e = pred[1][node]
+            up_path.append(e)
+            node = self._dst[e]
+
+        path = []
+        for e in up_path:
+            self._unpack(e, path)
+        return path
+
+    def _unpack(self, e: int, path: List[int]):
+        """Append the graph edges that shortcut `e` stands for, in travel order."""
+        stack = [e]
+        while stack:
+            e = stack.pop()
+            if self._child1[e] < 0:
+                path.append(e)
+            else:
+                stack.append(self._child2[e])
+                stack.append(self._child1[e])
+
+
+def contract(graph: TransportGraph, witness_limit: int = WITNESS_SETTLE_LIMIT) -> ContractionHierarchy:
+    """
+    Contract every stop in order of edge difference + deleted neighbours + level (updated
+    for the neighbours of each contracted stop, re-checked when popped), adding a shortcut
+    u->x through the contracted stop v unless a local witness search finds a path u->x
+    avoiding v that is no longer.
+    """
+    n = graph.n_stops
+    edge_src = graph.edge_sources().tolist()
+    edge_dst = np.asarray(graph.indices).tolist()
+    edge_weight = np.asarray(graph.weight).tolist()
+    edge_child1 = [-1] * len(edge_weight)
+    edge_child2 = [-1] * len(edge_weight)
+
+    # Remaining (uncontracted) graph: cheapest edge id per stop pair in both directions
+    out = [dict() for _ in range(n)]
+    inn = [dict() for _ in range(n)]
+    for e, (u, v, w) in enumerate(zip(edge_src, edge_dst, edge_weight)):
+        if u != v and (v not in out[u] or w < edge_weight[out[u][v]]):
+            out[u][v] = e
+            inn[v][u] = e
+
+    def witness_distances(source, skip, max_cost, targets):
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        remaining = len(targets)
+        while heap and settled < witness_limit:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if d > max_cost:
+                break
+            settled += 1
+            if u in targets:
+                remaining -= 1
+                if remaining == 0:
+                    break
+            for x, e in out[u].items():
+                if x == skip:
+                    continue
+                nd = d + edge_weight[e]
+                if nd < dist.get(x, math.inf):
+                    dist[x] = nd
+                    heapq.heappush(heap, (nd, x))
+        return dist
+
+    def shortcuts(v):
+        needed = []
+        for u, e1 in inn[v].items():
+            outs = [(x, e2) for x, e2 in out[v].items() if x != u]
+            if not outs:
+                continue
+            w1 = edge_weight[e1]
+            dist = witness_distances(u, v, w1 + max(edge_weight[e2] for _, e2 in outs), {x for x, _ in outs})
+            for x, e2 in outs:
+                cost = w1 + edge_weight[e2]
+                if dist.get(x, math.inf) > cost:
+                    needed.append((u, x, cost, e1, e2))
+        return needed
+
+    deleted_neighbours = [0] * n
+    level = [0] * n
+
+    def priority(v):
+        needed = shortcuts(v)
+        return len(needed) - len(inn[v]) - len(out[v]) + deleted_neighbours[v] + level[v], needed
+
+    current = [priority(v)[0] for v in range(n)]
+    heap = [(p, v) for v, p in enumerate(current)]
+    heapq.heapify(heap)
+    contracted = [False] * n
+    rank = np.zeros(n, dtype=np.int32)
+    order = 0
+
+    while heap:
+        p, v = heapq.heappop(heap)
+        if contracted[v] or p != current[v]:
+            continue  # superseded entry
+        p, needed = priority(v)
+        if heap and p > heap[0][0]:
+            current[v] = p
+            heapq.heappush(heap, (p, v))
+            continue
+
+        for u, x, cost, e1, e2 in needed:
+            e = len(edge_weight)
+            edge_src.append(u)
+            edge_dst.append(x)
+            edge_weight.append(cost)
+            edge_child1.append(e1)
+            edge_child2.append(e2)
+            if x not in out[u] or cost < edge_weight[out[u][x]]:
+                out[u][x] = e
+                inn[x][u] = e
+        neighbours = set(inn[v]) | set(out[v])
+        for u in inn[v]:
+            del out[u][v]
+        for x in out[v]:
+            del inn[x][v]
+        out[v], inn[v] = {}, {}
+        contracted[v] = True
+        rank[v] = order
+        order += 1
+
+        # Contracting v changes the cost of contracting its neighbours
+        for u in neighbours:
+            deleted_neighbours[u] += 1
+            level[u] = max(level[u], level[v] + 1)
+            current[u] = priority(u)[0]
+            heapq.heappush(heap, (current[u], u))
+
+    edge_src = np.asarray(edge_src, dtype=np.int32)
+    edge_dst = np.asarray(edge_dst, dtype=np.int32)
+    up = rank[edge_src] < rank[edge_dst]
+    down = rank[edge_src] > rank[edge_dst]
+    up_edges = np.flatnonzero(up)
+    up_edges = up_edges[np.argsort(edge_src[up_edges], kind="stable")].astype(np.int32)
+    down_edges = np.flatnonzero(down)
+    down_edges = down_edges[np.argsort(edge_dst[down_edges], kind="stable")].astype(np.int32)
+    up_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_src[up_edges], minlength=n), out=up_indptr[1:])
+    down_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_dst[down_edges], minlength=n), out=down_indptr[1:])
+
+    return ContractionHierarchy({
+        "rank": rank,
+        "edge_src": edge_src,
+        "edge_dst": edge_dst,
+        "edge_weight": np.asarray(edge_weight, dtype=np.float64),
+        "edge_child1": np.asarray(edge_child1, dtype=np.int32),
+        "edge_child2": np.asarray(edge_child2, dtype=np.int32),
+        "up_indptr": up_indptr,
+        "up_edges": up_edges,
+        "down_indptr": down_indptr,
+        "down_edges": down_edges,
+    })
+
+
+if __name__ == "__main__":
+    from router import router
+
+    parser = argparse.ArgumentParser(description="Build the contraction hierarchy for the current graph snapshot")
+    parser.add_argument("--witness-limit", type=int, default=WITNESS_SETTLE_LIMIT,
+                        help="Nodes settled per witness search before a shortcut is added anyway")
+    args = parser.parse_args()
+
+    router.load_graph()
+    start = time.perf_counter()
+    ch = contract(router.arrays, args.witness_limit)
+    path = save_component(router.arrays.fingerprint, COMPONENT, ch.arrays())
+    print(f"Contracted {router.arrays.n_stops} stops with {ch.n_shortcuts} shortcuts "
+          f"in {time.perf_counter() - start:.1f}s, saved to {path}")
@@ -1,19 +1,47 @@
+import argparse
+import io
+import math
+import numpy as np
 import pandas as pd
 import os
 from pathlib import Path
 import random
+import zipfile
 from datetime import datetime, timedelta
 
+from accidents_parquet import ACCIDENTS_DIR, convert_archive
+from gtfs_parquet import PARQUET_DIR, convert_gtfs
+
 DATA_DIR = Path("data")
 RAW_DIR = DATA_DIR / "raw"
 
+# Synthetic network (--lines): stops are spread over the Düsseldorf bounding box
+BBOX = (6.68, 51.12, 6.94, 51.35)  # min_lon, min_lat, max_lon, max_lat
+# Route type -> (share of lines, cruising speed in m/s, short name prefix)
+LINE_TYPES = {1: (0.1, 11.0, "U"), 0: (0.3, 7.0, "70"), 3: (0.6, 6.0, "")}
+DWELL_SEC = 30
+SERVICE_START_SEC = 5 * 3600
+SERVICE_END_SEC = 25 * 3600  # last departures run past midnight (GTFS times >= 24:00:00)
+PEAK_HOURS = [(7, 9), (16, 18)]  # trips take longer in these hours
+PEAK_FACTOR = 1.25
+# Unfallatlas columns in their published order; only some are read by the pipeline
+UNFALLATLAS_COLUMNS = [
+    "OBJECTID", "UIDENTSTLAE", "ULAND", "UREGBEZ", "UKREIS", "UGEMEINDE", "UJAHR", "UMONAT", "USTUNDE",
+    "UWOCHENTAG", "UKATEGORIE", "UART", "UTYP1", "ULICHTVERH", "IstRad", "IstPKW", "IstFuss", "IstKrad",
+    "IstGkfz", "IstSonstige", "XGCSWGS84", "YGCSWGS84", "STRZUSTAND",
+]
+# Relative accident frequency per hour of day, peaking with the commute
+HOUR_WEIGHTS = np.array([1, 1, 1, 1, 1, 2, 4, 8, 9, 6, 5, 6, 7, 7, 7, 8, 9, 10, 8, 6, 4, 3, 2, 1], dtype=float)
+
 def generate_gtfs():
     gtfs_dir = RAW_DIR / "gtfs"
     gtfs_dir.mkdir(parents=True, exist_ok=True)
+    zip_path = gtfs_dir / "vrr_gtfs.zip"
+    feed = zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED)
 
-    # helper to write csv
+    # helper to write csv, packed into a zip like the real feed
     def write_csv(name, data):
-        pd.DataFrame(data).to_csv(gtfs_dir / name, index=False)
+        feed.writestr(name, pd.DataFrame(data).to_csv(index=False))
 
     # 1. agency.txt
     write_csv("agency.txt", [{
@@ -39,11 +67,13 @@ def generate_gtfs():
     ]
     write_csv("routes.txt", routes)
 
-    # 4. calendar.txt
+    # 4. calendar.txt (valid around today so timetable queries find service)
+    today = datetime.now()
     write_csv("calendar.txt", [{
         "service_id": "daily",
         "monday": 1, "tuesday": 1, "wednesday": 1, "thursday": 1, "friday": 1, "saturday": 1, "sunday": 1,
-        "start_date": "20250101", "end_date": "20251231"
+        "start_date": (today - timedelta(days=365)).strftime("%Y%m%d"),
+        "end_date": (today + timedelta(days=365)).strftime("%Y%m%d")
     }])
 
     # 5. trips.txt
@@ -65,7 +95,9 @@ def generate_gtfs():
         {"trip_id": "T2", "arrival_time": "08:25:00", "departure_time": "08:25:00", "stop_id": "S4", "stop_sequence": 2}
     ]
     write_csv("stop_times.txt", stop_times)
+    feed.close()
 
+    convert_gtfs(zip_path, PARQUET_DIR)
     print("Mock GTFS generated.")
 
 def generate_accidents():
@@ -82,15 +114,226 @@ def generate_accidents():
             "UJAHR": 2024,
             "UMONAT": random.randint(1, 12),
             "USTUNDE": random.randint(0, 23),
-            "WOCHENTAG": random.randint(1, 7),
+            "UWOCHENTAG": random.randint(1, 7),
             "UKATEGORIE": random.choice([1, 2, 3]), # 1=Fatal, 2=Serious, 3=Minor
             "XGCSWGS84": lon,
             "YGCSWGS84": lat
         })
 
-    pd.DataFrame(data).to_csv(accidents_dir / "Unfallorte.csv", index=False)
+    # Same layout as the Unfallatlas downloads: zipped, semicolon-separated, decimal commas
+    zip_path = accidents_dir / "Unfallorte2024.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("csv/Unfallorte2024_LinRef.csv", pd.DataFrame(data).to_csv(index=False, sep=";", decimal=","))
+    convert_archive(zip_path, 2024, output_dir=ACCIDENTS_DIR)
     print("Mock Accidents generated.")
 
+def _haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000.0 * np.arcsin(np.sqrt(a))
+
+def _gtfs_times(seconds: np.ndarray) -> pd.Series:
+    """HH:MM:SS strings; hours keep counting past 23 for trips after midnight."""
+    h, rest = np.divmod(seconds.astype(np.int64), 3600)
+    m, s = np.divmod(rest, 60)
+    pad = lambda values: pd.Series(values).astype(str).str.zfill(2)
+    return pad(h) + ":" + pad(m) + ":" + pad(s)
+
+def _write_table(archive: zipfile.ZipFile, name: str, df: pd.DataFrame, **csv_options):
+    # Streamed into the archive, the large tables never exist as one string in memory
+    with archive.open(name, "w", force_zip64=True) as member:
+        with io.TextIOWrapper(member, encoding="utf-8", newline="") as text:
+            df.to_csv(text, index=False, **csv_options)
+
+def synthetic_lines(n_lines: int, stops_per_line: int, seed: int = 42):
+    """
+    Random lines over a jittered grid of stop positions covering BBOX. Each line walks across
+    the grid mostly straight ahead, so lines cross and share stops where they meet (transfers).
+    Returns (stops_df, lines) with each line as an array of stop positions in stops_df.
+    """
+    rng = np.random.default_rng(seed)
+    min_lon, min_lat, max_lon, max_lat = BBOX
+    width_m = _haversine_m(min_lat, min_lon, min_lat, max_lon)
+    height_m = _haversine_m(min_lat, min_lon, max_lat, min_lon)
+    # About two cells per line stop: lines overlap without covering the whole grid
+    spacing = math.sqrt(width_m * height_m / max(4, 2 * n_lines * stops_per_line))
+    cols, rows = max(2, round(width_m / spacing)), max(2, round(height_m / spacing))
+
+    headings = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+    walks = []
+    for _ in range(n_lines):
+        col, row, heading = int(rng.integers(cols)), int(rng.integers(rows)), int(rng.integers(8))
+        cells = [(col, row)]
+        visited = {(col, row)}
+        while len(cells) < stops_per_line:
+            # Straight on most of the time, otherwise a turn; never back onto the line itself
+            side = 1 if rng.random() < 0.5 else -1
+            turns = [0, side, -side, 2 * side, -2 * side] if rng.random() < 0.8 else [side, 0, -side, 2 * side, -2 * side]
+            for turn in turns:
+                dx, dy = headings[(heading + turn) % 8]
+                step = (col + dx, row + dy)
+                if 0 <= step[0] < cols and 0 <= step[1] < rows and step not in visited:
+                    break
+            else:
+                break  # boxed in: the line ends early
+            heading = (heading + turn) % 8
+            col, row = step
+            cells.append(step)
+            visited.add(step)
+        walks.append([r * cols + c for c, r in cells])
+
+    used = np.unique(np.concatenate(walks))
+    position = {cell: i for i, cell in enumerate(used.tolist())}
+    rows_idx, cols_idx = np.divmod(used, cols)
+    stops_df = pd.DataFrame({
+        "stop_id": [f"S{cell}" for cell in used],
+        "stop_name": [f"Synthetic Stop {i}" for i in range(len(used))],
+        "stop_lat": (min_lat + (rows_idx + 0.5 + rng.uniform(-0.25, 0.25, len(used))) * (max_lat - min_lat) / rows).round(6),
+        "stop_lon": (min_lon + (cols_idx + 0.5 + rng.uniform(-0.25, 0.25, len(used))) * (max_lon - min_lon) / cols).round(6),
+    })
+    lines = [np.array([position[cell] for cell in walk]) for walk in walks]
+    return stops_df, lines
+
+def generate_synthetic_gtfs(n_lines: int, stops_per_line: int, trips_per_day: int, seed: int = 42) -> pd.DataFrame:
+    """
+    City-scale GTFS feed: `n_lines` bus, tram and U-Bahn lines served in both directions,
+    `trips_per_day` trips per direction on weekdays and half as many on weekends, from
+    05:00 until past midnight and slower in the peak hours. Returns the stops.
+    """
+    stops_df, lines = synthetic_lines(n_lines, stops_per_line, seed)
+    rng = np.random.default_rng(seed + 1)
+    lat, lon = stops_df["stop_lat"].to_numpy(), stops_df["stop_lon"].to_numpy()
+    stop_ids, stop_names = stops_df["stop_id"].to_numpy(), stops_df["stop_name"].to_numpy()
+    route_types = rng.choice(list(LINE_TYPES), size=len(lines), p=[share for share, _, _ in LINE_TYPES.values()])
+    services = [("weekday", trips_per_day), ("weekend", max(1, trips_per_day // 2))]
+
+    routes, trips, chunks = [], [], []
+    for k, (line, route_type) in enumerate(zip(lines, route_types)):
+        _, speed, prefix = LINE_TYPES[route_type]
+        route_id = f"R{k}"
+        routes.append({"route_id": route_id, "agency_id": "VRR", "route_short_name": f"{prefix}{k}",
+                       "route_long_name": f"{stop_names[line[0]]} - {stop_names[line[-1]]}", "route_type": route_type})
+        if len(line) < 2:
+            continue
+        for direction, seq in enumerate([line, line[::-1]]):
+            hop = np.round(_haversine_m(lat[seq[:-1]], lon[seq[:-1]], lat[seq[1:]], lon[seq[1:]]) / speed)
+            # Seconds after the trip's departure; vehicles wait DWELL_SEC at intermediate stops
+            arrival = np.concatenate([[0], np.cumsum(hop) + DWELL_SEC * np.arange(len(hop))])
+            departure = arrival + DWELL_SEC
+            departure[0], departure[-1] = 0, arrival[-1]
+            for service_id, n_trips in services:
+                headway = (SERVICE_END_SEC - SERVICE_START_SEC) / n_trips
+                starts = SERVICE_START_SEC + rng.uniform(0, headway) + headway * np.arange(n_trips)
+                hour = starts // 3600 % 24
+                peak = np.zeros(n_trips, dtype=bool)
+                for first, last in PEAK_HOURS:
+                    peak |= (hour >= first) & (hour < last)
+                factor = np.where(peak, PEAK_FACTOR, 1.0) * rng.uniform(0.95, 1.05, n_trips)
+                trip_ids = [f"{route_id}_{direction}_{service_id}_{i}" for i in range(n_trips)]
+                trips.extend({"route_id": route_id, "service_id": service_id, "trip_id": trip_id,
+                              "trip_headsign": stop_names[seq[-1]], "direction_id": direction} for trip_id in trip_ids)
+                chunks.append(pd.DataFrame({
+                    "trip_id": np.repeat(trip_ids, len(seq)),
+                    "arrival_sec": np.round(starts[:, None] + arrival[None, :] * factor[:, None]).ravel(),
+                    "departure_sec": np.round(starts[:, None] + departure[None, :] * factor[:, None]).ravel(),
+                    "stop_id": np.tile(stop_ids[seq], n_trips),
+                    "stop_sequence": np.tile(np.arange(1, len(seq) + 1), n_trips),
+                }))
+
+    stop_times = pd.concat(chunks, ignore_index=True)
+    stop_times.insert(1, "arrival_time", _gtfs_times(stop_times.pop("arrival_sec").to_numpy()))
+    stop_times.insert(2, "departure_time", _gtfs_times(stop_times.pop("departure_sec").to_numpy()))
+
+    today = datetime.now()
+    validity = {"start_date": (today - timedelta(days=365)).strftime("%Y%m%d"),
+                "end_date": (today + timedelta(days=365)).strftime("%Y%m%d")}
+    weekdays = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+    calendar = [
+        {"service_id": "weekday", **{day: int(i < 5) for i, day in enumerate(weekdays)}, **validity},
+        {"service_id": "weekend", **{day: int(i >= 5) for i, day in enumerate(weekdays)}, **validity},
+    ]
+
+    gtfs_dir = RAW_DIR / "gtfs"
+    gtfs_dir.mkdir(parents=True, exist_ok=True)
+    zip_path = gtfs_dir / "vrr_gtfs.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as feed:
+        _write_table(feed, "agency.txt", pd.DataFrame([{
+            "agency_id": "VRR", "agency_name": "Verkehrsverbund Rhein-Ruhr",
+            "agency_url": "http://www.vrr.de", "agency_timezone": "Europe/Berlin"
+        }]))
+        _write_table(feed, "stops.txt", stops_df)
+        _write_table(feed, "routes.txt", pd.DataFrame(routes))
+        _write_table(feed, "calendar.txt", pd.DataFrame(calendar))
+        _write_table(feed, "trips.txt", pd.DataFrame(trips))
+        _write_table(feed, "stop_times.txt", stop_times)
+
+    convert_gtfs(zip_path, PARQUET_DIR)
+    print(f"Synthetic GTFS generated: {len(stops_df)} stops, {len(routes)} lines, {len(trips)} trips, "
+          f"{len(stop_times)} stop times.")
+    return stops_df
+
+def generate_synthetic_accidents(stops_df: pd.DataFrame, n_accidents: int, years, seed: int = 42):
+    """
+    `n_accidents` Unfallatlas-shaped rows per year: most clustered around a few hotspot stops,
+    some spread over the city and some elsewhere in Germany, which the area filter drops
+    like the rest of the nationwide file.
+    """
+    rng = np.random.default_rng(seed + 2)
+    accidents_dir = RAW_DIR / "accidents"
+    accidents_dir.mkdir(parents=True, exist_ok=True)
+    lat, lon = stops_df["stop_lat"].to_numpy(), stops_df["stop_lon"].to_numpy()
+    hotspots = rng.pareto(1.5, len(stops_df)) + 0.1
+    hotspots /= hotspots.sum()
+    min_lon, min_lat, max_lon, max_lat = BBOX
+
+    for year in years:
+        n_near, n_city = int(n_accidents * 0.6), int(n_accidents * 0.25)
+        n_far = n_accidents - n_near - n_city
+        near = rng.choice(len(stops_df), n_near, p=hotspots)
+        sigma = 150 / 111195.0  # degrees of latitude
+        accident_lat = np.concatenate([lat[near] + rng.normal(0, sigma, n_near),
+                                       rng.uniform(min_lat, max_lat, n_city), rng.uniform(47.3, 55.0, n_far)])
+        accident_lon = np.concatenate([lon[near] + rng.normal(0, sigma / math.cos(math.radians(51.2)), n_near),
+                                       rng.uniform(min_lon, max_lon, n_city), rng.uniform(5.9, 15.0, n_far)])
+        order = rng.permutation(n_accidents)
+        far = np.arange(n_accidents) >= n_near + n_city
+
+        ist = {name: rng.random(n_accidents) < share for name, share in
+               [("IstRad", 0.3), ("IstPKW", 0.8), ("IstFuss", 0.1), ("IstKrad", 0.1), ("IstGkfz", 0.05), ("IstSonstige", 0.03)]}
+        data = pd.DataFrame({
+            "OBJECTID": np.arange(1, n_accidents + 1),
+            "UIDENTSTLAE": year * 10_000_000 + np.arange(n_accidents),
+            "ULAND": np.where(far[order], rng.integers(1, 17, n_accidents), 5),
+            "UREGBEZ": 1,
+            "UKREIS": 11,
+            "UGEMEINDE": 0,
+            "UJAHR": year,
+            "UMONAT": rng.integers(1, 13, n_accidents),
+            "USTUNDE": rng.choice(24, n_accidents, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum()),
+            "UWOCHENTAG": rng.integers(1, 8, n_accidents),  # 1 = Sunday
+            "UKATEGORIE": rng.choice([1, 2, 3], n_accidents, p=[0.01, 0.17, 0.82]),  # 1=Fatal, 2=Serious, 3=Minor
+            "UART": rng.integers(0, 10, n_accidents),
+            "UTYP1": rng.integers(1, 8, n_accidents),
+            "ULICHTVERH": rng.choice(3, n_accidents, p=[0.75, 0.07, 0.18]),
+            **{name: flags.astype(int) for name, flags in ist.items()},
+            "XGCSWGS84": accident_lon[order].round(9),
+            "YGCSWGS84": accident_lat[order].round(9),
+            "STRZUSTAND": rng.choice(3, n_accidents, p=[0.75, 0.22, 0.03]),
+        }, columns=UNFALLATLAS_COLUMNS)
+
+        zip_path = accidents_dir / f"Unfallorte{year}.zip"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            _write_table(archive, f"csv/Unfallorte{year}_LinRef.csv", data, sep=";", decimal=",")
+        convert_archive(zip_path, year, output_dir=ACCIDENTS_DIR)
+    print(f"Synthetic accidents generated: {n_accidents} per year for {', '.join(map(str, years))}.")
+
+def generate_synthetic(n_lines: int, stops_per_line: int, trips_per_day: int, n_accidents: int,
+                       years=(2024,), seed: int = 42) -> dict:
+    """Synthetic GTFS feed and accident years for load and benchmark runs; returns their sizes."""
+    stops_df = generate_synthetic_gtfs(n_lines, stops_per_line, trips_per_day, seed)
+    generate_synthetic_accidents(stops_df, n_accidents, list(years), seed)
+    return {"stops": len(stops_df), "lines": n_lines, "accidents_per_year": n_accidents, "years": list(years)}
+
 def generate_traffic():
     traffic_dir = RAW_DIR / "traffic"
     traffic_dir.mkdir(parents=True, exist_ok=True)
@@ -105,6 +348,19 @@ def generate_traffic():
     print("Mock Traffic generated.")
 
 if __name__ == "__main__":
-    generate_gtfs()
-    generate_accidents()
+    parser = argparse.ArgumentParser(description="Write mock GTFS, accident and traffic data into data/raw and the staged Parquet")
+    parser.add_argument("--lines", type=int, default=None,
+                        help="Generate a synthetic network with this many lines instead of the 4-stop fixture")
+    parser.add_argument("--stops-per-line", type=int, default=25)
+    parser.add_argument("--trips-per-day", type=int, default=60, help="Trips per line and direction on weekdays (half on weekends)")
+    parser.add_argument("--accidents", type=int, default=20000, help="Accidents per year, including some outside Düsseldorf")
+    parser.add_argument("--years", type=int, nargs="+", default=[2024])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.lines:
+        generate_synthetic(args.lines, args.stops_per_line, args.trips_per_day, args.accidents, args.years, args.seed)
+    else:
+        generate_gtfs()
+        generate_accidents()
     generate_traffic()
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock between processes, run a single API worker there
+    fcntl = None
+
+SNAPSHOT_DIR = Path("data/processed/graph_snapshot")
+# Bump when the array layout or the edge weighting changes, so old snapshots are ignored
+SNAPSHOT_FORMAT = 5
+KEEP_SNAPSHOTS = 2
+
+# Risk penalty: weight = duration * (1 + (risk_score of the target stop + walk_risk) * RISK_WEIGHT)
+RISK_WEIGHT = 0.1
+# route_id of the footpath edges between nearby stops
+WALK_ROUTE_ID = "walk"
+
+# Time buckets of hourly_risk: weekday (0 = Monday) x hour of day
+RISK_BUCKETS = (7, 24)
+
+ARRAY_NAMES = [
+    "stop_ids", "stop_names", "stop_lat", "stop_lon", "risk_score",
+    "indptr", "indices", "duration", "weight", "walk_risk", "route_codes", "route_ids", "hourly_risk",
+]
+
+
+class TransportGraph:
+    """
+    Read-only stop graph as flat arrays.
+
+    Stops are addressed by integer index. Outgoing edges of stop u are
+    indices[indptr[u]:indptr[u + 1]] (CSR), with per-edge duration (seconds),
+    risk-penalized weight and route code (index into route_ids). Footpaths between nearby
+    stops are edges of route WALK_ROUTE_ID; walk_risk holds the accidents along them (0 for
+    vehicle segments) and counts on top of the arrival stop's risk.
+    hourly_risk[weekday, hour] is the risk score of every stop in that hour of the week;
+    weight uses the all-day risk_score, time_weights() the hourly one.
+    """
+
+    def __init__(self, arrays: dict, fingerprint: Optional[str] = None):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.fingerprint = fingerprint
+
+    @property
+    def n_stops(self) -> int:
+        return len(self.stop_ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    def edge_sources(self) -> np.ndarray:
+        """Source stop index of every edge, in CSR order."""
+        return np.repeat(np.arange(self.n_stops, dtype=np.int32), np.diff(self.indptr))
+
+    def arrays(self) -> dict:
+        return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+    def time_weights(self, weekday: int, hour: int, risk_weight: float = RISK_WEIGHT) -> np.ndarray:
+        """Edge weights (CSR order) with the risk of the given hour of the week, like `weight`."""
+        return np.asarray(self.duration) * (1 + self.edge_risk(self.hourly_risk[weekday, hour]) * risk_weight)
+
+    def edge_risk(self, stop_risk=None) -> np.ndarray:
+        """
+        Risk of taking every edge (CSR order): `stop_risk` (default risk_score) of its arrival
+        stop plus, for footpaths, the accidents along the walk.
+        """
+        stop_risk = self.risk_score if stop_risk is None else stop_risk
+        return np.asarray(stop_risk, dtype=np.float64)[self.indices] + self.walk_risk
+
+
+def build_graph(stops_df: pd.DataFrame, segments_df: pd.DataFrame, risk_weight: float = RISK_WEIGHT,
+                hourly_risk_df: Optional[pd.DataFrame] = None,
+                footpaths_df: Optional[pd.DataFrame] = None) -> TransportGraph:
+    """
+    Build the CSR graph straight from the DataFrame columns.
+
+    stops_df: stop_id, stop_name, stop_lat, stop_lon, risk_score
+    segments_df: from_stop, to_stop, avg_duration, route_id (one row per stop pair)
+    hourly_risk_df: stop_id, weekday, hour, risk_score for the (stop, hour) buckets with
+    accidents, the others score 0; without it every hour gets the all-day risk_score
+    footpaths_df: from_stop, to_stop, walk_sec, risk_score (int_footpaths), added as edges
+    of route WALK_ROUTE_ID
+    """
+    stop_ids = stops_df["stop_id"].astype(str).to_numpy()
+    stop_pos = pd.Index(stop_ids)
+    risk = stops_df["risk_score"].to_numpy(dtype=np.float64)
+
+    edges = segments_df[["from_stop", "to_stop", "avg_duration", "route_id"]].assign(walk_risk=0.0)
+    if footpaths_df is not None:
+        edges = pd.concat([edges, pd.DataFrame({
+            "from_stop": footpaths_df["from_stop"],
+            "to_stop": footpaths_df["to_stop"],
+            "avg_duration": footpaths_df["walk_sec"],
+            "route_id": WALK_ROUTE_ID,
+            "walk_risk": footpaths_df["risk_score"],
+        })], ignore_index=True)
+
+    u = stop_pos.get_indexer(edges["from_stop"].astype(str))
+    v = stop_pos.get_indexer(edges["to_stop"].astype(str))
+    known = (u >= 0) & (v >= 0)
+    u, v = u[known], v[known]
+    duration = edges["avg_duration"].to_numpy(dtype=np.float64)[known]
+    walk_risk = edges["walk_risk"].to_numpy(dtype=np.float64)[known]
+    route_codes, route_ids = pd.factorize(edges["route_id"].astype(str).to_numpy()[known])
+
+    if hourly_risk_df is None:
+        hourly_risk = np.broadcast_to(risk.astype(np.float32), RISK_BUCKETS + (len(stop_ids),)).copy()
+    else:
+        hourly_risk = np.zeros(RISK_BUCKETS + (len(stop_ids),), dtype=np.float32)
+        s = stop_pos.get_indexer(hourly_risk_df["stop_id"].astype(str))
+        found = s >= 0
+        hourly_risk[
+            hourly_risk_df["weekday"].to_numpy(dtype=np.int64)[found],
+            hourly_risk_df["hour"].to_numpy(dtype=np.int64)[found],
+            s[found],
+        ] = hourly_risk_df["risk_score"].to_numpy(dtype=np.float32)[found]
+
+    # Risk Penalty: penalize arriving at a risky stop (and walking past accidents)
+    weight = duration * (1 + (risk[v] + walk_risk) * risk_weight)
+
+    order = np.lexsort((v, u))
+    indptr = np.zeros(len(stop_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(u, minlength=len(stop_ids)), out=indptr[1:])
+
+    return TransportGraph({
+        "stop_ids": stop_ids.astype(str),
+        "stop_names": stops_df["stop_name"].astype(str).to_numpy().astype(str),
+        "stop_lat": stops_df["stop_lat"].to_numpy(dtype=np.float64),
+        "stop_lon": stops_df["stop_lon"].to_numpy(dtype=np.float64),
+        "risk_score": risk,
+        "indptr": indptr,
+        "indices": v[order].astype(np.int32),
+        "duration": duration[order],
+        "weight": weight[order],
+        "walk_risk": walk_risk[order],
+        "route_codes": route_codes[order].astype(np.int32),
+        "route_ids": np.asarray(route_ids, dtype=str),
+        "hourly_risk": hourly_risk,
+    })
+
+
+def fingerprint(db_path) -> str:
+    """
+    Key for the dbt outputs the graph is built from.
+
+    dbt rewrites the DuckDB file on every run, so its size and modification time change
+    whenever the models do; the snapshot format and risk weighting are mixed in so code
+    changes invalidate old snapshots as well.
+    """
+    stat = os.stat(db_path)
+    key = f"{os.path.abspath(db_path)}:{stat.st_size}:{stat.st_mtime_ns}:{SNAPSHOT_FORMAT}:{RISK_WEIGHT}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+@contextmanager
+def snapshot_lock(snapshot_dir: Path = SNAPSHOT_DIR, shared: bool = False):
+    """
+    Lock on the snapshot directory across processes: exclusive while a snapshot is built,
+    shared while one is opened. API workers starting (or reloading) together thereby build
+    a snapshot once and the others memory-map it.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(snapshot_dir / ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def snapshot_exists(key: str, snapshot_dir: Path = SNAPSHOT_DIR) -> bool:
+    # meta.json is written last, so a snapshot that has one is complete
+    return (Path(snapshot_dir) / key / "meta.json").exists()
+
+
+def load_snapshot(key: str, snapshot_dir: Path = SNAPSHOT_DIR) -> Optional[TransportGraph]:
+    """Memory-map the snapshot for `key`, or None if there is none."""
+    path = Path(snapshot_dir) / key
+    if not snapshot_exists(key, snapshot_dir):
+        return None
+    arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ARRAY_NAMES}
+    return TransportGraph(arrays, fingerprint=key)
+
+
+def load_component(key: str, name: str, snapshot_dir: Path = SNAPSHOT_DIR) -> Optional[dict]:
+    """Memory-map the arrays of a component saved with the graph (e.g. the timetable)."""
+    path = Path(snapshot_dir) / key
+    if not (path / "meta.json").exists() or not (path / name).is_dir():
+        return None
+    return {p.stem: np.load(p, mmap_mode="r") for p in (path / name).glob("*.npy")}
+
+
+def save_component(key: str, name: str, arrays: dict, snapshot_dir: Path = SNAPSHOT_DIR) -> Path:
+    """Add (or replace) a component of an existing snapshot, e.g. after offline preprocessing."""
+    path = Path(snapshot_dir) / key
+    if not (path / "meta.json").exists():
+        raise FileNotFoundError(f"No graph snapshot {key} in {snapshot_dir}")
+    tmp_path = path / f".{name}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir()
+    for array_name, array in arrays.items():
+        np.save(tmp_path / f"{array_name}.npy", np.asarray(array))
+    shutil.rmtree(path / name, ignore_errors=True)
+    os.replace(tmp_path, path / name)
+    return path / name
+
+
+def save_snapshot(graph: TransportGraph, key: str, snapshot_dir: Path = SNAPSHOT_DIR, keep: int = KEEP_SNAPSHOTS,
+                  components: Optional[dict] = None) -> Path:
+    """
+    Write the graph arrays under `key` atomically and prune older snapshots.
+
+    components maps a name to a dict of further arrays built from the same dbt outputs;
+    each is stored in its own subdirectory and read back with load_component().
+    """
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    final_path = snapshot_dir / key
+    tmp_path = snapshot_dir / f".{key}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir()
+
+    for name, array in graph.arrays().items():
+        np.save(tmp_path / f"{name}.npy", np.asarray(array))
+    for component, arrays in (components or {}).items():
+        (tmp_path / component).mkdir()
+        for name, array in arrays.items():
+            np.save(tmp_path / component / f"{name}.npy", np.asarray(array))
+    # meta.json is written last; its presence marks a complete snapshot
+    with open(tmp_path / "meta.json", "w") as f:
+        json.dump({"format": SNAPSHOT_FORMAT, "n_stops": graph.n_stops, "n_edges": graph.n_edges}, f)
+
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.replace(tmp_path, final_path)
+
+    snapshots = sorted(
+        (p for p in snapshot_dir.iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=lambda p: p.stat().st_mtime,
+    )
+    for old in snapshots[:-keep] if keep > 0 else []:
+        if old != final_path:
+            shutil.rmtree(old, ignore_errors=True)
+    return final_path
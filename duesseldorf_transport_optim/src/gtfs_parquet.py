@@ -0,0 +1,165 @@
+import argparse
+import csv
+import io
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+GTFS_ZIP = Path("data/raw/gtfs/vrr_gtfs.zip")
+PARQUET_DIR = Path("data/staged/gtfs")
+# CSV bytes decoded per batch; stop_times.txt is read in pieces of this size
+BLOCK_SIZE = 16 << 20
+ROW_GROUP_SIZE = 1_000_000
+
+# Column types of the GTFS tables the models read; other columns stay strings.
+# "time" columns (HH:MM:SS, hours may exceed 23) become int32 seconds since service-day
+# midnight in a <name>_sec column, "date" columns (YYYYMMDD) become dates.
+TABLES = {
+    "agency": {"types": {}, "sort": []},
+    "stops": {
+        "types": {"stop_lat": pa.float64(), "stop_lon": pa.float64(), "location_type": pa.int8(),
+                  "wheelchair_boarding": pa.int8()},
+        "sort": ["stop_id"],
+    },
+    "routes": {"types": {"route_type": pa.int16()}, "sort": ["route_id"]},
+    "trips": {"types": {"direction_id": pa.int8(), "wheelchair_accessible": pa.int8()}, "sort": ["trip_id"]},
+    "stop_times": {
+        "types": {"arrival_time": "time", "departure_time": "time", "stop_sequence": pa.int32(),
+                  "pickup_type": pa.int8(), "drop_off_type": pa.int8(), "shape_dist_traveled": pa.float64(),
+                  "timepoint": pa.int8()},
+        "sort": ["trip_id", "stop_sequence"],
+    },
+    "calendar": {
+        "types": {**{day: pa.int8() for day in
+                     ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]},
+                  "start_date": "date", "end_date": "date"},
+        "sort": ["service_id"],
+    },
+    "calendar_dates": {"types": {"date": "date", "exception_type": pa.int8()}, "sort": ["service_id", "date"]},
+}
+
+
+def _trimmed(column: pa.Array) -> pa.Array:
+    """Strings without surrounding whitespace, blank ones as null."""
+    column = pc.utf8_trim_whitespace(column)
+    return pc.if_else(pc.equal(column, ""), pa.scalar(None, pa.string()), column)
+
+
+def gtfs_seconds(times: pa.Array) -> pa.Array:
+    """
+    Seconds since service-day midnight for GTFS "H:MM:SS" strings. Parsed by field rather
+    than as a time of day, so trips running past midnight (e.g. 25:10:00) keep counting;
+    empty times (non-timepoint stops) stay null.
+    """
+    parts = pc.split_pattern(_trimmed(times), ":")
+    h, m, s = (pc.cast(pc.list_element(parts, i), pa.int32()) for i in range(3))
+    return pc.cast(pc.add(pc.add(pc.multiply(h, 3600), pc.multiply(m, 60)), s), pa.int32())
+
+
+def _convert_batch(batch: pa.RecordBatch, types: dict) -> pa.RecordBatch:
+    columns, names = [], []
+    for name, column in zip(batch.schema.names, batch.columns):
+        kind = types.get(name)
+        if kind == "time":
+            name, column = name.replace("_time", "_sec"), gtfs_seconds(column)
+        elif kind == "date":
+            column = pc.cast(pc.strptime(_trimmed(column), format="%Y%m%d", unit="s"), pa.date32())
+        elif kind is not None:
+            column = pc.cast(_trimmed(column), kind)
+        names.append(name)
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=names)
+
+
+def read_header(stream) -> list:
+    """Column names from the first line of a GTFS CSV (tolerating a UTF-8 BOM)."""
+    line = stream.readline().decode("utf-8-sig")
+    return next(csv.reader(io.StringIO(line)))
+
+
+def convert_table(stream, table: str, dest: Path, header: list) -> int:
+    """Stream one GTFS CSV into a typed Parquet file sorted by the table's key; returns rows."""
+    spec = TABLES.get(table, {"types": {}, "sort": []})
+    # Everything is read as strings and cast explicitly, so nothing depends on type inference
+    # over the first block (IDs like "0123" stay strings, empty values become nulls)
+    reader = pv.open_csv(
+        stream,
+        read_options=pv.ReadOptions(block_size=BLOCK_SIZE, column_names=header, skip_rows=1),
+        convert_options=pv.ConvertOptions(column_types={name: pa.string() for name in header},
+                                          strings_can_be_null=True),
+    )
+    string_schema = pa.schema([pa.field(name.strip(), pa.string()) for name in header])
+    batches = [
+        _convert_batch(pa.RecordBatch.from_arrays(batch.columns, schema=string_schema), spec["types"])
+        for batch in reader
+    ]
+
+    if batches:
+        result = pa.Table.from_batches(batches)
+    else:
+        empty = pa.RecordBatch.from_arrays([pa.array([], pa.string())] * len(string_schema), schema=string_schema)
+        result = pa.Table.from_batches([_convert_batch(empty, spec["types"])])
+    keys = [k for k in spec["sort"] if k in result.column_names]
+    if keys:
+        result = result.sort_by([(k, "ascending") for k in keys])
+
+    tmp = dest.with_name(f".{dest.name}.tmp")
+    pq.write_table(result, tmp, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(tmp, dest)
+    return result.num_rows
+
+
+def convert_gtfs(source: Path = GTFS_ZIP, output_dir: Path = PARQUET_DIR, tables: Optional[list] = None):
+    """
+    Write every .txt member of the GTFS zip (or a directory of extracted files) as
+    <output_dir>/<table>.parquet, reading members straight out of the archive.
+    """
+    source, output_dir = Path(source), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if source.is_dir():
+        members = {p.stem: p for p in source.glob("*.txt")}
+        open_member = lambda member: open(member, "rb")
+        archive = None
+    else:
+        archive = zipfile.ZipFile(source)
+        # Some feeds nest the files in a folder inside the zip
+        members = {
+            Path(n).stem: n for n in archive.namelist()
+            if n.endswith(".txt") and not n.startswith("__MACOSX") and not Path(n).name.startswith(".")
+        }
+        open_member = archive.open
+
+    try:
+        for table, member in sorted(members.items()):
+            if tables is not None and table not in tables:
+                continue
+            start = time.perf_counter()
+            with open_member(member) as stream:
+                header = read_header(stream)
+            with open_member(member) as stream:
+                rows = convert_table(stream, table, output_dir / f"{table}.parquet", header)
+            print(f"{table}: {rows} rows in {time.perf_counter() - start:.1f}s")
+    finally:
+        if archive is not None:
+            archive.close()
+
+    missing = [t for t in ["stops", "routes", "trips", "stop_times", "calendar"] if t not in members]
+    if missing:
+        print(f"Warning: GTFS feed has no {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a GTFS feed to typed, sorted Parquet for the dbt models")
+    parser.add_argument("--source", default=str(GTFS_ZIP), help="GTFS zip (or directory of .txt files)")
+    parser.add_argument("--output", default=str(PARQUET_DIR))
+    args = parser.parse_args()
+
+    convert_gtfs(Path(args.source), Path(args.output))
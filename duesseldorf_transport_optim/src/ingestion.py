@@ -1,31 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+import json
 import os
 import requests
-import zipfile
+import time
 import io
 import pandas as pd
 from pathlib import Path
+from typing import Optional
+
+from accidents_parquet import ACCIDENTS_DIR, AreaFilter, convert_archive
+from gtfs_parquet import PARQUET_DIR, convert_gtfs
 
 # Configuration
 DATA_DIR = Path("data")
 RAW_DIR = DATA_DIR / "raw"
 GTFS_URL = "https://www.vrr.de/opencms/export/sites/vrr/modules/openservice/data/google_transit.zip" # This is a common stable link for VRR GTFS
-UNFALLATLAS_BASE_URL = "https://unfallatlas.statistikportal.de/App/Download/Unfallorte2022_LinRef.zip" # Example for 2022 data
+UNFALLATLAS_URL = "https://unfallatlas.statistikportal.de/App/Download/Unfallorte{year}_EPSG25832_CSV.zip"
+UNFALLATLAS_FIRST_YEAR = 2016 # Earliest year published with coordinates for all states
 TRAFFIC_DATA_URL = "https://opendata.duesseldorf.de/sites/default/files/Verkehrszaehlung_5J_Zaehlstellen_2015_2019.csv" # Example URL, might need check
 
-def download_file(url: str, dest_path: Path):
-    print(f"Downloading {url}...")
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    with open(dest_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-    print(f"Saved to {dest_path}")
-
-def extract_zip(zip_path: Path, extract_to: Path):
-    print(f"Extracting {zip_path}...")
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_to)
-    print(f"Extracted to {extract_to}")
+# Download tuning; chunks are small so an interrupted transfer keeps nearly all it received
+CHUNK_SIZE = 64 << 10
+TIMEOUT_SEC = 60
+RETRIES = 3
+# Expected SHA-256 per URL. None of the current sources publishes a digest, so new downloads
+# are only checked against the advertised size; the SHA-256 recorded for a download is
+# checked whenever the file is kept as up to date
+CHECKSUMS = {}
+
+def _read_json(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_json(path: Path, data: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _matches_meta(path: Path, meta: dict) -> bool:
+    """Whether `path` still has the size and SHA-256 recorded when it was downloaded."""
+    if not path.exists() or path.stat().st_size != meta.get("size"):
+        return False
+    return meta.get("sha256") is None or _sha256(path) == meta["sha256"]
+
+def download_file(url: str, dest_path: Path, sha256: Optional[str] = None, session: Optional[requests.Session] = None,
+                  retries: int = RETRIES, timeout: float = TIMEOUT_SEC) -> bool:
+    """
+    Fetch `url` to `dest_path` unless the server reports it unchanged; returns whether a new
+    file was saved.
+
+    The validators of the last download (ETag, Last-Modified) are kept in <dest>.meta.json
+    and sent as If-None-Match / If-Modified-Since. Data goes to <dest>.part first: an
+    interrupted transfer is resumed with a Range request (If-Range guards against the file
+    having changed meanwhile), and only a complete file is moved over dest_path, so a
+    failure never leaves a truncated file in place.
+
+    What is verified: every download against the size the server advertised
+    (Content-Length / Content-Range) and, if `sha256` is given or configured in CHECKSUMS,
+    its SHA-256; a file the server reports unchanged against the size and SHA-256 recorded
+    in <dest>.meta.json, otherwise it is downloaded again.
+    """
+    dest_path = Path(dest_path)
+    part_path = dest_path.with_name(dest_path.name + ".part")
+    meta_path = dest_path.with_name(dest_path.name + ".meta.json")
+    part_meta_path = dest_path.with_name(dest_path.name + ".part.json")
+    session = session or requests.Session()
+    sha256 = sha256 or CHECKSUMS.get(url)
+
+    meta = _read_json(meta_path) if dest_path.exists() else {}
+    if meta and not _matches_meta(dest_path, meta):
+        # Changed or damaged since it was downloaded: fetch it unconditionally
+        print(f"{dest_path} does not match its recorded size/checksum, downloading again")
+        meta = {}
+
+    for attempt in range(retries + 1):
+        part_meta = _read_json(part_meta_path) if part_path.exists() else {}
+        resumable = part_meta.get("etag") or part_meta.get("last_modified")
+        offset = part_path.stat().st_size if resumable else 0
+
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = resumable
+
+        try:
+            print(f"Downloading {url}..." if not offset else f"Resuming {url} at {offset} bytes...")
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304:
+                    print(f"{dest_path} is up to date")
+                    return False
+                if response.status_code == 416:
+                    # Range no longer satisfiable: start over
+                    part_path.unlink(missing_ok=True)
+                    part_meta_path.unlink(missing_ok=True)
+                    continue
+                response.raise_for_status()
+
+                validators = {
+                    "etag": response.headers.get("ETag") or part_meta.get("etag"),
+                    "last_modified": response.headers.get("Last-Modified") or part_meta.get("last_modified"),
+                }
+                if response.status_code == 206:
+                    expected_total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                    mode = "ab"
+                else:
+                    # Full body: the server ignored the range or the file changed
+                    offset = 0
+                    expected_total = response.headers.get("Content-Length")
+                    mode = "wb"
+                    if response.headers.get("Content-Encoding", "identity") != "identity":
+                        expected_total = None  # Content-Length counts the encoded bytes
+                    _write_json(part_meta_path, validators)
+
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == retries:
+                raise
+            print(f"Download of {url} interrupted ({e}), retrying")
+            time.sleep(2 ** attempt)
+            continue
+
+        size = part_path.stat().st_size
+        if expected_total and expected_total != "*" and size != int(expected_total):
+            if attempt == retries:
+                raise IOError(f"{url}: got {size} of {expected_total} bytes")
+            print(f"Download of {url} incomplete ({size} of {expected_total} bytes), retrying")
+            continue
+
+        digest = _sha256(part_path)
+        if sha256 and digest != sha256.lower():
+            part_path.unlink()
+            part_meta_path.unlink(missing_ok=True)
+            raise IOError(f"{url}: checksum mismatch (expected {sha256}, got {digest})")
+
+        os.replace(part_path, dest_path)
+        _write_json(meta_path, {**validators, "sha256": digest, "size": size, "url": url})
+        part_meta_path.unlink(missing_ok=True)
+        print(f"Saved to {dest_path}")
+        return True
+
+    raise IOError(f"Could not download {url}")
 
 def ingest_gtfs():
     gtfs_dir = RAW_DIR / "gtfs"
@@ -33,26 +166,40 @@ def ingest_gtfs():
     zip_path = gtfs_dir / "vrr_gtfs.zip"
 
     try:
-        download_file(GTFS_URL, zip_path)
-        extract_zip(zip_path, gtfs_dir)
+        changed = download_file(GTFS_URL, zip_path)
+        # Members are streamed out of the zip into Parquet, nothing is extracted
+        if changed or not (PARQUET_DIR / "stop_times.parquet").exists():
+            convert_gtfs(zip_path, PARQUET_DIR)
     except Exception as e:
-        print(f"Failed to fetch GTFS data: {e}. Please manually place 'google_transit.zip' contents in {gtfs_dir}")
+        print(f"Failed to fetch GTFS data: {e}. Please manually place 'google_transit.zip' at {zip_path} "
+              f"and run src/gtfs_parquet.py")
 
-def ingest_accidents():
+def ingest_accidents(area: Optional[AreaFilter] = None):
     accidents_dir = RAW_DIR / "accidents"
     accidents_dir.mkdir(parents=True, exist_ok=True)
-    zip_path = accidents_dir / "unfallorte.zip"
+    area = area or AreaFilter()
 
-    try:
-        # Note: In a real app we might scrape for the latest year. Here we use a fixed 2022 link or placeholder
-        download_file(UNFALLATLAS_BASE_URL, zip_path)
-        extract_zip(zip_path, accidents_dir)
+    # Every year up to the last one published (the current year is not out yet)
+    for year in range(UNFALLATLAS_FIRST_YEAR, datetime.now().year):
+        zip_path = accidents_dir / f"Unfallorte{year}.zip"
+        try:
+            changed = download_file(UNFALLATLAS_URL.format(year=year), zip_path)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                print(f"No accident data published for {year}")
+            else:
+                print(f"Failed to fetch accident data for {year}: {e}")
+            continue
+        except Exception as e:
+            print(f"Failed to fetch accident data for {year}: {e}")
+            continue
 
-        # We only really care about the CSV inside that covers NRW or Dusseldorf.
-        # Often the zip contains a Shapefile and CSV.
-        print("Accident data downloaded. Check extraction folder for CSVs.")
-    except Exception as e:
-        print(f"Failed to fetch Accident data: {e}")
+        # Only the rows inside the area are kept, read straight out of the zip
+        try:
+            if changed or not (ACCIDENTS_DIR / f"year={year}" / "accidents.parquet").exists():
+                convert_archive(zip_path, year, area, ACCIDENTS_DIR)
+        except Exception as e:
+            print(f"Failed to convert accident data for {year}: {e}")
 
 def ingest_traffic():
     traffic_dir = RAW_DIR / "traffic"
@@ -72,9 +219,10 @@ def main():
     RAW_DIR.mkdir(parents=True, exist_ok=True)
 
     print("Starting data ingestion...")
-    ingest_gtfs()
-    ingest_accidents()
-    ingest_traffic()
+    # The sources live on different servers, so they are fetched side by side
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        for future in [pool.submit(ingest) for ingest in (ingest_gtfs, ingest_accidents, ingest_traffic)]:
+            future.result()
     print("Ingestion complete!")
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import math
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+
+from graph_snapshot import SNAPSHOT_DIR, load_component, load_snapshot
+from pathfinding import COMPONENT as SEARCH_COMPONENT, ShortestPathEngine
+
+# Below this many distinct origin stops the searches run in the calling process,
+# the pool round trip would cost more than it saves
+PARALLEL_MIN_ORIGINS = 16
+# Origins per task, so workers pick up new work while slow searches are still running
+CHUNK_SIZE = 8
+
+# Per-worker engine over the memory-mapped snapshot (the OS shares its pages between workers)
+_engine = None
+_bucket_engines = {}  # (weekday, hour) -> engine with that hour's risk weights
+
+
+def _init_worker(key, snapshot_dir):
+    global _engine
+    _engine = ShortestPathEngine(load_snapshot(key, snapshot_dir), load_component(key, SEARCH_COMPONENT, snapshot_dir))
+
+
+def _matrix_rows(engine, sources, targets):
+    durations = np.full((len(sources), len(targets)), np.nan)
+    risks = np.full((len(sources), len(targets)), np.nan)
+    for i, source in enumerate(sources):
+        tree = engine.shortest_path_tree(source, targets)
+        for j, target in enumerate(targets):
+            if target in tree:
+                durations[i, j], risks[i, j] = tree[target]
+    return durations, risks
+
+
+def _worker_rows(sources, targets, bucket):
+    engine = _engine
+    if bucket is not None:
+        if bucket not in _bucket_engines:
+            _bucket_engines[bucket] = _engine.reweighted(_engine.graph.time_weights(*bucket))
+        engine = _bucket_engines[bucket]
+    return _matrix_rows(engine, sources, targets)
+
+
+class MatrixPool:
+    """
+    Process pools for one-to-many searches, one per graph snapshot. After a reload the pool
+    of the previous snapshot is kept so requests still running on it can finish; older ones
+    are shut down.
+    """
+
+    def __init__(self, max_workers=None, keep: int = 2):
+        self.max_workers = max_workers
+        self.keep = keep
+        self._pools = OrderedDict()  # snapshot key -> ProcessPoolExecutor, newest last
+        self._lock = threading.Lock()
+
+    def _executor(self, key):
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                # spawn, not fork: the API process runs threads (event loop, thread pool)
+                pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker, initargs=(key, SNAPSHOT_DIR)
+                )
+                self._pools[key] = pool
+                while len(self._pools) > self.keep:
+                    # Queued chunks still run, the workers exit afterwards
+                    self._pools.popitem(last=False)[1].shutdown(wait=False)
+            return pool
+
+    def shutdown(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.shutdown(wait=False, cancel_futures=True)
+            self._pools.clear()
+
+    def compute(self, engine, key, sources, targets, bucket=None):
+        """
+        (durations in seconds, accumulated risk) matrices between stop indices, NaN where the
+        target is unreachable. Runs in-process for small inputs, otherwise chunks the origins
+        over the worker processes. `bucket` is the (weekday, hour) whose risk weights `engine`
+        was built with, so the workers search with the same weights.
+        """
+        sources, targets = list(sources), list(targets)
+        workers = self.max_workers or os.cpu_count() or 1
+        if key is None or len(sources) < PARALLEL_MIN_ORIGINS or workers < 2:
+            return _matrix_rows(engine, sources, targets)
+
+        pool = self._executor(key)
+        chunk = max(1, min(CHUNK_SIZE, math.ceil(len(sources) / workers)))
+        futures = [pool.submit(_worker_rows, sources[i:i + chunk], targets, bucket) for i in range(0, len(sources), chunk)]
+        results = [f.result() for f in futures]
+        return np.vstack([d for d, _ in results]), np.vstack([r for _, r in results])
@@ -0,0 +1,394 @@
+import copy
+import heapq
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from graph_snapshot import TransportGraph
+
+EARTH_RADIUS_M = 6371008.8
+# Snapshot component holding the arrays of search_arrays()
+COMPONENT = "search"
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; works on scalars and NumPy arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def search_arrays(graph: TransportGraph) -> dict:
+    """
+    Arrays the engine derives from the graph: edge sources, the reverse CSR for backward
+    searches and the A* speed bound. Saved with the snapshot so processes sharing it do not
+    each rebuild them.
+    """
+    sources = graph.edge_sources()
+    targets = np.asarray(graph.indices)
+
+    # Reverse CSR: incoming edges grouped by target stop
+    rev_edges = np.argsort(targets, kind="stable").astype(np.int32)
+    rev_indptr = np.zeros(graph.n_stops + 1, dtype=np.int64)
+    np.cumsum(np.bincount(targets, minlength=graph.n_stops), out=rev_indptr[1:])
+
+    # A* bound: no edge is faster than the fastest straight-line speed seen in the network,
+    # and weight >= duration since risk scores are non-negative, so distance / max_speed
+    # never overestimates the remaining weight
+    lat, lon = np.asarray(graph.stop_lat), np.asarray(graph.stop_lon)
+    distance = haversine_m(lat[sources], lon[sources], lat[targets], lon[targets])
+    duration = np.asarray(graph.duration)
+    moving = duration > 0
+    max_speed = float(np.max(distance[moving] / duration[moving])) if moving.any() else math.inf
+    instant = int(np.count_nonzero(~moving & (distance > 0)))
+    if instant:
+        # An edge covering distance in no time admits no finite speed bound
+        print(f"{instant} edges take 0 s between distinct locations (int_gtfs_segments clamps them "
+              f"to min_segment_sec); A* has no speed bound and searches like Dijkstra")
+        max_speed = math.inf
+
+    return {"edge_sources": sources, "rev_indptr": rev_indptr, "rev_edges": rev_edges,
+            "max_speed": np.array(max_speed)}
+
+
+def _view(array):
+    # memoryview indexing yields plain Python ints/floats without copying the (possibly mmapped) array
+    return memoryview(np.ascontiguousarray(array))
+
+
+class ShortestPathEngine:
+    """
+    Point-to-point searches over the CSR arrays of a TransportGraph.
+
+    Stops are integer indices and paths are returned as lists of edge ids (positions in
+    the CSR edge arrays), so callers read duration/route/target straight from the arrays.
+    """
+
+    def __init__(self, graph: TransportGraph, arrays: Optional[dict] = None):
+        """`arrays` from search_arrays(), e.g. memory-mapped from the snapshot; derived if not given."""
+        self.graph = graph
+        if arrays is None:
+            arrays = search_arrays(graph)
+
+        self._indptr = _view(graph.indptr)
+        self._targets = _view(graph.indices)
+        self._sources = _view(arrays["edge_sources"])
+        self._weight = _view(graph.weight)
+        self._duration = _view(graph.duration)
+        self._risk = _view(graph.edge_risk())
+        self._rev_indptr = _view(arrays["rev_indptr"])
+        self._rev_edges = _view(arrays["rev_edges"])
+        self.max_speed = float(arrays["max_speed"])
+
+    def reweighted(self, weight: np.ndarray) -> "ShortestPathEngine":
+        """
+        Engine over the same graph with other edge weights (e.g. TransportGraph.time_weights),
+        sharing the CSR and reverse arrays. Weights must stay >= duration for the A* bound.
+        """
+        engine = copy.copy(self)
+        engine._weight = _view(weight)
+        return engine
+
+    def edge_endpoints(self, e: int):
+        """(source stop, target stop) of edge `e`."""
+        return self._sources[e], self._targets[e]
+
+    def shortest_path_tree(self, source: int, targets=None, max_duration: float = math.inf):
+        """
+        One-to-many Dijkstra on the risk weight from `source`.
+
+        Stops once every stop in `targets` is settled (all reachable stops when None); stops
+        whose path duration exceeds `max_duration` seconds are not expanded. Returns
+        {stop: (duration_sec, accumulated_risk)} along the minimum-weight paths, where the
+        risk sums the arrival stops and walks like get_route's total_accumulated_risk.
+        """
+        indptr, targets_of, weight, duration, risk = self._indptr, self._targets, self._weight, self._duration, self._risk
+        remaining = None if targets is None else set(targets)
+        dist = {source: 0.0}
+        label = {source: (0.0, 0.0)}
+        settled = {}
+        heap = [(0.0, source)]
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled[u] = label[u]
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            dur_u, risk_u = label[u]
+            for e in range(indptr[u], indptr[u + 1]):
+                v = targets_of[e]
+                nd = d + weight[e]
+                dur_v = dur_u + duration[e]
+                if nd < dist.get(v, math.inf) and dur_v <= max_duration:
+                    dist[v] = nd
+                    label[v] = (dur_v, risk_u + risk[e])
+                    heapq.heappush(heap, (nd, v))
+        return settled
+
+    def reachable_within(self, source: int, max_duration: float, edge_risk=None):
+        """
+        Every stop reachable from `source` within `max_duration` seconds, from one Dijkstra on
+        duration: {stop: (duration_sec, accumulated_risk)} with the fastest arrival and the
+        risk along that fastest path (`edge_risk` per edge, default the all-day risk of the
+        arrival stops and walks).
+        """
+        indptr, targets_of, duration = self._indptr, self._targets, self._duration
+        risk = self._risk if edge_risk is None else _view(np.asarray(edge_risk, dtype=np.float64))
+        label = {source: (0.0, 0.0)}
+        settled = {}
+        heap = [(0.0, source)]
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled[u] = label[u]
+            risk_u = label[u][1]
+            for e in range(indptr[u], indptr[u + 1]):
+                v = targets_of[e]
+                nd = d + duration[e]
+                if nd <= max_duration and nd < label.get(v, (math.inf,))[0]:
+                    label[v] = (nd, risk_u + risk[e])
+                    heapq.heappush(heap, (nd, v))
+        return settled
+
+    def shortest_path(self, source: int, target: int, algorithm: str = "bidirectional") -> Optional[List[int]]:
+        if algorithm == "bidirectional":
+            return self.bidirectional_dijkstra(source, target)
+        if algorithm == "astar":
+            return self.astar(source, target)
+        raise ValueError(f"Unknown algorithm {algorithm!r}")
+
+    def bidirectional_dijkstra(self, source: int, target: int) -> Optional[List[int]]:
+        """Edge ids of a minimum-weight path, or None if target is unreachable."""
+        if source == target:
+            return []
+
+        weight = self._weight
+        # side 0 searches forward from source, side 1 backward from target
+        adjacency = ((self._indptr, self._targets, None), (self._rev_indptr, self._sources, self._rev_edges))
+        dist = ({source: 0.0}, {target: 0.0})
+        pred = ({source: -1}, {target: -1})
+        settled = (set(), set())
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meeting = math.inf, -1
+
+        while heaps[0] and heaps[1]:
+            # No undiscovered path can be shorter than the two frontiers combined
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            d, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+
+            indptr, heads, edge_ids = adjacency[side]
+            dist_s, pred_s, dist_o, heap = dist[side], pred[side], dist[1 - side], heaps[side]
+            for i in range(indptr[u], indptr[u + 1]):
+                e = i if edge_ids is None else edge_ids[i]
+                v = heads[e]
+                nd = d + weight[e]
+                if nd < dist_s.get(v, math.inf):
+                    dist_s[v] = nd
+                    pred_s[v] = e
+                    heapq.heappush(heap, (nd, v))
+                    if v in dist_o and nd + dist_o[v] < best:
+                        best, meeting = nd + dist_o[v], v
+
+        if meeting < 0:
+            return None
+
+        path = []
+        node = meeting
+        while pred[0][node] >= 0:
+            e = pred[0][node]
+            path.append(e)
+            node = self._sources[e]
+        path.reverse()
+        node = meeting
+        while pred[1][node] >= 0:
+            e = pred[1][node]
+            path.append(e)
+            node = self._targets[e]
+        return path
+
+    def astar(self, source: int, target: int) -> Optional[List[int]]:
+        """A* with a straight-line-distance / max-speed heuristic; same result as Dijkstra."""
+        if source == target:
+            return []
+
+        graph = self.graph
+        remaining = haversine_m(graph.stop_lat, graph.stop_lon, graph.stop_lat[target], graph.stop_lon[target])
+        h = _view(remaining / self.max_speed)
+
+        indptr, targets, weight = self._indptr, self._targets, self._weight
+        dist = {source: 0.0}
+        pred = {source: -1}
+        settled = set()
+        heap = [(h[source], source)]
+
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u == target:
+                break
+            if u in settled:
+                continue
+            settled.add(u)
+            d = dist[u]
+            for e in range(indptr[u], indptr[u + 1]):
+                v = targets[e]
+                nd = d + weight[e]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    pred[v] = e
+                    heapq.heappush(heap, (nd + h[v], v))
+        else:
+            return None
+
+        path = []
+        node = target
+        while pred[node] >= 0:
+            e = pred[node]
+            path.append(e)
+            node = self._sources[e]
+        path.reverse()
+        return path
+
+    def _costs_to(self, target: int, cost):
+        """
+        Backward Dijkstra over per-edge `cost` from `target`: {stop: least cost to target}
+        and {stop: first edge of such a path} for every stop that can reach it.
+        """
+        rev_indptr, rev_edges, sources = self._rev_indptr, self._rev_edges, self._sources
+        dist = {target: 0.0}
+        succ = {target: -1}
+        settled = set()
+        heap = [(0.0, target)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            for i in range(rev_indptr[u], rev_indptr[u + 1]):
+                e = rev_edges[i]
+                v = sources[e]
+                nd = d + cost[e]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    succ[v] = e
+                    heapq.heappush(heap, (nd, v))
+        return dist, succ
+
+    def pareto_paths(self, source: int, target: int, max_front: Optional[int] = 8,
+                     stop_risk=None) -> List[Tuple[float, float, List[int]]]:
+        """
+        Pareto front of (duration, accumulated risk) paths in one multi-criteria label-setting
+        search, as (duration_sec, risk, edge ids) from fastest to safest; risk sums the arrival
+        stops' `stop_risk` (the all-day risk_score by default) and the walks' risk, like
+        shortest_path_tree.
+
+        Labels are pruned against exact lower bounds to the target (one backward search per
+        criterion), against the fastest and the safest path, and against the routes found so
+        far. With `max_front` two labels whose risks differ by less than the front's risk span
+        / (max_front - 1) count as equal, which keeps at most `max_front` labels per stop and
+        so bounds the search; the fastest and the safest path are always part of the result.
+        max_front=None returns the exact front.
+        """
+        if max_front is not None and max_front < 2:
+            raise ValueError("max_front must be at least 2 (the fastest and the safest path)")
+        if source == target:
+            return [(0.0, 0.0, [])]
+
+        edge_risk = _view(self.graph.edge_risk(stop_risk))
+        duration = self._duration
+        lb_duration, next_fastest = self._costs_to(target, duration)
+        if source not in lb_duration:
+            return []
+        lb_risk, next_safest = self._costs_to(target, edge_risk)
+
+        def follow(succ):
+            path, node = [], source
+            while succ[node] >= 0:
+                path.append(succ[node])
+                node = self._targets[succ[node]]
+            return path
+
+        fastest, safest = follow(next_fastest), follow(next_safest)
+        fastest_risk = sum(edge_risk[e] for e in fastest)
+        safest_duration = sum(duration[e] for e in safest)
+        # Anything slower than the safest path or riskier than the fastest one is dominated by it
+        max_duration, max_risk = safest_duration, fastest_risk
+        tolerance = 1e-9 * max(1.0, max_risk)
+        delta = 0.0 if max_front is None else (fastest_risk - lb_risk[source]) / (max_front - 1)
+
+        # Label i: path cost (label_duration[i], label_risk[i]) at label_node[i], reached over
+        # edge label_edge[i] from label label_pred[i]
+        label_duration, label_risk, label_node, label_pred, label_edge = [0.0], [0.0], [source], [-1], [-1]
+        alive = [True]
+        bags = {source: [0]}  # stop -> labels there not dominated so far
+        front = []  # labels at the target, popped in order of duration
+        heap = [(0.0, 0.0, 0)]
+        indptr, targets_of = self._indptr, self._targets
+
+        while heap:
+            d, r, i = heapq.heappop(heap)
+            if not alive[i]:
+                continue
+            u = label_node[i]
+            if u == target:
+                front.append(i)
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = targets_of[e]
+                to_target = lb_duration.get(v)
+                if to_target is None:
+                    continue
+                nd, nr = d + duration[e], r + edge_risk[e]
+                best_d, best_r = nd + to_target, nr + lb_risk[v]
+                if best_d > max_duration + tolerance or best_r > max_risk + tolerance:
+                    continue
+                if any(label_duration[t] <= best_d and label_risk[t] <= best_r + delta for t in front):
+                    continue
+                bag = bags.setdefault(v, [])
+                if any(label_duration[j] <= nd and label_risk[j] <= nr + delta for j in bag):
+                    continue
+                # Queued labels the new one dominates are dropped (with the same risk slack, so
+                # the risks left at a stop are more than delta apart); settled ones would have
+                # dominated the new label above
+                kept = []
+                for j in bag:
+                    if nd <= label_duration[j] and nr <= label_risk[j] + delta:
+                        alive[j] = False
+                    else:
+                        kept.append(j)
+                kept.append(len(label_node))
+                bags[v] = kept
+                label_duration.append(nd)
+                label_risk.append(nr)
+                label_node.append(v)
+                label_pred.append(i)
+                label_edge.append(e)
+                alive.append(True)
+                heapq.heappush(heap, (nd, nr, len(label_node) - 1))
+
+        routes = []
+        for i in front:
+            path, j = [], i
+            while label_pred[j] >= 0:
+                path.append(label_edge[j])
+                j = label_pred[j]
+            path.reverse()
+            routes.append((label_duration[i], label_risk[i], path))
+        safest_risk = sum(edge_risk[e] for e in safest)
+        if not routes or routes[-1][1] > safest_risk + tolerance:
+            # Dropped as (nearly) equal to a faster route under the coarser risk resolution
+            routes.append((safest_duration, safest_risk, safest))
+            if max_front is not None and len(routes) > max_front:
+                del routes[-2]
+        return routes
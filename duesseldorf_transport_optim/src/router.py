@@ -1,21 +1,306 @@
 import duckdb
-import networkx as nx
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import OrderedDict
 import math
+import threading
+import time
+from zoneinfo import ZoneInfo
 from typing import List, Dict, Optional, Tuple
 
+from graph_snapshot import (
+    WALK_ROUTE_ID, TransportGraph, build_graph, fingerprint as graph_fingerprint, load_component, load_snapshot,
+    save_snapshot, snapshot_exists, snapshot_lock
+)
+from matrix import MatrixPool
+from contraction import COMPONENT as CH_COMPONENT, ContractionHierarchy
+from pathfinding import COMPONENT as SEARCH_COMPONENT, ShortestPathEngine, search_arrays
+from stop_index import COMPONENT as STOP_INDEX_COMPONENT, StopIndex, StopPositions, StopTable, build_stop_index
+from timetable import WALK_TRIP, Timetable, build_timetable
+
 DB_PATH = "data/processed/transport.duckdb"
+# Search used by get_route when there is no contraction hierarchy: "bidirectional" Dijkstra or "astar"
+DEFAULT_ALGORITHM = "bidirectional"
+# Timezone of the GTFS feed (agency_timezone); timetable times are local
+TIMEZONE = ZoneInfo("Europe/Berlin")
+# Isochrone searches run to the budget rounded up to this many minutes and are cached per
+# (origin stop, bucket), so nearby budgets from the same stop share one search
+ISOCHRONE_BUCKET_MIN = 5
+ISOCHRONE_CACHE_SIZE = 256
+# Engines with the risk weights of one hour of the week, built on first use
+TIME_ENGINE_CACHE_SIZE = 24
+# How often the background watcher checks whether dbt rewrote the database
+WATCH_INTERVAL_SEC = 30
+
+class GraphNotLoaded(RuntimeError):
+    """No graph version has been published yet (load_graph has not finished)."""
+
+class GraphVersion:
+    """
+    Everything queries read for one graph snapshot: the arrays, stop lookups, spatial index
+    and search engines. Built completely before it is published and never modified
+    afterwards (apart from its internal, locked caches), so a request that picked up a
+    version keeps a consistent view even while a reload swaps in the next one.
+
+    All of it is memory-mapped from the snapshot (stop lookups and the spatial index
+    included), so API workers serving the same snapshot share its pages.
+    """
+
+    def __init__(self, graph: TransportGraph, timetable: Timetable, search: dict, stop_index: dict,
+                 ch: Optional[ContractionHierarchy] = None):
+        self.arrays = graph
+        self.timetable = timetable
+        self.ch = ch
+        self.fingerprint = graph.fingerprint
+        self.stop_ids = graph.stop_ids
+        # Exact great-circle nearest stops from a grid over the stops
+        self.stop_index = StopIndex(graph, stop_index)
+        self.stops = StopTable(graph, self.stop_index)
+        self.stop_pos = StopPositions(self.stop_index)
+        self.engine = ShortestPathEngine(graph, search)
+
+        self._isochrone_cache = OrderedDict()  # (stop index, bucket minutes, hour bucket) -> reachable stops
+        self._time_engines = OrderedDict()  # (weekday, hour) -> reweighted ShortestPathEngine
+        self._cache_lock = threading.Lock()
+
+    def engine_for(self, departure: Optional[datetime]) -> Tuple[ShortestPathEngine, Optional[Tuple[int, int]]]:
+        """
+        The search engine weighting risk for the hour of `departure` (local time), with its
+        (weekday, hour) bucket; the all-day weights and None without a departure.
+        """
+        if departure is None:
+            return self.engine, None
+        local = _local_time(departure)
+        bucket = (local.weekday(), local.hour)
+        with self._cache_lock:
+            engine = self._time_engines.get(bucket)
+            if engine is not None:
+                self._time_engines.move_to_end(bucket)
+                return engine, bucket
+
+        engine = self.engine.reweighted(self.arrays.time_weights(*bucket))
+        with self._cache_lock:
+            self._time_engines[bucket] = engine
+            if len(self._time_engines) > TIME_ENGINE_CACHE_SIZE:
+                self._time_engines.popitem(last=False)
+        return engine, bucket
+
+    def find_nearest_stops(self, lat: float, lon: float, k: Optional[int] = 1,
+                           max_distance_m: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        Up to `k` stops closest to (lat, lon) as (stop_id, distance in metres), nearest first.
+        Stops further away than `max_distance_m` are left out; with k=None every stop
+        within `max_distance_m` is returned.
+        """
+        idx, dist = self.stop_index.query(lat, lon, k, max_distance_m)
+        return [(str(self.stop_ids[i]), d) for i, d in zip(idx.tolist(), dist.tolist())]
+
+    def find_nearest_stop(self, lat: float, lon: float, max_distance_m: Optional[float] = None) -> Optional[str]:
+        nearest = self.find_nearest_stops(lat, lon, k=1, max_distance_m=max_distance_m)
+        return nearest[0][0] if nearest else None
+
+    def snap_points(self, points, max_distance_m: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest stop index and distance in metres for each (lat, lon); index -1 where the
+        nearest stop is further than `max_distance_m`.
+        """
+        return self.stop_index.snap(points, max_distance_m)
+
+    def route_details(self, path: List[int], stop_risk=None) -> dict:
+        """
+        Segments and totals of a path of edge ids; risk from `stop_risk` (default risk_score)
+        per stop, plus the accidents along footpaths.
+        """
+        graph = self.arrays
+        route_details = []
+        total_duration = 0
+        total_risk = 0
+
+        for e in path:
+            u, v = self.engine.edge_endpoints(e)
+            stop_info = self.stops.at(v)
+            duration = float(graph.duration[e])
+            risk = stop_info['risk_score'] if stop_risk is None else float(stop_risk[v])
+            route_id = str(graph.route_ids[graph.route_codes[e]])
+
+            segment = {
+                "from_stop": self.stops.at(u)['name'],
+                "to_stop": stop_info['name'],
+                "route_id": route_id,
+                "duration_sec": duration,
+                "stop_risk_score": risk
+            }
+            if route_id == WALK_ROUTE_ID:
+                segment["walk_risk_score"] = float(graph.walk_risk[e])
+                risk += segment["walk_risk_score"]
+            route_details.append(segment)
+            total_duration += duration
+            total_risk += risk
+
+        return {
+            "segments": route_details,
+            "total_duration_minutes": total_duration / 60,
+            "total_accumulated_risk": total_risk
+        }
+
+    def isochrone_tree(self, source: int, minutes: float, departure: Optional[datetime]):
+        """
+        Fastest arrival and the risk along it for every stop within the budget rounded up to
+        ISOCHRONE_BUCKET_MIN; a superset of the stops within `minutes`, which callers filter.
+        """
+        hour_bucket = None
+        if departure is not None:
+            local = _local_time(departure)
+            hour_bucket = (local.weekday(), local.hour)
+        bucket = max(1, math.ceil(minutes / ISOCHRONE_BUCKET_MIN)) * ISOCHRONE_BUCKET_MIN
+        key = (source, bucket, hour_bucket)
+        with self._cache_lock:
+            tree = self._isochrone_cache.get(key)
+            if tree is not None:
+                self._isochrone_cache.move_to_end(key)
+                return tree
+
+        edge_risk = None if hour_bucket is None else self.arrays.edge_risk(self.arrays.hourly_risk[hour_bucket])
+        tree = self.engine.reachable_within(source, bucket * 60, edge_risk)
+        with self._cache_lock:
+            self._isochrone_cache[key] = tree
+            if len(self._isochrone_cache) > ISOCHRONE_CACHE_SIZE:
+                self._isochrone_cache.popitem(last=False)
+        return tree
 
 class TransportRouter:
     def __init__(self):
-        self.graph = nx.DiGraph()
-        self.stops = {}  # stop_id -> {lat, lon, name, risk_score}
-        self.loaded = False
+        self.version = None  # GraphVersion queries run on; replaced as a whole on reload
+        self.matrix_pool = MatrixPool()
+        self._reload_lock = threading.Lock()  # one build at a time
+        self._watcher = None
+        self._stop_watching = threading.Event()
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    # Current version's data, for scripts and the health check
+    @property
+    def stops(self) -> dict:
+        return self.version.stops if self.version else {}
+
+    @property
+    def arrays(self) -> Optional[TransportGraph]:
+        return self.version.arrays if self.version else None
+
+    def build_snapshot(self, rebuild: bool = False) -> Tuple[str, str]:
+        """
+        Make sure a snapshot of the current dbt outputs exists, building it from DuckDB if
+        not (or if `rebuild`). Returns (fingerprint, "snapshot" or "database"). Holds the
+        snapshot lock meanwhile, so of several processes only the first builds it; a parent
+        process can call this before starting the API workers.
+        """
+        with snapshot_lock():
+            key = graph_fingerprint(DB_PATH)
+            if not rebuild and snapshot_exists(key):
+                return key, "snapshot"
+            graph, timetable = self._build_from_db()
+            save_snapshot(graph, key, components={
+                "timetable": timetable.arrays(),
+                SEARCH_COMPONENT: search_arrays(graph),
+                STOP_INDEX_COMPONENT: build_stop_index(graph),
+            })
+            print(f"Saved graph snapshot {key}")
+            return key, "database"
+
+    def load_graph(self, rebuild: bool = False, if_changed: bool = False) -> dict:
+        """
+        Build (or memory-map) the graph for the current dbt outputs and swap it in. The new
+        version is assembled completely on the calling thread while requests keep running on
+        the old one; publishing it is a single reference assignment. With `if_changed` nothing
+        happens when the outputs are the ones already loaded. Returns what was done and how
+        long it took.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            key = graph_fingerprint(DB_PATH)
+            current = self.version
+            if if_changed and not rebuild and current is not None and current.fingerprint == key:
+                return {"reloaded": False, "fingerprint": key}
+
+            print("Loading transport graph...")
+            key, source = self.build_snapshot(rebuild)
+            # Everything is served from the memory-mapped snapshot, also right after building it
+            with snapshot_lock(shared=True):
+                graph = load_snapshot(key)
+                components = {name: load_component(key, name)
+                              for name in ["timetable", SEARCH_COMPONENT, STOP_INDEX_COMPONENT, CH_COMPONENT]}
+            if graph is None or any(components[name] is None for name in ["timetable", SEARCH_COMPONENT, STOP_INDEX_COMPONENT]):
+                raise RuntimeError(f"Graph snapshot {key} was removed or is incomplete")
+            print(f"Using graph snapshot {key}")
 
-    def load_graph(self):
-        print("Loading transport graph...")
-        con = duckdb.connect(DB_PATH)
+            # Optional, built offline by src/contraction.py for this snapshot
+            ch = ContractionHierarchy(components[CH_COMPONENT]) if components[CH_COMPONENT] is not None else None
+            if ch is None:
+                print("No contraction hierarchy for this snapshot (run src/contraction.py), using Dijkstra")
+
+            timetable = Timetable(components["timetable"])
+            self.version = GraphVersion(graph, timetable, components[SEARCH_COMPONENT],
+                                        components[STOP_INDEX_COMPONENT], ch)
+            build_sec = time.perf_counter() - start
+            print(f"Graph loaded: {graph.n_stops} stops, {graph.n_edges} segments, "
+                  f"{timetable.n_connections} timetable connections in {build_sec:.3f}s.")
+            return {
+                "reloaded": True,
+                "fingerprint": key,
+                "previous_fingerprint": current.fingerprint if current else None,
+                "source": source,
+                "build_sec": build_sec,
+                "n_stops": graph.n_stops,
+                "n_segments": graph.n_edges,
+                "n_connections": timetable.n_connections,
+                "contraction_hierarchy": ch is not None,
+            }
+
+    def start_watcher(self, interval_sec: float = WATCH_INTERVAL_SEC):
+        """Poll the dbt outputs in a background thread and reload when they change."""
+        if self._watcher is not None:
+            return
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval_sec,), name="graph-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval_sec: float):
+        seen = None
+        while not self._stop_watching.wait(interval_sec):
+            try:
+                key = graph_fingerprint(DB_PATH)
+            except OSError:
+                continue  # file replaced right now
+            # dbt rewrites the file for a while; only reload once it stopped changing
+            if key != seen:
+                seen = key
+                continue
+            if self.version is not None and key == self.version.fingerprint:
+                continue
+            try:
+                self.load_graph(if_changed=True)
+            except Exception as e:
+                print(f"Graph reload failed, still serving {self.version.fingerprint if self.version else None}: {e}")
+
+    def _current(self) -> GraphVersion:
+        # Versions are only built by load_graph (at startup, by the watcher or on reload),
+        # never on a request's path
+        version = self.version
+        if version is None:
+            raise GraphNotLoaded("Graph not loaded yet")
+        return version
+
+    def _build_from_db(self) -> Tuple[TransportGraph, Timetable]:
+        con = duckdb.connect(DB_PATH, read_only=True)
 
         # 1. Load Stops and Risk Scores
         print("Fetching stops and risk scores...")
@@ -30,128 +315,280 @@ class TransportRouter:
             LEFT JOIN int_network_risk r ON s.stop_id = r.stop_id
         """).df()
 
-        for _, row in stops_df.iterrows():
-            self.stops[row['stop_id']] = {
-                'name': row['stop_name'],
-                'lat': row['stop_lat'],
-                'lon': row['stop_lon'],
-                'risk_score': row['risk_score']
-            }
-            self.graph.add_node(row['stop_id'], **self.stops[row['stop_id']])
-
-        # 2. Load Connections (Edges)
-        # We aggregate multiple trips into a single "average" edge for static routing
-        # In a full system, we'd use time-dependent graphs (RAPTOR/CSA)
-        print("Building edges from stop_times...")
-        edges_query = """
-            WITH segments AS (
-                SELECT
-                    t.route_id,
-                    st1.stop_id as from_stop,
-                    st2.stop_id as to_stop,
-                    -- Parse time 'HH:MM:SS' roughly to seconds (ignoring >24h for now)
-                    date_part('hour', CAST(st2.arrival_time AS TIME)) * 3600 +
-                    date_part('minute', CAST(st2.arrival_time AS TIME)) * 60 +
-                    date_part('second', CAST(st2.arrival_time AS TIME))
-                    -
-                    (date_part('hour', CAST(st1.departure_time AS TIME)) * 3600 +
-                    date_part('minute', CAST(st1.departure_time AS TIME)) * 60 +
-                    date_part('second', CAST(st1.departure_time AS TIME))) as duration_sec
-                FROM stg_gtfs_stop_times st1
-                JOIN stg_gtfs_stop_times st2 ON st1.trip_id = st2.trip_id AND st1.stop_sequence + 1 = st2.stop_sequence
-                JOIN stg_gtfs_trips t ON st1.trip_id = t.trip_id
-            )
-            SELECT
-                from_stop,
-                to_stop,
-                avg(duration_sec) as avg_duration,
-                mode(route_id) as route_id
-            FROM segments
-            GROUP BY 1, 2
-        """
-        segments_df = con.sql(edges_query).df()
-
-        count = 0
-        for _, row in segments_df.iterrows():
-            u, v = row['from_stop'], row['to_stop']
-            duration = row['avg_duration']
-
-            # Risk Penalty:
-            # We want to penalize arriving at a risky stop.
-            # Weight = Duration * (1 + RiskFactor)
-            # RiskFactor = (risk_score of TARGET node) * 0.1 (arbitrary scaling)
-            target_risk = self.stops[v]['risk_score']
-            weight = duration * (1 + (target_risk * 0.1))
-
-            self.graph.add_edge(
-                u, v,
-                weight=weight,
-                duration=duration,
-                route_id=row['route_id'],
-                raw_risk=target_risk
-            )
-            count += 1
+        # 2. Connections (one per vehicle movement) for the timetable and the aggregated
+        # static segments, both precomputed by dbt
+        print("Fetching connections and segments...")
+        connections_df = con.sql("""
+            SELECT trip_id, route_id, from_stop, to_stop, departure_sec, arrival_sec
+            FROM int_gtfs_connections
+        """).df()
+        segments_df = con.sql("""
+            SELECT from_stop, to_stop, avg_duration, route_id
+            FROM int_gtfs_segments
+        """).df()
+
+        # Risk per stop and hour of the week, weighted in at query time
+        hourly_risk_df = con.sql("""
+            SELECT stop_id, weekday, hour, risk_score
+            FROM int_network_risk_hourly
+        """).df()
 
+        # Walking transfers between nearby stops, with the accidents along the way
+        footpaths_df = con.sql("""
+            SELECT from_stop, to_stop, walk_sec, risk_score
+            FROM int_footpaths
+        """).df()
+
+        trips_df = con.sql("SELECT trip_id, route_id, service_id FROM stg_gtfs_trips").df()
+        calendar_df = con.sql("SELECT * FROM stg_gtfs_calendar").df()
         con.close()
-        self.loaded = True
-        print(f"Graph loaded: {self.graph.number_of_nodes()} stops, {count} segments.")
 
-    def find_nearest_stop(self, lat: float, lon: float) -> str:
-        # Simple Euclidean approximation for speed
-        best_stop = None
-        min_dist = float('inf')
+        graph = build_graph(stops_df, segments_df, hourly_risk_df=hourly_risk_df, footpaths_df=footpaths_df)
+        timetable = build_timetable(graph.stop_ids, connections_df, trips_df, calendar_df, footpaths_df)
+        return graph, timetable
 
-        for stop_id, data in self.stops.items():
-            dist = (data['lat'] - lat)**2 + (data['lon'] - lon)**2
-            if dist < min_dist:
-                min_dist = dist
-                best_stop = stop_id
+    def find_nearest_stops(self, lat: float, lon: float, k: Optional[int] = 1,
+                           max_distance_m: Optional[float] = None) -> List[Tuple[str, float]]:
+        return self._current().find_nearest_stops(lat, lon, k, max_distance_m)
 
-        return best_stop
+    def find_nearest_stop(self, lat: float, lon: float, max_distance_m: Optional[float] = None) -> Optional[str]:
+        return self._current().find_nearest_stop(lat, lon, max_distance_m)
 
-    def get_route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float):
-        if not self.loaded:
-            self.load_graph()
+    def snap_points(self, points, max_distance_m: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self._current().snap_points(points, max_distance_m)
 
-        start_node = self.find_nearest_stop(start_lat, start_lon)
-        end_node = self.find_nearest_stop(end_lat, end_lon)
+    def get_matrix(self, origins, destinations, max_snap_distance_m: Optional[float] = None,
+                   departure: Optional[datetime] = None):
+        """
+        Travel time and accumulated risk from every origin to every destination ((lat, lon)
+        pairs) along the least risk-weighted paths, with the risk of the hour of `departure`
+        if given. Points are snapped once, and one one-to-many search runs per distinct origin
+        stop, spread over a process pool for large inputs. Matrices hold NaN where no route exists.
+        """
+        g = self._current()
+        if not len(g.stop_ids):
+            raise ValueError("No stops loaded")
 
-        if not start_node or not end_node:
+        engine, bucket = g.engine_for(departure)
+        o_idx, o_dist = g.snap_points(origins, max_snap_distance_m)
+        d_idx, d_dist = g.snap_points(destinations, max_snap_distance_m)
+        sources, o_pos = np.unique(o_idx, return_inverse=True)
+        targets, d_pos = np.unique(d_idx, return_inverse=True)
+        # Searches only for snapped stops; unsnapped points (-1) keep NaN rows/columns
+        search_sources, search_targets = sources[sources >= 0], targets[targets >= 0]
+        durations = np.full((len(sources), len(targets)), np.nan)
+        risks = np.full((len(sources), len(targets)), np.nan)
+        if len(search_sources) and len(search_targets):
+            sub_d, sub_r = self.matrix_pool.compute(
+                engine, g.arrays.fingerprint, search_sources.tolist(), search_targets.tolist(), bucket
+            )
+            rows, cols = np.ix_(np.flatnonzero(sources >= 0), np.flatnonzero(targets >= 0))
+            durations[rows, cols], risks[rows, cols] = sub_d, sub_r
+
+        def snapped(idx, dist):
+            return [
+                {"stop_id": str(g.stop_ids[i]), "stop_name": g.stops.at(i)['name'], "snap_distance_m": float(d)}
+                if i >= 0 else None
+                for i, d in zip(idx.tolist(), dist.tolist())
+            ]
+
+        return {
+            "origins": snapped(o_idx, o_dist),
+            "destinations": snapped(d_idx, d_dist),
+            "duration_minutes": durations[np.ix_(o_pos, d_pos)] / 60,
+            "risk": risks[np.ix_(o_pos, d_pos)],
+        }
+
+    def get_isochrone(self, lat: float, lon: float, minutes: float, departure: Optional[datetime] = None,
+                      hull: Optional[str] = None, concave_ratio: float = 0.3,
+                      max_snap_distance_m: Optional[float] = None):
+        """
+        Every stop reachable within `minutes` from the stop nearest to (lat, lon), with its
+        fastest arrival and the risk along that path, from one duration-bounded one-to-all
+        search. With `departure` the risk is that hour of the week's and each stop also gets
+        an arrival time; `hull` ("convex" or "concave") adds the area spanned by the reached
+        stops as GeoJSON.
+        """
+        g = self._current()
+
+        nearest = g.find_nearest_stops(lat, lon, k=1, max_distance_m=max_snap_distance_m)
+        if not nearest:
             return None
+        start_node, snap_distance = nearest[0]
 
-        try:
-            path = nx.shortest_path(self.graph, start_node, end_node, weight='weight')
-
-            # Reconstruct details
-            route_details = []
-            total_duration = 0
-            total_risk = 0
-
-            for i in range(len(path) - 1):
-                u, v = path[i], path[i+1]
-                edge = self.graph[u][v]
-                stop_info = self.stops[v]
-
-                segment = {
-                    "from_stop": self.stops[u]['name'],
-                    "to_stop": stop_info['name'],
-                    "route_id": edge['route_id'],
-                    "duration_sec": edge['duration'],
-                    "stop_risk_score": stop_info['risk_score']
-                }
-                route_details.append(segment)
-                total_duration += edge['duration']
-                total_risk += stop_info['risk_score']
+        tree = g.isochrone_tree(g.stop_pos[start_node], minutes, departure)
+        budget_sec = minutes * 60
+        reached = sorted((label[0], v, label[1]) for v, label in tree.items() if label[0] <= budget_sec)
 
-            return {
-                "start_stop": self.stops[start_node]['name'],
-                "end_stop": self.stops[end_node]['name'],
-                "segments": route_details,
-                "total_duration_minutes": total_duration / 60,
-                "total_accumulated_risk": total_risk
+        stops = []
+        for duration, v, risk in reached:
+            info = g.stops.at(v)
+            stop = {
+                "stop_id": str(g.stop_ids[v]),
+                "stop_name": info['name'],
+                "lat": info['lat'],
+                "lon": info['lon'],
+                "arrival_minutes": duration / 60,
+                "accumulated_risk": risk
             }
+            if departure is not None:
+                stop["arrival_time"] = (departure + timedelta(seconds=duration)).isoformat()
+            stops.append(stop)
+
+        result = {
+            "start_stop": g.stops[start_node]['name'],
+            "snap_distance_m": snap_distance,
+            "minutes": minutes,
+            "stops": stops
+        }
+        if departure is not None:
+            result["departure_time"] = departure.isoformat()
+        if hull is not None:
+            result["polygon"] = isochrone_polygon([(s['lon'], s['lat']) for s in stops], hull, concave_ratio)
+        return result
+
+    def get_route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+                  algorithm: Optional[str] = None, departure: Optional[datetime] = None):
+        """
+        Least risk-weighted path. algorithm: "ch" (contraction hierarchy, the default when one
+        was built), "bidirectional" or "astar". With `departure` the risk of that hour of the
+        week is used instead of the all-day score; the hierarchy only covers the latter.
+        """
+        g = self._current()
+
+        start_node = g.find_nearest_stop(start_lat, start_lon)
+        end_node = g.find_nearest_stop(end_lat, end_lon)
+
+        if not start_node or not end_node:
+            return None
 
-        except nx.NetworkXNoPath:
+        if algorithm is None:
+            algorithm = "ch" if g.ch is not None and departure is None else DEFAULT_ALGORITHM
+        if algorithm == "ch":
+            if g.ch is None:
+                raise ValueError("No contraction hierarchy built for this graph (run src/contraction.py)")
+            if departure is not None:
+                raise ValueError("The contraction hierarchy has no time-of-day risk weights")
+            path = g.ch.shortest_path(g.stop_pos[start_node], g.stop_pos[end_node])
+        else:
+            engine, _ = g.engine_for(departure)
+            path = engine.shortest_path(g.stop_pos[start_node], g.stop_pos[end_node], algorithm)
+        if path is None:
             return None
 
+        return {
+            "start_stop": g.stops[start_node]['name'],
+            "end_stop": g.stops[end_node]['name'],
+            **g.route_details(path)
+        }
+
+    def get_route_alternatives(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+                               departure: Optional[datetime] = None, max_routes: Optional[int] = 8):
+        """
+        Pareto-optimal routes trading travel time against accumulated risk, from the fastest
+        to the safest, found in one multi-criteria search on the static graph (see
+        ShortestPathEngine.pareto_paths). With `departure` risk is that of the hour of the
+        week. At most `max_routes` routes, spread over the front; None returns all of them.
+        """
+        g = self._current()
+
+        start_node = g.find_nearest_stop(start_lat, start_lon)
+        end_node = g.find_nearest_stop(end_lat, end_lon)
+        if not start_node or not end_node:
+            return None
+
+        stop_risk = None
+        if departure is not None:
+            local = _local_time(departure)
+            stop_risk = g.arrays.hourly_risk[local.weekday(), local.hour]
+        paths = g.engine.pareto_paths(g.stop_pos[start_node], g.stop_pos[end_node], max_routes, stop_risk)
+        if not paths:
+            return None
+
+        return {
+            "start_stop": g.stops[start_node]['name'],
+            "end_stop": g.stops[end_node]['name'],
+            "routes": [g.route_details(path, stop_risk) for _, _, path in paths]
+        }
+
+    def get_journey(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float, departure: datetime):
+        """Earliest-arrival journey on the timetable leaving at or after `departure` (naive = local time)."""
+        g = self._current()
+
+        departure = _local_time(departure)
+
+        start_node = g.find_nearest_stop(start_lat, start_lon)
+        end_node = g.find_nearest_stop(end_lat, end_lon)
+
+        if not start_node or not end_node:
+            return None
+
+        journey = g.timetable.earliest_arrival(g.stop_pos[start_node], g.stop_pos[end_node], departure)
+        if journey is None:
+            return None
+
+        tt = g.timetable
+        midnight = datetime.combine(departure.date(), datetime.min.time())
+        route_details = []
+        total_risk = 0
+
+        for dep_stop, arr_stop, dep_sec, arr_sec, trip in journey:
+            stop_info = g.stops.at(arr_stop)
+            segment = {
+                "from_stop": g.stops.at(dep_stop)['name'],
+                "to_stop": stop_info['name'],
+                "route_id": WALK_ROUTE_ID,
+                "trip_id": None,
+                "departure_time": (midnight + timedelta(seconds=dep_sec)).isoformat(),
+                "arrival_time": (midnight + timedelta(seconds=arr_sec)).isoformat(),
+                "duration_sec": float(arr_sec - dep_sec),
+                "stop_risk_score": stop_info['risk_score']
+            }
+            if trip == WALK_TRIP:
+                segment["walk_risk_score"] = float(tt.foot_risk[tt.footpath(dep_stop, arr_stop)])
+                total_risk += segment["walk_risk_score"]
+            else:
+                trip %= len(tt.trip_ids)  # previous-day trips are numbered after today's
+                segment["route_id"] = str(tt.route_ids[tt.trip_route[trip]])
+                segment["trip_id"] = str(tt.trip_ids[trip])
+            route_details.append(segment)
+            total_risk += stop_info['risk_score']
+
+        arrival = midnight + timedelta(seconds=journey[-1][3]) if journey else departure
+        trips = [trip for *_, trip in journey if trip != WALK_TRIP]
+        return {
+            "start_stop": g.stops[start_node]['name'],
+            "end_stop": g.stops[end_node]['name'],
+            "departure_time": departure.isoformat(),
+            "arrival_time": arrival.isoformat(),
+            "segments": route_details,
+            "transfers": sum(1 for a, b in zip(trips, trips[1:]) if a != b),
+            # Includes waiting at the origin for the first vehicle
+            "total_duration_minutes": (arrival - departure).total_seconds() / 60,
+            "total_accumulated_risk": total_risk
+        }
+
+def isochrone_polygon(points, hull: str = "convex", concave_ratio: float = 0.3):
+    """
+    GeoJSON geometry around (lon, lat) points. "concave" follows the points more tightly the
+    lower `concave_ratio` (0..1, 1 = convex hull); fewer than three points give a point or line.
+    """
+    from shapely import concave_hull
+    from shapely.geometry import MultiPoint, mapping
+
+    geometry = MultiPoint(points)
+    if hull == "convex":
+        geometry = geometry.convex_hull
+    elif hull == "concave":
+        geometry = concave_hull(geometry, ratio=concave_ratio)
+    else:
+        raise ValueError(f"Unknown hull {hull!r}")
+    return mapping(geometry)
+
+def _local_time(moment: datetime) -> datetime:
+    """Naive local time of the feed; naive datetimes are taken as local already."""
+    if moment.tzinfo is not None:
+        return moment.astimezone(TIMEZONE).replace(tzinfo=None)
+    return moment
+
 router = TransportRouter()
@@ -0,0 +1,209 @@
+import math
+from collections.abc import Mapping
+from typing import Optional, Tuple
+
+import numpy as np
+
+from graph_snapshot import TransportGraph
+from pathfinding import EARTH_RADIUS_M, haversine_m
+
+# Snapshot component holding the arrays below
+COMPONENT = "stop_index"
+# Average number of stops per grid cell the cell size is chosen for
+STOPS_PER_CELL = 4
+MIN_CELL_M = 50.0
+M_PER_DEG = EARTH_RADIUS_M * math.pi / 180
+
+
+def build_stop_index(graph: TransportGraph) -> dict:
+    """
+    Flat arrays for StopIndex: the stops bucketed into a lat/lon grid (cell k, row-major,
+    owns cell_stops[cell_ptr[k]:cell_ptr[k + 1]]) and the stop ids in sorted order.
+    grid holds (lat0, lon0, cell height and width in degrees, rows, cols, largest |lat|).
+    """
+    lat, lon = np.asarray(graph.stop_lat, dtype=np.float64), np.asarray(graph.stop_lon, dtype=np.float64)
+    stop_ids = np.asarray(graph.stop_ids)
+    id_order = np.argsort(stop_ids, kind="stable").astype(np.int32)
+    if len(lat) == 0:
+        return {"grid": np.array([0.0, 0.0, 1.0, 1.0, 0, 0, 0.0]), "cell_ptr": np.zeros(1, dtype=np.int64),
+                "cell_stops": np.zeros(0, dtype=np.int32), "sorted_ids": stop_ids[id_order], "id_order": id_order}
+
+    max_abs_lat = float(np.max(np.abs(lat)))
+    lon_scale = M_PER_DEG * math.cos(math.radians(max_abs_lat))
+    height_m = (lat.max() - lat.min()) * M_PER_DEG
+    width_m = (lon.max() - lon.min()) * lon_scale
+    # The second term keeps the cell count linear in the stops when they lie (nearly) on a line
+    cell_m = max(math.sqrt(height_m * width_m * STOPS_PER_CELL / len(lat)),
+                 max(height_m, width_m) * STOPS_PER_CELL / len(lat), MIN_CELL_M)
+    # Cells are at least cell_m wide everywhere in the grid: the width uses the latitude
+    # furthest from the equator
+    dlat, dlon = cell_m / M_PER_DEG, cell_m / lon_scale
+    lat0, lon0 = float(lat.min()), float(lon.min())
+    rows = int((lat.max() - lat0) // dlat) + 1
+    cols = int((lon.max() - lon0) // dlon) + 1
+
+    row = np.minimum(((lat - lat0) // dlat).astype(np.int64), rows - 1)
+    col = np.minimum(((lon - lon0) // dlon).astype(np.int64), cols - 1)
+    cell = row * cols + col
+    cell_ptr = np.zeros(rows * cols + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell, minlength=rows * cols), out=cell_ptr[1:])
+    return {
+        "grid": np.array([lat0, lon0, dlat, dlon, rows, cols, max_abs_lat]),
+        "cell_ptr": cell_ptr,
+        "cell_stops": np.argsort(cell, kind="stable").astype(np.int32),
+        "sorted_ids": stop_ids[id_order],
+        "id_order": id_order,
+    }
+
+
+class StopIndex:
+    """
+    Nearest-stop and stop-id lookups over the arrays of build_stop_index(), which are saved
+    with the graph snapshot: every process serving a snapshot memory-maps the same pages
+    instead of building its own tree and dicts.
+
+    Searches visit the grid cells ring by ring outwards from the query's cell until no
+    unvisited cell can hold a closer stop; distances are exact haversine metres.
+    """
+
+    def __init__(self, graph: TransportGraph, arrays: dict):
+        self.stop_ids = graph.stop_ids
+        self._lat, self._lon = graph.stop_lat, graph.stop_lon
+        self.cell_ptr, self.cell_stops = arrays["cell_ptr"], arrays["cell_stops"]
+        self.sorted_ids, self.id_order = arrays["sorted_ids"], arrays["id_order"]
+        lat0, lon0, dlat, dlon, rows, cols, max_abs_lat = np.asarray(arrays["grid"]).tolist()
+        self._lat0, self._lon0, self._dlat, self._dlon = lat0, lon0, dlat, dlon
+        self._rows, self._cols, self._max_abs_lat = int(rows), int(cols), max_abs_lat
+
+    def __len__(self) -> int:
+        return len(self.stop_ids)
+
+    def position(self, stop_id: str) -> int:
+        """Index of `stop_id`, -1 if there is no such stop."""
+        i = int(np.searchsorted(self.sorted_ids, stop_id))
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == stop_id:
+            return int(self.id_order[i])
+        return -1
+
+    def _ring(self, row: int, col: int, r: int) -> np.ndarray:
+        """Stops in the cells exactly `r` cells (Chebyshev) from (row, col)."""
+        rows, cols, ptr = self._rows, self._cols, self.cell_ptr
+        c0, c1 = max(col - r, 0), min(col + r, cols - 1)
+        if c0 > c1:
+            return self.cell_stops[:0]
+        parts = []
+        for rr in range(max(row - r, 0), min(row + r, rows - 1) + 1):
+            if abs(rr - row) == r:
+                # Top and bottom row of the ring: one contiguous run of cells
+                parts.append(self.cell_stops[ptr[rr * cols + c0]:ptr[rr * cols + c1 + 1]])
+            else:
+                for cc in (col - r, col + r):
+                    if 0 <= cc < cols:
+                        parts.append(self.cell_stops[ptr[rr * cols + cc]:ptr[rr * cols + cc + 1]])
+        return np.concatenate(parts) if parts else self.cell_stops[:0]
+
+    def _bound(self, r: int, cos_lat: float) -> float:
+        """Lower bound in metres on the distance to any stop more than `r` cells away."""
+        lat_bound = EARTH_RADIUS_M * math.radians(r * self._dlat)
+        dlon = min(math.radians(r * self._dlon), math.pi)
+        lon_bound = 2 * EARTH_RADIUS_M * math.asin(min(1.0, cos_lat * math.sin(dlon / 2)))
+        return min(lat_bound, lon_bound)
+
+    def query(self, lat: float, lon: float, k: Optional[int] = 1,
+              max_distance_m: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Stop indices and distances in metres, nearest first: the `k` nearest stops, or with
+        k=None every stop, within `max_distance_m` if given.
+        """
+        if k is None and max_distance_m is None:
+            raise ValueError("k=None needs max_distance_m")
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0))
+        if len(self) == 0 or k == 0:
+            return empty
+
+        row = math.floor((lat - self._lat0) / self._dlat)
+        col = math.floor((lon - self._lon0) / self._dlon)
+        # Rings closer than the grid's edge are empty when the point lies outside it
+        r = max(0, -row, row - (self._rows - 1), -col, col - (self._cols - 1))
+        last = max(row, self._rows - 1 - row, col, self._cols - 1 - col)
+        cos_lat = math.cos(math.radians(max(abs(lat), self._max_abs_lat)))
+
+        found, distances, n_found = [], [], 0
+        while r <= last:
+            idx = self._ring(row, col, r)
+            if len(idx):
+                found.append(idx)
+                distances.append(haversine_m(lat, lon, np.asarray(self._lat)[idx], np.asarray(self._lon)[idx]))
+                n_found += len(idx)
+            bound = self._bound(r, cos_lat)
+            if max_distance_m is not None and bound > max_distance_m:
+                break
+            if k is not None and n_found >= k and np.partition(np.concatenate(distances), k - 1)[k - 1] <= bound:
+                break
+            r += 1
+
+        if not found:
+            return empty
+        idx, dist = np.concatenate(found).astype(np.int64), np.concatenate(distances)
+        if max_distance_m is not None:
+            keep = dist <= max_distance_m
+            idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")[:k]
+        return idx[order], dist[order]
+
+    def snap(self, points, max_distance_m: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest stop index and distance in metres for each (lat, lon); index -1 where the
+        nearest stop is further than `max_distance_m`.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        idx, dist = np.full(len(points), -1, dtype=np.int64), np.full(len(points), np.inf)
+        for n, (lat, lon) in enumerate(points.tolist()):
+            i, d = self.query(lat, lon, k=1)
+            if len(i):
+                idx[n], dist[n] = i[0], d[0]
+        if max_distance_m is not None:
+            idx = np.where(dist <= max_distance_m, idx, -1)
+        return idx, dist
+
+
+class StopPositions(Mapping):
+    """Stop id -> stop index, answered from the index's sorted ids."""
+
+    def __init__(self, index: StopIndex):
+        self._index = index
+
+    def __getitem__(self, stop_id) -> int:
+        i = self._index.position(stop_id)
+        if i < 0:
+            raise KeyError(stop_id)
+        return i
+
+    def __iter__(self):
+        return iter(self._index.stop_ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class StopTable(Mapping):
+    """Stop id -> {'name', 'lat', 'lon', 'risk_score'}, read from the graph arrays on access."""
+
+    def __init__(self, graph: TransportGraph, index: StopIndex):
+        self._graph = graph
+        self._positions = StopPositions(index)
+
+    def at(self, i: int) -> dict:
+        """Stop by index."""
+        g = self._graph
+        return {'name': str(g.stop_names[i]), 'lat': float(g.stop_lat[i]), 'lon': float(g.stop_lon[i]),
+                'risk_score': float(g.risk_score[i])}
+
+    def __getitem__(self, stop_id) -> dict:
+        return self.at(self._positions[stop_id])
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
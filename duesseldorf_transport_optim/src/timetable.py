@@ -0,0 +1,342 @@
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_DAY = 86400
+# Minimum time to change vehicles at a stop; staying on the same trip needs none
+MIN_TRANSFER_SEC = 60
+# Only trips running within this window after the requested departure are searched
+MAX_JOURNEY_SEC = 4 * 3600
+# Rounds of the search = vehicles per journey (MAX_TRIPS - 1 transfers)
+MAX_TRIPS = 8
+# Search windows start on these boundaries so concurrent queries share (cached) windows
+WINDOW_BUCKET_SEC = 900
+# "Not reached" for the integer arrival arrays
+UNREACHED = np.iinfo(np.int32).max
+# Trip of the journey legs walked between nearby stops
+WALK_TRIP = -1
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+ARRAY_NAMES = [
+    "dep_stop", "arr_stop", "dep_time", "arr_time",
+    "trip_ptr", "trip_first_dep", "trip_last_arr", "trip_ids", "trip_route", "route_ids", "trip_service",
+    "service_ids", "service_days", "service_start", "service_end",
+    "foot_ptr", "foot_stop", "foot_sec", "foot_risk",
+]
+
+# (dep_stop, arr_stop, dep_time, arr_time, trip), times in seconds after midnight of the query day;
+# trip is WALK_TRIP for a footpath
+Connection = Tuple[int, int, int, int, int]
+
+
+class Timetable:
+    """
+    Elementary connections (one vehicle running from one stop to the next) as flat arrays.
+
+    Connections are grouped by trip (trip k owns trip_ptr[k]:trip_ptr[k + 1]) and sorted by
+    departure within each trip. Stops are the integer stop indices of the TransportGraph.
+    Times are seconds after the start of the trip's service day and may exceed 24h for
+    trips running past midnight.
+
+    Footpaths from stop u are foot_stop[foot_ptr[u]:foot_ptr[u + 1]], with their walking
+    time in seconds and the accidents along the way.
+    """
+
+    def __init__(self, arrays: dict):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self._active = {}
+        self._windows = {}
+        self._n_stops = None
+
+    @property
+    def n_stops(self) -> int:
+        """Highest stop index used plus one."""
+        if self._n_stops is None:
+            self._n_stops = max(int(max(np.max(self.dep_stop, initial=-1), np.max(self.arr_stop, initial=-1))) + 1,
+                                len(self.foot_ptr) - 1)
+        return self._n_stops
+
+    @property
+    def n_connections(self) -> int:
+        return len(self.dep_time)
+
+    @property
+    def n_trips(self) -> int:
+        return len(self.trip_ids)
+
+    def arrays(self) -> dict:
+        return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+    def footpath(self, u: int, v: int) -> int:
+        """Index of the footpath from stop u to stop v in the foot_* arrays, -1 if there is none."""
+        start, end = int(self.foot_ptr[u]), int(self.foot_ptr[u + 1])
+        hits = np.flatnonzero(np.asarray(self.foot_stop[start:end]) == v)
+        return start + int(hits[0]) if len(hits) else -1
+
+    def _walk(self, stops: np.ndarray, arrival: np.ndarray):
+        """
+        Stops reached earlier than `arrival` by walking from `stops` (at their arrival), as
+        (reached stops, stop walked from, departure, arrival), sorted by reached stop.
+        """
+        foot_ptr = np.asarray(self.foot_ptr)
+        lengths = foot_ptr[stops + 1] - foot_ptr[stops]
+        offsets = np.zeros(len(stops), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        f = np.arange(lengths.sum()) - np.repeat(offsets - foot_ptr[stops], lengths)
+        walk_from = np.repeat(stops, lengths)
+        walk_to = np.asarray(self.foot_stop)[f].astype(np.intp)
+        walk_dep = arrival[walk_from]
+        walk_arr = walk_dep + np.asarray(self.foot_sec)[f]
+
+        best = np.full(len(arrival), UNREACHED, dtype=np.int64)
+        np.minimum.at(best, walk_to, walk_arr)
+        hit = (walk_arr == best[walk_to]) & (walk_arr < arrival[walk_to])
+        # One footpath per reached stop that achieves its new arrival
+        reached, first = np.unique(walk_to[hit], return_index=True)
+        return reached, walk_from[hit][first], walk_dep[hit][first], walk_arr[hit][first]
+
+    def active_trips(self, day: date) -> np.ndarray:
+        """Boolean mask over trips whose calendar.txt service runs on `day`."""
+        if day not in self._active:
+            d = np.datetime64(day, "D")
+            running = (
+                (np.asarray(self.service_days)[:, day.weekday()] == 1)
+                & (np.asarray(self.service_start) <= d)
+                & (np.asarray(self.service_end) >= d)
+            )
+            trip_service = np.asarray(self.trip_service)
+            # Trips whose service is not in calendar.txt never run
+            mask = np.zeros(len(trip_service), dtype=bool)
+            known = trip_service >= 0
+            mask[known] = running[trip_service[known]]
+            if len(self._active) >= 16:
+                self._active.clear()
+            self._active[day] = mask
+        return self._active[day]
+
+    def _running_trips(self, day: date, start_sec: int, end_sec: int) -> np.ndarray:
+        """Trips of `day`'s services that are on the road at some point in [start_sec, end_sec)."""
+        return np.flatnonzero(
+            self.active_trips(day)
+            & (np.asarray(self.trip_first_dep) < end_sec)
+            & (np.asarray(self.trip_last_arr) > start_sec)
+        )
+
+    def window(self, day: date, start_sec: int, end_sec: int):
+        """
+        Connections of the trips running on `day` between start_sec and end_sec, including
+        trips of the previous service day that run past midnight, as
+        (dep_stop, arr_stop, dep_time, arr_time, seg_trip, seg_starts, trips).
+
+        Times are relative to midnight of `day`. The connections of window trip j are
+        seg_starts[j]:seg_starts[j + 1]; trips[j] is its trip index, previous-day trips are
+        numbered after today's (trip + n_trips) so a trip running on both days stays two vehicles.
+        """
+        key = (day, start_sec, end_sec)
+        if key in self._windows:
+            return self._windows[key]
+
+        today = self._running_trips(day, start_sec, end_sec)
+        previous = self._running_trips(day - timedelta(days=1), start_sec + SECONDS_PER_DAY, end_sec + SECONDS_PER_DAY)
+        trips = np.concatenate([today, previous])
+        shift = np.concatenate([np.zeros(len(today), dtype=np.int32), np.full(len(previous), SECONDS_PER_DAY, dtype=np.int32)])
+
+        trip_ptr = np.asarray(self.trip_ptr)
+        lengths = trip_ptr[trips + 1] - trip_ptr[trips]
+        seg_starts = np.zeros(len(trips), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=seg_starts[1:])
+        idx = np.arange(lengths.sum()) - np.repeat(seg_starts, lengths) + np.repeat(trip_ptr[trips], lengths)
+        shift = np.repeat(shift, lengths)
+
+        window = (
+            # intp so the per-round gathers by stop need no index conversion
+            np.asarray(self.dep_stop[idx]).astype(np.intp),
+            np.asarray(self.arr_stop[idx]).astype(np.intp),
+            np.asarray(self.dep_time[idx]) - shift,
+            np.asarray(self.arr_time[idx]) - shift,
+            np.repeat(np.arange(len(trips)), lengths),
+            seg_starts,
+            np.concatenate([today, previous + self.n_trips]),
+        )
+        if len(self._windows) >= 8:
+            self._windows.clear()
+        self._windows[key] = window
+        return window
+
+    def earliest_arrival(self, source: int, target: int, departure: datetime,
+                         horizon_sec: int = MAX_JOURNEY_SEC, max_trips: int = MAX_TRIPS) -> Optional[List[Connection]]:
+        """
+        The connections of the journey from `source` departing at or after `departure` that
+        reaches `target` first, or None if it is not reachable within the horizon.
+
+        Round-based like RAPTOR, vectorized over whole trips: round k boards trips at the
+        first connection whose stop is ready (reached in an earlier round plus transfer time)
+        and rides them to the end, so after round k every stop holds its earliest arrival with
+        at most k vehicles. After each round (and once from `source` before the first) the
+        footpaths from the stops a vehicle improved are walked, so legs alternate between
+        vehicles and at most one walk; a walk's end is ready to board on arrival.
+        """
+        if source == target:
+            return []
+
+        start_sec = departure.hour * 3600 + departure.minute * 60 + departure.second
+        # Connections before start_sec in the bucketed window are never boardable
+        bucket = start_sec - start_sec % WINDOW_BUCKET_SEC
+        dep_stop, arr_stop, dep_time, arr_time, seg_trip, seg_starts, trips = self.window(
+            departure.date(), bucket, bucket + WINDOW_BUCKET_SEC + horizon_sec
+        )
+        if len(dep_time) == 0:
+            return None
+
+        n_stops = max(source, target, self.n_stops - 1) + 1
+        seg_ends = np.append(seg_starts[1:], len(dep_time))
+        ready = np.full(n_stops, UNREACHED, dtype=np.int32)
+        ready[source] = start_sec
+        arrival = np.full(n_stops, UNREACHED, dtype=np.int32)
+        arrival[source] = start_sec
+        marked = np.zeros(n_stops, dtype=bool)
+        marked[source] = True
+        # Per round: (stops improved by a vehicle, boarding connection, alighting connection,
+        # then stops improved by a walk, stop walked from, walk departure, walk arrival);
+        # round 0 only walks from the source
+        walked = self._walk(np.array([source]), arrival)
+        no_ride = np.zeros(0, dtype=np.int64)
+        rounds = [(no_ride, no_ride, no_ride, *walked)]
+        arrival[walked[0]] = ready[walked[0]] = walked[3]
+        marked[walked[0]] = True
+
+        for _ in range(max_trips):
+            # Only trips passing a stop improved in the last round can board earlier than before;
+            # each is boarded at its first such connection and ridden to the end of the trip
+            board = np.flatnonzero(np.where(marked, ready, UNREACHED)[dep_stop] <= dep_time)
+            if len(board) == 0:
+                break
+            board = board[np.r_[True, seg_trip[board[1:]] != seg_trip[board[:-1]]]]
+            lengths = seg_ends[seg_trip[board]] - board
+            offsets = np.zeros(len(board), dtype=np.int64)
+            np.cumsum(lengths[:-1], out=offsets[1:])
+            r = np.arange(lengths.sum()) - np.repeat(offsets - board, lengths)
+            boarded_at = np.repeat(board, lengths)
+            keep = dep_time[r] < arrival[target]
+            r, boarded_at = r[keep], boarded_at[keep]
+
+            best = np.full(n_stops, UNREACHED, dtype=np.int32)
+            np.minimum.at(best, arr_stop[r], arr_time[r])
+            improved = best < arrival
+            if not improved.any():
+                break
+
+            # One connection per improved stop that achieves the new arrival
+            hit = improved[arr_stop[r]] & (arr_time[r] == best[arr_stop[r]])
+            alight = np.full(n_stops, -1)
+            alight_board = np.full(n_stops, -1)
+            alight[arr_stop[r[hit]]] = r[hit]
+            alight_board[arr_stop[r[hit]]] = boarded_at[hit]
+            stops = np.flatnonzero(improved)
+
+            arrival[stops] = best[stops]
+            ready[stops] = best[stops] + MIN_TRANSFER_SEC
+            walked = self._walk(stops, arrival)
+            arrival[walked[0]] = ready[walked[0]] = walked[3]
+            marked = improved
+            marked[walked[0]] = True
+            rounds.append((stops, alight_board[stops], alight[stops], *walked))
+
+        if arrival[target] == UNREACHED:
+            return None
+
+        # Walk back through the rounds: each vehicle leg boarded at a stop reached in an earlier
+        # round, each walk started at a stop a vehicle reached in the same round (or the source)
+        journey = []
+        stop, k, can_walk = target, len(rounds) - 1, True
+        while stop != source:
+            while True:
+                stops, board, alight, walk_to, walk_from, walk_dep, walk_arr = rounds[k]
+                w = np.searchsorted(walk_to, stop)
+                if can_walk and w < len(walk_to) and walk_to[w] == stop:
+                    break
+                i = np.searchsorted(stops, stop)
+                if i < len(stops) and stops[i] == stop:
+                    break
+                k, can_walk = k - 1, True
+            if can_walk and w < len(walk_to) and walk_to[w] == stop:
+                journey.append((int(walk_from[w]), stop, int(walk_dep[w]), int(walk_arr[w]), WALK_TRIP))
+                stop, can_walk = int(walk_from[w]), False
+                continue
+            b, a = int(board[i]), int(alight[i])
+            trip = int(trips[seg_trip[b]])
+            journey.extend((int(dep_stop[j]), int(arr_stop[j]), int(dep_time[j]), int(arr_time[j]), trip)
+                           for j in range(a, b - 1, -1))
+            stop, k, can_walk = int(dep_stop[b]), k - 1, True
+        journey.reverse()
+        return journey
+
+
+def build_timetable(stop_ids, connections_df: pd.DataFrame, trips_df: pd.DataFrame,
+                    calendar_df: pd.DataFrame, footpaths_df: Optional[pd.DataFrame] = None) -> Timetable:
+    """
+    connections_df: trip_id, from_stop, to_stop, departure_sec, arrival_sec (consecutive stop_times)
+    trips_df: trip_id, route_id, service_id
+    calendar_df: stg_gtfs_calendar (service_id, monday..sunday, start_date, end_date)
+    footpaths_df: from_stop, to_stop, walk_sec, risk_score (int_footpaths)
+    """
+    stop_pos = pd.Index(np.asarray(stop_ids).astype(str))
+    trip_ids = trips_df["trip_id"].astype(str).to_numpy()
+    route_codes, route_ids = pd.factorize(trips_df["route_id"].astype(str).to_numpy())
+    service_ids = calendar_df["service_id"].astype(str).to_numpy()
+    trip_service = pd.Index(service_ids).get_indexer(trips_df["service_id"].astype(str))
+
+    dep_stop = stop_pos.get_indexer(connections_df["from_stop"].astype(str))
+    arr_stop = stop_pos.get_indexer(connections_df["to_stop"].astype(str))
+    trip = pd.Index(trip_ids).get_indexer(connections_df["trip_id"].astype(str))
+    dep_time = connections_df["departure_sec"].to_numpy(dtype=np.int64)
+    arr_time = connections_df["arrival_sec"].to_numpy(dtype=np.int64)
+
+    known = (dep_stop >= 0) & (arr_stop >= 0) & (trip >= 0) & (arr_time >= dep_time)
+    order = np.lexsort((dep_time[known], trip[known]))
+    trip = trip[known][order]
+    dep_time = dep_time[known][order].astype(np.int32)
+    arr_time = arr_time[known][order].astype(np.int32)
+
+    trip_ptr = np.zeros(len(trip_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(trip, minlength=len(trip_ids)), out=trip_ptr[1:])
+    # Trips without connections get an empty time span and never enter a search window
+    trip_first_dep = np.full(len(trip_ids), np.iinfo(np.int32).max, dtype=np.int32)
+    trip_last_arr = np.full(len(trip_ids), np.iinfo(np.int32).min, dtype=np.int32)
+    np.minimum.at(trip_first_dep, trip, dep_time)
+    np.maximum.at(trip_last_arr, trip, arr_time)
+
+    if footpaths_df is None:
+        footpaths_df = pd.DataFrame(columns=["from_stop", "to_stop", "walk_sec", "risk_score"])
+    foot_from = stop_pos.get_indexer(footpaths_df["from_stop"].astype(str))
+    foot_to = stop_pos.get_indexer(footpaths_df["to_stop"].astype(str))
+    foot_known = (foot_from >= 0) & (foot_to >= 0)
+    foot_order = np.lexsort((foot_to[foot_known], foot_from[foot_known]))
+    foot_ptr = np.zeros(len(stop_pos) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(foot_from[foot_known], minlength=len(stop_pos)), out=foot_ptr[1:])
+
+    return Timetable({
+        "dep_stop": dep_stop[known][order].astype(np.int32),
+        "arr_stop": arr_stop[known][order].astype(np.int32),
+        "dep_time": dep_time,
+        "arr_time": arr_time,
+        "trip_ptr": trip_ptr,
+        "trip_first_dep": trip_first_dep,
+        "trip_last_arr": trip_last_arr,
+        "trip_ids": trip_ids.astype(str),
+        "trip_route": route_codes.astype(np.int32),
+        "route_ids": np.asarray(route_ids, dtype=str),
+        "trip_service": trip_service.astype(np.int32),
+        "service_ids": service_ids.astype(str),
+        "service_days": calendar_df[WEEKDAYS].to_numpy(dtype=np.uint8).reshape(-1, 7),
+        "service_start": pd.to_datetime(calendar_df["start_date"]).to_numpy().astype("datetime64[D]"),
+        "service_end": pd.to_datetime(calendar_df["end_date"]).to_numpy().astype("datetime64[D]"),
+        "foot_ptr": foot_ptr,
+        "foot_stop": foot_to[foot_known][foot_order].astype(np.int32),
+        # Rounded up so a walk never takes less than its precomputed time
+        "foot_sec": np.ceil(footpaths_df["walk_sec"].to_numpy(dtype=np.float64)[foot_known][foot_order]).astype(np.int32),
+        "foot_risk": footpaths_df["risk_score"].to_numpy(dtype=np.float64)[foot_known][foot_order],
+    })
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import ingestion
+from ingestion import download_file
+
+BODY = bytes(range(256)) * 1024  # 256 KiB, several download chunks
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """
+    Static file server for download_file: ETag / If-None-Match, Range with If-Range and 416,
+    plus a switch that cuts the next response off after a number of bytes.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        body, etag = server.body, server.etag
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            start = int(range_header.removeprefix("bytes=").rstrip("-"))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+
+        payload = body[start:]
+        if server.cut_after is not None:
+            payload, server.cut_after = payload[:server.cut_after], None
+            self.close_connection = True
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    httpd.body, httpd.etag, httpd.cut_after, httpd.requests = BODY, '"v1"', None, []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/data.zip"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ingestion.time, "sleep", lambda seconds: None)
+
+
+def paths(tmp_path):
+    dest = tmp_path / "data.zip"
+    return dest, tmp_path / "data.zip.part", tmp_path / "data.zip.meta.json"
+
+
+def test_download_records_validators_and_checksum(server, tmp_path):
+    dest, part, meta = paths(tmp_path)
+    assert download_file(server.url, dest) is True
+    assert dest.read_bytes() == BODY
+    assert not part.exists()
+    recorded = json.loads(meta.read_text())
+    assert recorded["etag"] == '"v1"'
+    assert recorded["size"] == len(BODY)
+    assert recorded["sha256"] == hashlib.sha256(BODY).hexdigest()
+
+
+def test_unchanged_file_is_skipped_via_etag(server, tmp_path):
+    dest, _, _ = paths(tmp_path)
+    download_file(server.url, dest)
+    assert download_file(server.url, dest) is False
+    assert server.requests[-1]["If-None-Match"] == '"v1"'
+    assert dest.read_bytes() == BODY
+
+
+def test_damaged_file_is_downloaded_again_instead_of_skipped(server, tmp_path):
+    dest, _, _ = paths(tmp_path)
+    download_file(server.url, dest)
+    dest.write_bytes(b"\0" * len(BODY))  # same size, different content
+    assert download_file(server.url, dest) is True
+    assert "If-None-Match" not in server.requests[-1]
+    assert dest.read_bytes() == BODY
+
+
+def test_truncated_transfer_leaves_no_destination_file(server, tmp_path):
+    dest, part, _ = paths(tmp_path)
+    server.cut_after = 100_000
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        download_file(server.url, dest, retries=0)
+    assert not dest.exists()
+    assert part.exists() and part.stat().st_size <= 100_000
+
+
+def test_interrupted_transfer_resumes_with_range(server, tmp_path):
+    dest, part, _ = paths(tmp_path)
+    server.cut_after = 100_000
+    assert download_file(server.url, dest, retries=1) is True
+    offset = int(server.requests[-1]["Range"].removeprefix("bytes=").rstrip("-"))
+    assert 0 < offset <= 100_000
+    assert server.requests[-1]["If-Range"] == '"v1"'
+    assert dest.read_bytes() == BODY
+    assert not part.exists()
+
+
+def test_changed_file_restarts_from_zero_on_if_range_mismatch(server, tmp_path):
+    dest, _, _ = paths(tmp_path)
+    server.cut_after = 100_000
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        download_file(server.url, dest, retries=0)
+
+    server.body, server.etag = BODY[::-1], '"v2"'
+    assert download_file(server.url, dest) is True
+    assert server.requests[-1]["If-Range"] == '"v1"'
+    assert dest.read_bytes() == BODY[::-1]
+    assert json.loads(dest.with_name("data.zip.meta.json").read_text())["etag"] == '"v2"'
+
+
+def test_unsatisfiable_range_restarts_from_zero(server, tmp_path):
+    dest, part, _ = paths(tmp_path)
+    part_meta = tmp_path / "data.zip.part.json"
+    # A leftover part longer than the file on the server
+    part.write_bytes(BODY + b"extra")
+    part_meta.write_text(json.dumps({"etag": '"v1"'}))
+    assert download_file(server.url, dest) is True
+    assert [r.get("Range") for r in server.requests] == [f"bytes={len(BODY) + 5}-", None]
+    assert dest.read_bytes() == BODY
+
+
+def test_checksum_mismatch_is_rejected(server, tmp_path):
+    dest, part, meta = paths(tmp_path)
+    with pytest.raises(IOError, match="checksum mismatch"):
+        download_file(server.url, dest, sha256="0" * 64)
+    assert not dest.exists()
+    assert not part.exists()
+    assert not meta.exists()
+
+
+def test_configured_checksum_is_accepted(server, tmp_path, monkeypatch):
+    dest, _, _ = paths(tmp_path)
+    monkeypatch.setitem(ingestion.CHECKSUMS, server.url, hashlib.sha256(BODY).hexdigest().upper())
+    assert download_file(server.url, dest) is True
+    assert dest.read_bytes() == BODY
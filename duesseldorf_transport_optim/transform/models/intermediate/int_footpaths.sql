@@ -0,0 +1,135 @@
+-- Walking transfers: one row per ordered pair of distinct stops within walking distance,
+-- with the walking time and the weighted accidents along the way
+
+-- Longest walk between two stops, straight-line metres
+{% set walk_radius_m = var('walk_radius_m', 400) %}
+-- Walking speed in m/s and how much longer the walk is than the straight line
+{% set walk_speed = var('walk_speed_mps', 1.2) %}
+{% set detour = var('walk_detour_factor', 1.3) %}
+-- Accidents this close to the straight line between the stops count for the footpath
+{% set corridor_m = var('walk_risk_corridor_m', 30) %}
+
+with stops as (
+    select * from {{ ref('stg_gtfs_stops') }}
+),
+
+accidents as (
+    select * from {{ ref('stg_accidents') }}
+),
+
+-- Same grid equi-join as int_stop_accidents, with cells walk_radius_m wide for the stop pairs
+-- and half that (plus the corridor) around footpath midpoints for the accidents: a footpath
+-- is at most walk_radius_m long, so every accident within corridor_m of it lies within
+-- walk_radius_m / 2 + corridor_m of its midpoint
+grid as (
+    select
+        {{ walk_radius_m }} / 111195.0 as cell_lat,
+        {{ walk_radius_m }} / (111195.0 * cos(radians(max(abs(stop_lat))))) as cell_lon,
+        ({{ walk_radius_m }} / 2.0 + {{ corridor_m }}) / 111195.0 as risk_cell_lat,
+        ({{ walk_radius_m }} / 2.0 + {{ corridor_m }}) / (111195.0 * cos(radians(max(abs(stop_lat))))) as risk_cell_lon
+    from stops
+),
+
+stop_cells as (
+    select
+        s.stop_id,
+        s.stop_lat,
+        s.stop_lon,
+        cast(floor(s.stop_lat / g.cell_lat) as bigint) as cell_y,
+        cast(floor(s.stop_lon / g.cell_lon) as bigint) as cell_x
+    from stops s
+    cross join grid g
+),
+
+-- Each unordered pair once (from_stop < to_stop); both directions are emitted at the end
+pairs as (
+    select
+        a.stop_id as from_stop,
+        b.stop_id as to_stop,
+        a.stop_lat as from_lat,
+        a.stop_lon as from_lon,
+        b.stop_lat as to_lat,
+        b.stop_lon as to_lon,
+        {{ haversine_m('a.stop_lat', 'a.stop_lon', 'b.stop_lat', 'b.stop_lon') }} as distance_m
+    from stop_cells a
+    cross join (select unnest(range(-1, 2)) as dy)
+    cross join (select unnest(range(-1, 2)) as dx)
+    join stop_cells b
+    on b.cell_y = a.cell_y + dy
+    and b.cell_x = a.cell_x + dx
+    and a.stop_id < b.stop_id
+),
+
+footpaths as (
+    select
+        p.*,
+        cast(floor((p.from_lat + p.to_lat) / 2 / g.risk_cell_lat) as bigint) as cell_y,
+        cast(floor((p.from_lon + p.to_lon) / 2 / g.risk_cell_lon) as bigint) as cell_x
+    from pairs p
+    cross join grid g
+    where p.distance_m <= {{ walk_radius_m }}
+),
+
+accident_cells as (
+    select
+        a.category,
+        a.lat,
+        a.lon,
+        cast(floor(a.lat / g.risk_cell_lat) as bigint) as cell_y,
+        cast(floor(a.lon / g.risk_cell_lon) as bigint) as cell_x
+    from accidents a
+    cross join grid g
+),
+
+-- Accident (acc_x, acc_y) and footpath end (end_x, end_y) in metres relative to the
+-- footpath start (equirectangular, exact enough over a few hundred metres)
+near_midpoint as (
+    select
+        f.from_stop,
+        f.to_stop,
+        a.category,
+        (a.lon - f.from_lon) * 111195.0 * cos(radians(f.from_lat)) as acc_x,
+        (a.lat - f.from_lat) * 111195.0 as acc_y,
+        (f.to_lon - f.from_lon) * 111195.0 * cos(radians(f.from_lat)) as end_x,
+        (f.to_lat - f.from_lat) * 111195.0 as end_y
+    from footpaths f
+    cross join (select unnest(range(-1, 2)) as dy)
+    cross join (select unnest(range(-1, 2)) as dx)
+    join accident_cells a
+    on a.cell_y = f.cell_y + dy
+    and a.cell_x = f.cell_x + dx
+),
+
+along_path as (
+    select
+        from_stop,
+        to_stop,
+        -- Same points as int_stop_accidents: Fatal = 5, Serious = 3, Minor = 1
+        sum(case when category = 1 then 5 when category = 2 then 3 else 1 end) as risk_score
+    from (
+        select
+            *,
+            -- Closest point of the segment to the accident, as a fraction of the way
+            greatest(0, least(1, (acc_x * end_x + acc_y * end_y) / nullif(end_x * end_x + end_y * end_y, 0))) as t
+        from near_midpoint
+    )
+    where sqrt(pow(acc_x - coalesce(t, 0) * end_x, 2) + pow(acc_y - coalesce(t, 0) * end_y, 2)) <= {{ corridor_m }}
+    group by 1, 2
+),
+
+scored as (
+    select
+        f.from_stop,
+        f.to_stop,
+        f.distance_m,
+        f.distance_m * {{ detour }} / {{ walk_speed }} as walk_sec,
+        coalesce(r.risk_score, 0) as risk_score
+    from footpaths f
+    left join along_path r
+    on f.from_stop = r.from_stop
+    and f.to_stop = r.to_stop
+)
+
+select from_stop, to_stop, distance_m, walk_sec, risk_score from scored
+union all
+select to_stop, from_stop, distance_m, walk_sec, risk_score from scored
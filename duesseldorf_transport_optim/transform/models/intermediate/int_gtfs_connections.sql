@@ -0,0 +1,38 @@
+-- One row per vehicle movement between consecutive stops of a trip, in one pass over
+-- stop_times with lead() instead of a self-join on stop_sequence + 1 (which misses
+-- stops when a feed's sequence numbers have gaps)
+with stop_times as (
+    select * from {{ ref('stg_gtfs_stop_times') }}
+),
+
+trips as (
+    select * from {{ ref('stg_gtfs_trips') }}
+),
+
+next_stops as (
+    select
+        trip_id,
+        stop_sequence,
+        stop_id as from_stop,
+        departure_sec,
+        lead(stop_id) over w as to_stop,
+        lead(arrival_sec) over w as arrival_sec
+    from stop_times
+    window w as (partition by trip_id order by stop_sequence)
+)
+
+select
+    c.trip_id,
+    t.route_id,
+    t.service_id,
+    c.stop_sequence,
+    c.from_stop,
+    c.to_stop,
+    c.departure_sec,
+    c.arrival_sec
+from next_stops c
+join trips t on c.trip_id = t.trip_id
+-- Last stop of each trip, and stops without times (non-timepoints) are left out
+where c.to_stop is not null
+  and c.departure_sec is not null
+  and c.arrival_sec >= c.departure_sec
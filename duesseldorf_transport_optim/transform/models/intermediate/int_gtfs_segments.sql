@@ -0,0 +1,20 @@
+-- Static graph edges: all connections between a stop pair aggregated into one segment
+
+-- GTFS times are often whole minutes, so consecutive stops can share one; the routing
+-- duration is at least this many seconds, which keeps the A* speed bound finite
+{% set min_segment_sec = var('min_segment_sec', 30) %}
+
+with connections as (
+    select * from {{ ref('int_gtfs_connections') }}
+)
+
+select
+    from_stop,
+    to_stop,
+    greatest(avg(arrival_sec - departure_sec), {{ min_segment_sec }}) as avg_duration,
+    min(arrival_sec - departure_sec) as min_duration,
+    quantile_cont(arrival_sec - departure_sec, 0.9) as p90_duration,
+    count(*) as trip_count,
+    mode(route_id) as route_id
+from connections
+group by 1, 2
@@ -2,8 +2,8 @@ with stops as (
     select * from {{ ref('stg_gtfs_stops') }}
 ),
 
-accidents as (
-    select * from {{ ref('stg_accidents') }}
+stop_accidents as (
+    select * from {{ ref('int_stop_accidents') }}
 ),
 
 stop_risk as (
@@ -12,20 +12,11 @@ stop_risk as (
         s.stop_name,
         s.stop_lat,
         s.stop_lon,
-        -- Count accidents within approx 500m (0.005 degrees roughly)
-        count(a.category) as accident_count,
-        -- Weighted score: Category 1 (Fatal) = 5 pts, Cat 2 (Serious) = 3 pts, Cat 3 (Minor) = 1 pt
-        sum(
-            case
-                when a.category = 1 then 5
-                when a.category = 2 then 3
-                else 1
-            end
-        ) as risk_score
+        -- Stops without accidents nearby score 0
+        count(a.stop_id) as accident_count,
+        coalesce(sum(a.points), 0) as risk_score
     from stops s
-    left join accidents a
-    on abs(s.stop_lat - a.lat) < 0.005
-    and abs(s.stop_lon - a.lon) < 0.005
+    left join stop_accidents a on s.stop_id = a.stop_id
     group by 1, 2, 3, 4
 )
 
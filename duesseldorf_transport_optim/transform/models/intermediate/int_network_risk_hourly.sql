@@ -0,0 +1,16 @@
+-- Risk per stop, weekday (0 = Monday) and hour of day, only for buckets with accidents.
+-- Scaled by the 7 x 24 buckets so that a stop whose accidents are spread evenly over the
+-- week scores its int_network_risk.risk_score in every bucket.
+with stop_accidents as (
+    select * from {{ ref('int_stop_accidents') }}
+)
+
+select
+    stop_id,
+    weekday,
+    hour,
+    count(*) as accident_count,
+    sum(points) * 7 * 24 as risk_score
+from stop_accidents
+where weekday is not null and hour between 0 and 23
+group by 1, 2, 3
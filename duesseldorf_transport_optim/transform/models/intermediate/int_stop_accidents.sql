@@ -0,0 +1,95 @@
+-- One row per (stop, accident) pair within the risk radius with the accident's weighted
+-- points; int_network_risk and int_network_risk_hourly aggregate it
+{{ config(materialized='view') }}
+
+-- Radius around a stop in which accidents count, in metres
+{% set radius_m = var('risk_radius_m', 500) %}
+-- Distance decay of an accident's weight: 'none', 'linear' (0 at the radius)
+-- or 'gaussian' (sigma = radius / 2)
+{% set decay = var('risk_decay', 'none') %}
+
+with stops as (
+    select * from {{ ref('stg_gtfs_stops') }}
+),
+
+accidents as (
+    select * from {{ ref('stg_accidents') }}
+),
+
+-- Grid cells at least radius_m wide in both directions (degrees of longitude shrink
+-- towards the poles, so their width is taken at the stop furthest from the equator),
+-- so every accident within the radius of a stop lies in the stop's cell or one of its
+-- 8 neighbours. This turns the spatial join into an equi-join on cell ids.
+grid as (
+    select
+        {{ radius_m }} / 111195.0 as cell_lat,
+        {{ radius_m }} / (111195.0 * cos(radians(max(abs(stop_lat))))) as cell_lon
+    from stops
+),
+
+accident_cells as (
+    select
+        a.category,
+        -- Unfallatlas counts weekdays from 1 = Sunday; 0 = Monday as in Python's date.weekday()
+        (a.weekday + 5) % 7 as weekday,
+        a.hour,
+        a.lat,
+        a.lon,
+        cast(floor(a.lat / g.cell_lat) as bigint) as cell_y,
+        cast(floor(a.lon / g.cell_lon) as bigint) as cell_x
+    from accidents a
+    cross join grid g
+),
+
+stop_cells as (
+    select
+        s.stop_id,
+        s.stop_lat,
+        s.stop_lon,
+        cast(floor(s.stop_lat / g.cell_lat) as bigint) + dy as cell_y,
+        cast(floor(s.stop_lon / g.cell_lon) as bigint) + dx as cell_x
+    from stops s
+    cross join grid g
+    cross join (select unnest(range(-1, 2)) as dy)
+    cross join (select unnest(range(-1, 2)) as dx)
+),
+
+nearby as (
+    select
+        sc.stop_id,
+        a.category,
+        a.weekday,
+        a.hour,
+        {{ haversine_m('sc.stop_lat', 'sc.stop_lon', 'a.lat', 'a.lon') }} as distance_m
+    from stop_cells sc
+    join accident_cells a
+    on sc.cell_y = a.cell_y
+    and sc.cell_x = a.cell_x
+),
+
+weighted as (
+    select
+        stop_id,
+        category,
+        weekday,
+        hour,
+        distance_m,
+        -- Category 1 (Fatal) = 5 pts, Cat 2 (Serious) = 3 pts, Cat 3 (Minor) = 1 pt
+        case
+            when category = 1 then 5
+            when category = 2 then 3
+            else 1
+        end
+        {% if decay == 'linear' %}
+        * (1 - distance_m / {{ radius_m }})
+        {% elif decay == 'gaussian' %}
+        * exp(-0.5 * pow(distance_m / ({{ radius_m }} / 2.0), 2))
+        {% elif decay != 'none' %}
+        {{ exceptions.raise_compiler_error("risk_decay must be 'none', 'linear' or 'gaussian', got '" ~ decay ~ "'") }}
+        {% endif %}
+        as points
+    from nearby
+    where distance_m <= {{ radius_m }}
+)
+
+select * from weighted
@@ -1,13 +1,14 @@
+-- Accidents in the routing area, one Parquet file per year (src/accidents_parquet.py)
 with source as (
-    select * from read_csv_auto('../data/raw/accidents/Unfallorte.csv')
+    select * from read_parquet('../data/staged/accidents/*/*.parquet', hive_partitioning = true)
 )
 select
-    UJAHR as year,
-    UMONAT as month,
-    USTUNDE as hour,
-    WOCHENTAG as weekday,
-    UKATEGORIE as category,
-    XGCSWGS84 as lon,
-    YGCSWGS84 as lat
+    cast(year as integer) as year,
+    month,
+    hour,
+    weekday,
+    category,
+    lon,
+    lat
 from source
 where lon is not null and lat is not null
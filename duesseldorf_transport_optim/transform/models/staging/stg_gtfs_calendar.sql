@@ -0,0 +1,15 @@
+with source as (
+    select * from read_parquet('../data/staged/gtfs/calendar.parquet')
+)
+select
+    service_id,
+    monday,
+    tuesday,
+    wednesday,
+    thursday,
+    friday,
+    saturday,
+    sunday,
+    start_date,
+    end_date
+from source
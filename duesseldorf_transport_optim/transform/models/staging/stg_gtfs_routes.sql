@@ -1,4 +1,4 @@
 with source as (
-    select * from read_csv_auto('../data/raw/gtfs/routes.txt')
+    select * from read_parquet('../data/staged/gtfs/routes.parquet')
 )
 select * from source
@@ -1,4 +1,6 @@
+-- arrival_sec/departure_sec are seconds since service-day midnight (>= 86400 for trips
+-- running past midnight), converted by src/gtfs_parquet.py
 with source as (
-    select * from read_csv_auto('../data/raw/gtfs/stop_times.txt')
+    select * from read_parquet('../data/staged/gtfs/stop_times.parquet')
 )
 select * from source
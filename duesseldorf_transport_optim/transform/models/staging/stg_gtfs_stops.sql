@@ -1,5 +1,5 @@
 with source as (
-    select * from read_csv_auto('../data/raw/gtfs/stops.txt')
+    select * from read_parquet('../data/staged/gtfs/stops.parquet')
 )
 select
     stop_id,
@@ -1,4 +1,4 @@
 with source as (
-    select * from read_csv_auto('../data/raw/gtfs/trips.txt')
+    select * from read_parquet('../data/staged/gtfs/trips.parquet')
 )
 select * from source
@@ -9,7 +9,7 @@ def run_command(command, cwd=None):
     result = subprocess.run(command, shell=True, cwd=cwd, check=True)
     return result
 
-def run_pipeline():
+def run_pipeline(cv=False):
     print("\n=== Starting Pipeline Execution ===")
 
     print("\n[Step 1] Data Ingestion (Incremental)")
@@ -18,7 +18,14 @@ def run_pipeline():
     print("\n[Step 2] Data Processing (dbt)")
     run_command("uv run dbt build --profiles-dir .", cwd="transform")
 
-    print("\n[Step 3] Model Training")
+    print("\n[Step 3] Feature Store Publish")
+    run_command("uv run src/feature_store.py")
+
+    if cv:
+        print("\n[Step 3b] Walk-forward CV Hyperparameter Search")
+        run_command("uv run src/tuning.py")
+
+    print("\n[Step 4] Model Training")
     run_command("uv run src/train.py")
 
     print("\n=== Pipeline Execution Completed ===")
@@ -27,6 +34,7 @@ def main():
     parser = argparse.ArgumentParser(description="DWD Weather Prediction Pipeline")
     parser.add_argument("--continuous", action="store_true", help="Run the pipeline continuously")
     parser.add_argument("--interval", type=int, default=86400, help="Interval in seconds for continuous mode (default: 24h)")
+    parser.add_argument("--cv", action="store_true", help="Run the XGBoost hyperparameter search before training")
 
     args = parser.parse_args()
 
@@ -34,14 +42,14 @@ def main():
         print(f"Starting continuous mode. Pipeline will run every {args.interval} seconds.")
         try:
             while True:
-                run_pipeline()
+                run_pipeline(cv=args.cv)
                 print(f"\nSleeping for {args.interval} seconds...")
                 time.sleep(args.interval)
         except KeyboardInterrupt:
             print("\nContinuous mode stopped by user.")
             sys.exit(0)
     else:
-        run_pipeline()
+        run_pipeline(cv=args.cv)
 
 if __name__ == "__main__":
     main()
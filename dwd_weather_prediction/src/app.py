@@ -1,38 +1,242 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-import duckdb
 import pandas as pd
 import joblib
-import torch
 import numpy as np
+import onnxruntime as ort
 from typing import Optional, Dict, List
+import asyncio
+import json
 import os
+import threading
+import time
+
+from src.feature_store import FeatureStore, current_version
+from src import model_registry
+from src.metrics import Registry, RequestTimings
 
 app = FastAPI(title="DWD Weather Prediction API")
 
 # Paths
-DB_PATH = "data/processed/weather.duckdb"
-MODEL_DIR = "models"
+MODEL_DIR = model_registry.REGISTRY_DIR
+ONNX_MANIFEST = "onnx_manifest.json"
+
+TARGETS = ['temp_min', 'temp_max', 'wind_speed', 'humidity', 'rain_prob']
+MODEL_TYPES = ('xgboost', 'lstm', 'tf', 'ensemble')
+
+# Seconds between checks of the registry's CURRENT pointer
+WATCH_INTERVAL = 10
+
+# Memory-mapped feature store, remapped only when a new version is published
+feature_store = None
+
+# Metrics exposed on /metrics
+metrics = Registry()
+REQUESTS = metrics.counter("weather_api_requests_total", "HTTP requests by path and status", ["path", "status"])
+REQUEST_LATENCY = metrics.histogram("weather_api_request_seconds", "End-to-end request latency", ["path"])
+PHASE_LATENCY = metrics.histogram("weather_api_predict_phase_seconds", "Time spent per /predict phase", ["phase"])
+MODEL_LATENCY = metrics.histogram("weather_api_model_inference_seconds", "Latency of a single model call", ["model"])
+FEATURE_STORE_LOOKUPS = metrics.counter("weather_api_feature_store_lookups_total",
+                                        "Feature store lookups by /predict, hit = already mapped version reused", ["result"])
+MODEL_SWAPS = metrics.counter("weather_api_model_swaps_total", "Model versions swapped in")
+MODELS_LOADED = metrics.gauge("weather_api_models_loaded", "Models in the active bundle", ["family"])
+DATA_STALENESS = metrics.gauge("weather_api_data_staleness_days", "Days between today and the latest feature row")
+
+def create_session(path):
+    """CPU-only ONNX Runtime session with full graph optimizations."""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+
+def get_feature_store(count_lookup=False):
+    """
+    Return the mapped feature store, switching to a newer published version if there is one.
+    Only /predict passes `count_lookup`, so scrapes and warm-ups do not skew the hit ratio.
+    """
+    global feature_store
+    if feature_store is None or feature_store.version != current_version():
+        if count_lookup:
+            FEATURE_STORE_LOOKUPS.inc(result="miss")
+        feature_store = FeatureStore.open()
+        print(f"Mapped feature store version {feature_store.version}")
+    elif count_lookup:
+        FEATURE_STORE_LOOKUPS.inc(result="hit")
+    return feature_store
+
+class ModelBundle:
+    """
+    All models of one registry version, loaded together and never mutated afterwards.
+
+    Requests grab the active bundle once, so a request that started on an old version
+    finishes on it even if a new version is swapped in meanwhile.
+    """
+    def __init__(self, path, version=None):
+        self.path = path
+        self.version = version
+        self.models = {}
+        # ONNX bundles exported by train.py: {'lstm': (session, output_names), 'tf': (...)}
+        self.onnx_sessions = {}
+        self.onnx_manifest = {}
+        self.load_time = None
+
+    @classmethod
+    def load(cls, path, version=None):
+        start = time.perf_counter()
+        bundle = cls(path, version)
 
-# Load models on startup
-models = {}
+        # Load XGBoost models for 7 days
+        for i in range(1, 8):
+            for target in TARGETS:
+                name = f"{target}_day_{i}"
+                model_path = os.path.join(path, f"xgb_{name}.pkl")
+                if os.path.exists(model_path):
+                    bundle.models[f"xgb_{name}"] = joblib.load(model_path)
+
+        # Load LSTM / TensorFlow networks exported to ONNX (one session per model family)
+        manifest_path = os.path.join(path, ONNX_MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                bundle.onnx_manifest = json.load(f)
+            for model_type in ('lstm', 'tf'):
+                if model_type in bundle.onnx_manifest:
+                    entry = bundle.onnx_manifest[model_type]
+                    bundle.onnx_sessions[model_type] = (create_session(os.path.join(path, entry['file'])), entry['outputs'])
+
+        bundle.load_time = time.perf_counter() - start
+        print(f"Loaded model version {version or 'unversioned'}: {len(bundle.models)} XGBoost models, "
+              f"ONNX bundles {list(bundle.onnx_sessions)} in {bundle.load_time:.2f}s")
+        return bundle
+
+    @property
+    def model_count(self):
+        return len(self.models) + sum(len(names) for _, names in self.onnx_sessions.values())
+
+    @property
+    def history_days(self):
+        """Days of feature history needed for a prediction."""
+        return self.onnx_manifest.get('seq_len', 1)
+
+    def predict_xgboost(self, X):
+        """Per-target XGBoost predictions for a single feature row."""
+        preds = {}
+        for key, model in self.models.items():
+            name = key[len("xgb_"):]
+            start = time.perf_counter()
+            if name.startswith('rain_prob'):
+                # For rain_prob, get probability
+                preds[name] = float(model.predict_proba(X)[0][1])
+            else:
+                preds[name] = float(model.predict(X)[0])
+            MODEL_LATENCY.observe(time.perf_counter() - start, model=key)
+        return preds
+
+    def predict_onnx(self, model_type, history):
+        """Run every horizon of an ONNX bundle in a single batched call."""
+        session, output_names = self.onnx_sessions[model_type]
+        features = history[self.onnx_manifest['feature_cols']].to_numpy(dtype=np.float32)
+
+        if model_type == 'lstm':
+            seq_len = self.onnx_manifest['seq_len']
+            if len(features) < seq_len:
+                raise HTTPException(status_code=503, detail=f"LSTM needs {seq_len} days of history")
+            inputs = features[-seq_len:][np.newaxis]
+        else:
+            inputs = features[-1:]
+
+        start = time.perf_counter()
+        outputs = session.run(None, {'input': inputs})[0][0]
+        MODEL_LATENCY.observe(time.perf_counter() - start, model=f"onnx_{model_type}")
+        return dict(zip(output_names, outputs.astype(float)))
+
+    def warm_up(self):
+        """Run each model family once so the first real request does not pay for lazy initialization."""
+        try:
+            history = get_feature_store().latest(self.history_days)
+        except FileNotFoundError:
+            return
+        if history.empty:
+            return
+        if self.models:
+            self.predict_xgboost(history.iloc[-1:])
+        for model_type in self.onnx_sessions:
+            if model_type != 'lstm' or len(history) >= self.history_days:
+                self.predict_onnx(model_type, history)
+
+# The bundle serving requests; replaced as a whole, never modified in place
+active_bundle = ModelBundle(MODEL_DIR)
+# Serializes loads triggered by the watcher and by /admin/rollback
+reload_lock = threading.Lock()
+
+def refresh_models(force=False):
+    """
+    Load the version CURRENT points at in the calling (background) thread and swap it in.
+
+    Without a published version the models stored directly in MODEL_DIR are served.
+    """
+    global active_bundle
+    with reload_lock:
+        version = model_registry.current_version(MODEL_DIR)
+        if not force and active_bundle.version == version and active_bundle.load_time is not None:
+            return active_bundle
+
+        if version and version not in model_registry.list_versions(MODEL_DIR):
+            raise FileNotFoundError(f"CURRENT points at unknown model version {version}")
+        path = model_registry.version_path(version, MODEL_DIR) if version else MODEL_DIR
+        bundle = ModelBundle.load(path, version)
+        if bundle.model_count == 0 and active_bundle.model_count > 0:
+            # An empty directory would answer every /predict with all-zero forecasts
+            raise RuntimeError(f"Model version {version or 'unversioned'} has no models, "
+                               f"still serving {active_bundle.version or 'unversioned'}")
+        bundle.warm_up()
+        active_bundle = bundle
+        MODEL_SWAPS.inc()
+        # Every family is reported, so one missing from this version drops to 0
+        loaded = {family: 0 for family in MODEL_TYPES if family != 'ensemble'}
+        loaded['xgboost'] = len(bundle.models)
+        for model_type, (_, names) in bundle.onnx_sessions.items():
+            loaded[model_type] = len(names)
+        for family, count in loaded.items():
+            MODELS_LOADED.set(count, family=family)
+        print(f"Serving model version {version or 'unversioned'}")
+        return bundle
+
+async def watch_registry():
+    """Poll the CURRENT pointer and hot-swap new versions without blocking requests."""
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL)
+        try:
+            await asyncio.to_thread(refresh_models)
+        except Exception as e:
+            # Keep serving the previous version if the new one fails to load
+            print(f"Failed to load model version {model_registry.current_version(MODEL_DIR)}: {e}")
 
 @app.on_event("startup")
 async def load_models():
     """Load all trained models into memory"""
     print("Loading models...")
 
-    # Load XGBoost models for 7 days
-    targets = ['temp_min', 'temp_max', 'wind_speed', 'humidity', 'rain_prob']
-    for i in range(1, 8):
-        for target in targets:
-            name = f"{target}_day_{i}"
-            model_path = os.path.join(MODEL_DIR, f"xgb_{name}.pkl")
-            if os.path.exists(model_path):
-                models[f"xgb_{name}"] = joblib.load(model_path)
-                print(f"Loaded XGBoost model for {name}")
+    try:
+        get_feature_store()
+    except FileNotFoundError as e:
+        print(f"Feature store not available yet: {e}")
+
+    refresh_models()
+    app.state.registry_watcher = asyncio.create_task(watch_registry())
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than raw URL to keep the label set bounded
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    REQUEST_LATENCY.observe(time.perf_counter() - start, path=path)
+    REQUESTS.inc(path=path, status=response.status_code)
+    return response
 
-    print(f"Loaded {len(models)} models")
+def update_staleness(latest_date):
+    DATA_STALENESS.set((pd.Timestamp.now().normalize() - latest_date.normalize()).days)
 
 class DailyPrediction(BaseModel):
     date: str
@@ -45,71 +249,128 @@ class DailyPrediction(BaseModel):
 class ForecastResponse(BaseModel):
     forecast: List[DailyPrediction]
     model_type: str = "xgboost"
+    model_version: Optional[str] = None
 
 @app.get("/")
 async def root():
     return {
         "message": "DWD Weather Prediction API",
         "endpoints": {
-            "/predict": "Get next day weather prediction",
-            "/health": "Health check"
+            "/predict": "Get 7-day weather prediction (?model_type=xgboost|lstm|tf|ensemble)",
+            "/health": "Health check",
+            "/admin/models": "List model versions",
+            "/admin/rollback": "Serve the previous (or a given) model version",
+            "/metrics": "Prometheus metrics"
         }
     }
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "models_loaded": len(models)}
+    return {
+        "status": "healthy",
+        "model_version": active_bundle.version,
+        "models_loaded": active_bundle.model_count
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    try:
+        store = get_feature_store()
+        if len(store):
+            update_staleness(store.dates(slice(-1, None))[0])
+    except FileNotFoundError:
+        pass
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/models")
+async def list_model_versions():
+    return {
+        "active": active_bundle.version,
+        "current": model_registry.current_version(MODEL_DIR),
+        "versions": model_registry.list_versions(MODEL_DIR)
+    }
+
+@app.post("/admin/rollback")
+async def rollback(version: Optional[str] = None):
+    """Point CURRENT at `version` (default: the previous one) and swap it in immediately."""
+    target = version or model_registry.previous_version(MODEL_DIR)
+    if target is None:
+        raise HTTPException(status_code=409, detail="No previous model version to roll back to")
+    previous = model_registry.current_version(MODEL_DIR)
+    try:
+        model_registry.set_current(target, MODEL_DIR)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        bundle = await asyncio.to_thread(refresh_models)
+    except RuntimeError as e:
+        # Point CURRENT back so the watcher does not keep retrying the empty version
+        if previous in model_registry.list_versions(MODEL_DIR):
+            model_registry.set_current(previous, MODEL_DIR)
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"active": bundle.version, "load_time_sec": bundle.load_time}
 
 @app.get("/predict", response_model=ForecastResponse)
-async def predict():
+async def predict(response: Response, model_type: str = "xgboost",
+                  x_debug_timing: Optional[str] = Header(None)):
     """
-    Predict weather for the next 7 days using the latest data from the database.
+    Predict weather for the next 7 days using the latest row of the feature store.
+
+    `model_type` selects XGBoost, the ONNX-exported LSTM or TensorFlow networks,
+    or an ensemble averaging every model available for each target.
+    Send `X-Debug-Timing: 1` to get the per-phase breakdown in a `Server-Timing` header.
     """
+    timings = RequestTimings(PHASE_LATENCY)
+    # Pin the bundle for the whole request, a concurrent swap does not affect it
+    bundle = active_bundle
+
+    if model_type not in MODEL_TYPES:
+        raise HTTPException(status_code=400, detail=f"model_type must be one of {', '.join(MODEL_TYPES)}")
+    if model_type in ('lstm', 'tf') and model_type not in bundle.onnx_sessions:
+        raise HTTPException(status_code=503, detail=f"No {model_type} models loaded")
+
     try:
-        # Get latest data
-        con = duckdb.connect(DB_PATH)
-        query = """
-        SELECT * FROM int_weather_features
-        ORDER BY date DESC
-        LIMIT 1
-        """
-        df = con.execute(query).fetch_df()
-        con.close()
-
-        if df.empty:
-            raise HTTPException(status_code=404, detail="No data available")
-
-        # Prepare features
-        feature_cols = [
-            'temp_mean', 'temp_max', 'temp_min',
-            'wind_speed', 'humidity', 'precipitation', 'sunshine', 'pressure_surface',
-            'month', 'day_of_year',
-            'temp_mean_lag_1', 'temp_max_lag_1', 'temp_min_lag_1',
-            'pressure_surface_lag_1'
-        ]
-
-        feature_cols = [c for c in feature_cols if c in df.columns]
-        X = df[feature_cols].iloc[0:1]  # Single row
+        # Get latest data (enough history for the LSTM window), oldest first
+        with timings.span("feature_store"):
+            try:
+                store = get_feature_store(count_lookup=True)
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail="No data available")
+
+        with timings.span("feature_slice"):
+            df = store.latest(bundle.history_days)
+            if df.empty:
+                raise HTTPException(status_code=404, detail="No data available")
+
+            X = df.iloc[-1:]  # Single row
+
+        # Predictions per model family, keyed by target name (e.g. 'temp_min_day_1')
+        family_preds = []
+        if model_type in ('xgboost', 'ensemble'):
+            with timings.span("models_xgboost"):
+                family_preds.append(bundle.predict_xgboost(X))
+        for family in ('lstm', 'tf'):
+            if model_type == family or (model_type == 'ensemble' and family in bundle.onnx_sessions):
+                # The ensemble averages the other families while the store is shorter than the LSTM window
+                if model_type == 'ensemble' and family == 'lstm' and len(df) < bundle.history_days:
+                    continue
+                with timings.span(f"models_{family}"):
+                    family_preds.append(bundle.predict_onnx(family, df))
 
         # Make predictions for 7 days
         forecast = []
-        latest_date = pd.to_datetime(df['date'].iloc[0])
+        latest_date = df.index[-1]
+        update_staleness(latest_date)
+        assemble_start = time.perf_counter()
 
         for i in range(1, 8):
             day_preds = {}
-            for target in ['temp_min', 'temp_max', 'wind_speed', 'humidity', 'rain_prob']:
+            for target in TARGETS:
                 name = f"{target}_day_{i}"
-                model_key = f"xgb_{name}"
-
-                val = 0.0
-                if model_key in models:
-                    pred = models[model_key].predict(X)[0]
-                    # For rain_prob, get probability
-                    if target == 'rain_prob':
-                        pred = models[model_key].predict_proba(X)[0][1]
-                    val = float(pred)
-
-                day_preds[target] = val
+                # Average over every family that has a model for this target
+                values = [preds[name] for preds in family_preds if name in preds]
+                day_preds[target] = float(np.mean(values)) if values else 0.0
 
             next_date = latest_date + pd.Timedelta(days=i)
 
@@ -122,11 +383,18 @@ async def predict():
                 rain_prob=day_preds.get('rain_prob', 0.0)
             ))
 
+        timings.add("assemble", time.perf_counter() - assemble_start)
+        if x_debug_timing:
+            response.headers["Server-Timing"] = timings.server_timing()
+
         return ForecastResponse(
             forecast=forecast,
-            model_type="xgboost"
+            model_type=model_type,
+            model_version=bundle.version
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
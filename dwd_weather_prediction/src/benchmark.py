@@ -0,0 +1,293 @@
+import duckdb
+import pandas as pd
+import numpy as np
+import joblib
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+from xgboost import XGBRegressor, XGBClassifier
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from feature_store import FeatureStore, FEATURE_COLS, MODEL_TARGETS, build_feature_store
+import model_registry
+
+# Load-test defaults: concurrent clients per level and requests sent at each level
+CONCURRENCY_LEVELS = [1, 4, 16, 64]
+REQUESTS_PER_LEVEL = 200
+MODEL_TYPES = ['xgboost', 'ensemble']
+
+# Synthetic model artifacts mirror the production shapes (train.py)
+XGB_TREES = 100
+SEQ_LEN = 7
+LSTM_HIDDEN = 50
+MLP_LAYERS = [64, 32, 16]
+ONNX_OPSET = 17
+ONNX_IR_VERSION = 8
+
+WEATHER_PARAMS = ['temp_mean', 'temp_max', 'temp_min', 'wind_speed', 'humidity', 'pressure_surface']
+
+def generate_features(years, seed=42):
+    """Synthetic int_weather_features: seasonal daily series with the dbt model's lag and target columns."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.now().normalize() - pd.Timedelta(days=1)
+    dates = pd.date_range(end=end, periods=int(years * 365.25), freq='D')
+    n = len(dates)
+    season = np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 110) / 365.25)
+
+    temp_mean = 11 + 8 * season + rng.normal(0, 2.5, n)
+    precipitation = rng.exponential(2.0, n) * (rng.random(n) < 0.45)
+    df = pd.DataFrame({
+        'date': dates.date,
+        'temp_mean': temp_mean,
+        'temp_max': temp_mean + rng.uniform(2, 7, n),
+        'temp_min': temp_mean - rng.uniform(2, 7, n),
+        'wind_speed': rng.gamma(2.0, 1.8, n),
+        'precipitation': precipitation,
+        'humidity': np.clip(78 - 10 * season + rng.normal(0, 8, n), 20, 100),
+        'sunshine': np.clip(5 + 4 * season + rng.normal(0, 2, n), 0, 16),
+        'pressure_surface': 1008 + rng.normal(0, 7, n),
+        'month': dates.month,
+        'day_of_year': dates.dayofyear,
+        'is_raining': (precipitation > 0).astype(int),
+    })
+
+    for col in WEATHER_PARAMS + ['precipitation']:
+        df[f'{col}_lag_1'] = df[col].shift(1)
+    for i in range(1, 8):
+        for col in WEATHER_PARAMS:
+            df[f'target_{col}_day_{i}'] = df[col].shift(-i)
+        df[f'target_is_raining_day_{i}'] = df['is_raining'].shift(-i)
+    return df
+
+def write_database(df, db_path):
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    con = duckdb.connect(db_path)
+    con.register('features_df', df)
+    con.execute("CREATE OR REPLACE TABLE int_weather_features AS SELECT * FROM features_df")
+    con.close()
+
+def _initializer(name, shape, rng, scale=0.1):
+    return numpy_helper.from_array((rng.standard_normal(shape) * scale).astype(np.float32), name)
+
+def _save_onnx(nodes, initializers, inputs, n_outputs, path, name):
+    graph = helper.make_graph(
+        nodes, name, inputs,
+        [helper.make_tensor_value_info('output', TensorProto.FLOAT, ['batch', n_outputs])],
+        initializer=initializers
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', ONNX_OPSET)], ir_version=ONNX_IR_VERSION)
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
+
+def write_mlp_bundle(path, output_names, n_features, rng):
+    """Random-weight stand-in for export_onnx.export_tf_bundle: one Dense stack per output."""
+    nodes, initializers, outputs = [], [], []
+    for i, name in enumerate(output_names):
+        current, width = 'input', n_features
+        for j, units in enumerate(MLP_LAYERS + [1]):
+            initializers += [_initializer(f"m{i}_w{j}", (width, units), rng), _initializer(f"m{i}_b{j}", (units,), rng)]
+            nodes.append(helper.make_node('Gemm', [current, f"m{i}_w{j}", f"m{i}_b{j}"], [f"m{i}_gemm{j}"]))
+            current, width = f"m{i}_gemm{j}", units
+            activation = 'Relu' if units != 1 else ('Sigmoid' if name.startswith('rain_prob') else None)
+            if activation:
+                nodes.append(helper.make_node(activation, [current], [f"m{i}_act{j}"]))
+                current = f"m{i}_act{j}"
+        outputs.append(current)
+    nodes.append(helper.make_node('Concat', outputs, ['output'], axis=1))
+    inputs = [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['batch', n_features])]
+    _save_onnx(nodes, initializers, inputs, len(output_names), path, 'tf_bundle')
+
+def write_lstm_bundle(path, output_names, n_features, seq_len, rng):
+    """Random-weight stand-in for export_onnx.export_lstm_bundle: one LSTM + linear head per output."""
+    nodes = [helper.make_node('Transpose', ['input'], ['input_tbf'], perm=[1, 0, 2])]
+    initializers = [numpy_helper.from_array(np.array([0], dtype=np.int64), 'squeeze_axes')]
+    outputs = []
+    h = LSTM_HIDDEN
+    for i, _ in enumerate(output_names):
+        initializers += [
+            _initializer(f"m{i}_W", (1, 4 * h, n_features), rng),
+            _initializer(f"m{i}_R", (1, 4 * h, h), rng),
+            _initializer(f"m{i}_B", (1, 8 * h), rng),
+            _initializer(f"m{i}_fc_w", (h, 1), rng),
+            _initializer(f"m{i}_fc_b", (1,), rng),
+        ]
+        nodes += [
+            helper.make_node('LSTM', ['input_tbf', f"m{i}_W", f"m{i}_R", f"m{i}_B"], ['', f"m{i}_h"], hidden_size=h),
+            helper.make_node('Squeeze', [f"m{i}_h", 'squeeze_axes'], [f"m{i}_last"]),
+            helper.make_node('Gemm', [f"m{i}_last", f"m{i}_fc_w", f"m{i}_fc_b"], [f"m{i}_out"]),
+        ]
+        outputs.append(f"m{i}_out")
+    nodes.append(helper.make_node('Concat', outputs, ['output'], axis=1))
+    inputs = [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['batch', seq_len, n_features])]
+    _save_onnx(nodes, initializers, inputs, len(output_names), path, 'lstm_bundle')
+
+def write_synthetic_models(store, registry_dir, trees=XGB_TREES, seq_len=SEQ_LEN, seed=42):
+    """
+    Publish a registry version with XGBoost models fitted on the synthetic features
+    and random-weight ONNX bundles of production size, so every model_type can be served.
+    """
+    rng = np.random.default_rng(seed)
+    version, model_dir = model_registry.create_version(registry_dir)
+    X = store.feature_frame()
+
+    for name, (target_col, task_type) in MODEL_TARGETS.items():
+        y = store.target_series(target_col)
+        valid = X.notna().all(axis=1) & y.notna()
+        model_cls = XGBRegressor if task_type == 'regression' else XGBClassifier
+        model = model_cls(n_estimators=trees, learning_rate=0.1, random_state=42, n_jobs=1)
+        model.fit(X[valid], y[valid])
+        joblib.dump(model, os.path.join(model_dir, f"xgb_{name}.pkl"))
+
+    lstm_names = [name for name, (_, task_type) in MODEL_TARGETS.items() if task_type == 'regression']
+    tf_names = list(MODEL_TARGETS)
+    n_features = len(store.feature_cols)
+    write_lstm_bundle(os.path.join(model_dir, "lstm_bundle.onnx"), lstm_names, n_features, seq_len, rng)
+    write_mlp_bundle(os.path.join(model_dir, "tf_bundle.onnx"), tf_names, n_features, rng)
+
+    with open(os.path.join(model_dir, "onnx_manifest.json"), 'w') as f:
+        json.dump({
+            'feature_cols': store.feature_cols,
+            'seq_len': seq_len,
+            'lstm': {'file': "lstm_bundle.onnx", 'outputs': lstm_names},
+            'tf': {'file': "tf_bundle.onnx", 'outputs': tf_names},
+        }, f, indent=2)
+
+    model_registry.publish_version(model_dir, version, registry_dir)
+    return version
+
+def build_workspace(workdir, years, trees=XGB_TREES):
+    """Create data/ and models/ under `workdir` laid out exactly like the project root."""
+    start = time.perf_counter()
+    df = generate_features(years)
+    write_database(df, os.path.join(workdir, "data/processed/weather.duckdb"))
+    build_feature_store(
+        db_path=os.path.join(workdir, "data/processed/weather.duckdb"),
+        store_dir=os.path.join(workdir, "data/feature_store")
+    )
+    store = FeatureStore.open(os.path.join(workdir, "data/feature_store"))
+    write_synthetic_models(store, os.path.join(workdir, "models"), trees=trees)
+    return {'rows': len(df), 'features': len(FEATURE_COLS), 'build_sec': time.perf_counter() - start}
+
+async def run_level(client, model_type, concurrency, n_requests):
+    """Send `n_requests` to /predict from `concurrency` concurrent clients."""
+    latencies = []
+    errors = 0
+    remaining = iter(range(n_requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get("/predict", params={'model_type': model_type})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    return {
+        'model_type': model_type,
+        'concurrency': concurrency,
+        'requests': n_requests,
+        'errors': errors,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean()),
+        'max_ms': float(ms.max()),
+        'requests_per_sec': n_requests / elapsed,
+    }
+
+async def run_benchmark(model_types, levels, n_requests):
+    """Start the app in-process (cwd must be the workspace) and load-test /predict."""
+    import httpx
+
+    cold = {}
+    start = time.perf_counter()
+    from src.app import app
+    cold['import_sec'] = time.perf_counter() - start
+
+    results = []
+    async with app.router.lifespan_context(app):
+        cold['startup_sec'] = time.perf_counter() - start - cold['import_sec']
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            first = time.perf_counter()
+            response = await client.get("/predict")
+            response.raise_for_status()
+            cold['first_request_sec'] = time.perf_counter() - first
+            cold['total_sec'] = time.perf_counter() - start
+
+            for model_type in model_types:
+                for concurrency in levels:
+                    result = await run_level(client, model_type, concurrency, n_requests)
+                    print(f"{model_type:>9} c={concurrency:<3} p50={result['p50_ms']:.2f}ms "
+                          f"p95={result['p95_ms']:.2f}ms p99={result['p99_ms']:.2f}ms "
+                          f"{result['requests_per_sec']:.1f} req/s", file=sys.stderr)
+                    results.append(result)
+
+        app.state.registry_watcher.cancel()
+
+    return cold, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /predict against a synthetic weather workspace")
+    parser.add_argument("--years", type=float, default=30, help="Years of synthetic daily history")
+    parser.add_argument("--trees", type=int, default=XGB_TREES, help="Trees per synthetic XGBoost model")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY_LEVELS)
+    parser.add_argument("--requests", type=int, default=REQUESTS_PER_LEVEL, help="Requests per concurrency level")
+    parser.add_argument("--model-types", nargs="+", default=MODEL_TYPES)
+    parser.add_argument("--workdir", default=None, help="Workspace directory (default: a temporary directory)")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, project_root)
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="weather_bench_"))
+    output = os.path.abspath(args.output) if args.output else None
+
+    print(f"Building synthetic workspace in {workdir}...", file=sys.stderr)
+    dataset = build_workspace(workdir, args.years, trees=args.trees)
+
+    # The app resolves data/ and models/ relative to the working directory
+    os.chdir(workdir)
+    cold, results = asyncio.run(run_benchmark(args.model_types, args.concurrency, args.requests))
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'years': args.years,
+            'trees': args.trees,
+            'concurrency': args.concurrency,
+            'requests_per_level': args.requests,
+            'model_types': args.model_types,
+        },
+        'dataset': dataset,
+        'cold_start': cold,
+        'results': results,
+    }
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import json
+import os
+
+import numpy as np
+import onnx
+import torch
+import torch.nn as nn
+from onnx import TensorProto, helper, numpy_helper
+
+ONNX_OPSET = 17
+# IR version matching opset 17, so older onnxruntime builds can still load the bundle
+ONNX_IR_VERSION = 8
+ONNX_MANIFEST = "onnx_manifest.json"
+LSTM_BUNDLE = "lstm_bundle.onnx"
+TF_BUNDLE = "tf_bundle.onnx"
+
+class LSTMBundle(nn.Module):
+    """
+    All per-target LSTMs behind a single (batch, seq_len, n_features) input.
+
+    Each model's StandardScaler is folded in: missing values are imputed with the
+    scaler mean, then standardized, so the API can feed raw feature rows.
+    Output is (batch, n_models) in the order of `models`.
+    """
+    def __init__(self, models, scalers):
+        super().__init__()
+        self.models = nn.ModuleList(models)
+        self.register_buffer('mean', torch.tensor(np.stack([s.mean_ for s in scalers]), dtype=torch.float32))
+        self.register_buffer('scale', torch.tensor(np.stack([s.scale_ for s in scalers]), dtype=torch.float32))
+
+    def forward(self, x):
+        outputs = []
+        for i, model in enumerate(self.models):
+            x_i = torch.where(torch.isnan(x), self.mean[i], x)
+            outputs.append(model((x_i - self.mean[i]) / self.scale[i]))
+        return torch.cat(outputs, dim=1)
+
+def export_lstm_bundle(models, scalers, input_size, seq_len, path):
+    """Export the LSTMs as one ONNX graph with a dynamic batch axis."""
+    bundle = LSTMBundle(models, scalers).eval()
+    # Batch size 1 for tracing, the LSTM op itself is exported batch-agnostic
+    dummy = torch.zeros(1, seq_len, input_size)
+    torch.onnx.export(
+        bundle, (dummy,), path,
+        input_names=['input'], output_names=['output'],
+        dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}},
+        opset_version=ONNX_OPSET,
+        dynamo=False
+    )
+
+def _dense_layers(keras_model):
+    """(kernel, bias, activation) for every Dense layer; Dropout is a no-op at inference."""
+    layers = []
+    for layer in keras_model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            continue
+        kernel, bias = weights
+        layers.append((kernel, bias, layer.get_config()['activation']))
+    return layers
+
+def export_tf_bundle(models, scalers, input_size, path):
+    """
+    Rebuild the Keras MLPs as Gemm/activation chains in one ONNX graph.
+
+    Scaling is folded into the first layer's weights (W / scale, b - (mean / scale) @ W),
+    so the graph only needs NaN imputation before the first Gemm.
+    """
+    nodes = [helper.make_node('IsNaN', ['input'], ['input_is_nan'])]
+    initializers = []
+    outputs = []
+
+    for i, (model, scaler) in enumerate(zip(models, scalers)):
+        prefix = f"m{i}"
+        mean = scaler.mean_.astype(np.float32)
+        scale = scaler.scale_.astype(np.float32)
+
+        initializers.append(numpy_helper.from_array(mean.reshape(1, -1), f"{prefix}_mean"))
+        nodes.append(helper.make_node('Where', ['input_is_nan', f"{prefix}_mean", 'input'], [f"{prefix}_x"]))
+
+        current = f"{prefix}_x"
+        for j, (kernel, bias, activation) in enumerate(_dense_layers(model)):
+            kernel = kernel.astype(np.float32)
+            bias = bias.astype(np.float32)
+            if j == 0:
+                bias = bias - (mean / scale) @ kernel
+                kernel = kernel / scale[:, None]
+
+            initializers.append(numpy_helper.from_array(kernel, f"{prefix}_w{j}"))
+            initializers.append(numpy_helper.from_array(bias, f"{prefix}_b{j}"))
+            nodes.append(helper.make_node('Gemm', [current, f"{prefix}_w{j}", f"{prefix}_b{j}"], [f"{prefix}_gemm{j}"]))
+            current = f"{prefix}_gemm{j}"
+
+            if activation == 'relu':
+                nodes.append(helper.make_node('Relu', [current], [f"{prefix}_relu{j}"]))
+                current = f"{prefix}_relu{j}"
+            elif activation == 'sigmoid':
+                nodes.append(helper.make_node('Sigmoid', [current], [f"{prefix}_sigmoid{j}"]))
+                current = f"{prefix}_sigmoid{j}"
+            elif activation != 'linear':
+                raise ValueError(f"Unsupported activation for ONNX export: {activation}")
+
+        outputs.append(current)
+
+    nodes.append(helper.make_node('Concat', outputs, ['output'], axis=1))
+
+    graph = helper.make_graph(
+        nodes, 'tf_bundle',
+        [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['batch', input_size])],
+        [helper.make_tensor_value_info('output', TensorProto.FLOAT, ['batch', len(models)])],
+        initializer=initializers
+    )
+    onnx_model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', ONNX_OPSET)], ir_version=ONNX_IR_VERSION)
+    onnx.checker.check_model(onnx_model)
+    onnx.save(onnx_model, path)
+
+def export_onnx_bundles(feature_cols, seq_len, lstm_models, tf_models, model_dir):
+    """
+    Export trained networks for CPU serving and write the manifest the API reads.
+
+    `lstm_models` and `tf_models` map target name (e.g. 'temp_min_day_1') to (model, scaler).
+    """
+    manifest = {'feature_cols': list(feature_cols), 'seq_len': seq_len}
+
+    if lstm_models:
+        names = list(lstm_models)
+        print(f"Exporting {len(names)} LSTM models to ONNX...")
+        export_lstm_bundle([lstm_models[n][0] for n in names], [lstm_models[n][1] for n in names],
+                           len(feature_cols), seq_len, os.path.join(model_dir, LSTM_BUNDLE))
+        manifest['lstm'] = {'file': LSTM_BUNDLE, 'outputs': names}
+
+    if tf_models:
+        names = list(tf_models)
+        print(f"Exporting {len(names)} TensorFlow models to ONNX...")
+        export_tf_bundle([tf_models[n][0] for n in names], [tf_models[n][1] for n in names],
+                         len(feature_cols), os.path.join(model_dir, TF_BUNDLE))
+        manifest['tf'] = {'file': TF_BUNDLE, 'outputs': names}
+
+    with open(os.path.join(model_dir, ONNX_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
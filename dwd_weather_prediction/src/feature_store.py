@@ -0,0 +1,154 @@
+import duckdb
+import pandas as pd
+import numpy as np
+from datetime import datetime
+import argparse
+import json
+import os
+import shutil
+
+DB_PATH = "data/processed/weather.duckdb"
+STORE_DIR = "data/feature_store"
+CURRENT_FILE = "CURRENT"
+DATA_FILE = "columns.npy"
+MANIFEST_FILE = "manifest.json"
+KEEP_VERSIONS = 3
+
+# Single source of truth for the model inputs, shared by train.py and app.py
+FEATURE_COLS = [
+    'temp_mean', 'temp_max', 'temp_min',
+    'wind_speed', 'humidity', 'precipitation', 'sunshine', 'pressure_surface',
+    'month', 'day_of_year',
+    'temp_mean_lag_1', 'temp_max_lag_1', 'temp_min_lag_1',
+    'pressure_surface_lag_1'
+]
+
+# Model name -> (target column, task type), one model per target and forecast day
+MODEL_TARGETS = {}
+for i in range(1, 8):
+    MODEL_TARGETS[f'temp_min_day_{i}'] = (f'target_temp_min_day_{i}', 'regression')
+    MODEL_TARGETS[f'temp_max_day_{i}'] = (f'target_temp_max_day_{i}', 'regression')
+    MODEL_TARGETS[f'wind_speed_day_{i}'] = (f'target_wind_speed_day_{i}', 'regression')
+    MODEL_TARGETS[f'humidity_day_{i}'] = (f'target_humidity_day_{i}', 'regression')
+    MODEL_TARGETS[f'rain_prob_day_{i}'] = (f'target_is_raining_day_{i}', 'classification')
+
+TARGET_COLS = [target_col for target_col, _ in MODEL_TARGETS.values()]
+
+def current_version(store_dir=STORE_DIR):
+    """Version name the CURRENT pointer refers to, or None if nothing was published yet."""
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def build_feature_store(db_path=DB_PATH, store_dir=STORE_DIR, keep=KEEP_VERSIONS):
+    """
+    Materialize int_weather_features into a new feature store version and publish it.
+
+    The data file is a single float64 .npy matrix of shape (n_columns, n_days): the
+    date (days since epoch) followed by the feature and target columns, each stored
+    contiguously so readers get zero-copy column and feature-block views from a memmap.
+    The version directory is renamed into place and the CURRENT pointer replaced
+    atomically, so readers never see a partially written version.
+    """
+    print("Loading features from DuckDB...")
+    con = duckdb.connect(db_path, read_only=True)
+    df = con.execute("SELECT * FROM int_weather_features ORDER BY date").fetch_df()
+    con.close()
+
+    feature_cols = [c for c in FEATURE_COLS if c in df.columns]
+    target_cols = [c for c in TARGET_COLS if c in df.columns]
+    columns = ['date'] + feature_cols + target_cols
+
+    matrix = np.empty((len(columns), len(df)), dtype=np.float64)
+    matrix[0] = pd.to_datetime(df['date']).values.astype('datetime64[D]').astype(np.int64)
+    matrix[1:] = df[feature_cols + target_cols].to_numpy(dtype=np.float64, na_value=np.nan).T
+
+    version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    manifest = {
+        'version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'source': 'int_weather_features',
+        'n_rows': len(df),
+        'columns': columns,
+        'dtype': 'float64',
+        'feature_cols': feature_cols,
+        'target_cols': target_cols,
+        'date_min': str(df['date'].min())[:10] if len(df) else None,
+        'date_max': str(df['date'].max())[:10] if len(df) else None
+    }
+
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_dir = os.path.join(store_dir, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, DATA_FILE), matrix)
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_dir, os.path.join(store_dir, version))
+
+    pointer_tmp = os.path.join(store_dir, f".{CURRENT_FILE}.tmp")
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(store_dir, CURRENT_FILE))
+    print(f"Published feature store version {version} ({len(df)} rows, {len(columns)} columns)")
+
+    # Prune old versions; readers still mapping them keep their data until they remap
+    versions = sorted(d for d in os.listdir(store_dir) if not d.startswith('.') and d != CURRENT_FILE)
+    for old in versions[:-keep] if keep > 0 else []:
+        if old != version:
+            shutil.rmtree(os.path.join(store_dir, old), ignore_errors=True)
+
+    return version
+
+class FeatureStore:
+    """Read-only, memory-mapped view of one feature store version."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self.feature_cols = self.manifest['feature_cols']
+        self.target_cols = self.manifest['target_cols']
+        self._data = np.load(os.path.join(path, DATA_FILE), mmap_mode='r')
+        self._index = {name: i for i, name in enumerate(self.manifest['columns'])}
+        # Features are stored as one contiguous block right after the date column
+        self._features = slice(1, 1 + len(self.feature_cols))
+
+    @classmethod
+    def open(cls, store_dir=STORE_DIR):
+        version = current_version(store_dir)
+        if version is None:
+            raise FileNotFoundError(f"No feature store published in {store_dir}")
+        return cls(os.path.join(store_dir, version))
+
+    def __len__(self):
+        return self._data.shape[1]
+
+    def dates(self, rows=slice(None)):
+        return pd.DatetimeIndex(self._data[0, rows].astype('datetime64[D]'), name='date')
+
+    def column(self, name, rows=slice(None)):
+        """Zero-copy view of a single column."""
+        return self._data[self._index[name], rows]
+
+    def features(self, rows=slice(None)):
+        """Zero-copy (n_rows, n_features) view of the feature matrix."""
+        return self._data[self._features, rows].T
+
+    def feature_frame(self, rows=slice(None)):
+        return pd.DataFrame(self.features(rows), index=self.dates(rows), columns=self.feature_cols, copy=False)
+
+    def target_series(self, name, rows=slice(None)):
+        return pd.Series(self.column(name, rows), index=self.dates(rows), name=name, copy=False)
+
+    def latest(self, n=1):
+        """Feature frame of the last `n` days, oldest first."""
+        return self.feature_frame(slice(max(len(self) - n, 0), None))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish int_weather_features to the memory-mapped feature store")
+    parser.add_argument("--keep", type=int, default=KEEP_VERSIONS, help="Number of versions to keep")
+    args = parser.parse_args()
+
+    build_feature_store(keep=args.keep)
@@ -0,0 +1,71 @@
+from datetime import datetime
+import os
+import shutil
+
+REGISTRY_DIR = "models"
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 5
+
+# Layout:
+#   models/versions/<version>/   one directory per training run (xgb_*.pkl, *.onnx, manifests)
+#   models/CURRENT               name of the version the API should serve
+# Models stored directly in models/ (before the registry existed) are served when there is no CURRENT.
+
+def version_path(version, registry_dir=REGISTRY_DIR):
+    return os.path.join(registry_dir, VERSIONS_DIR, version)
+
+def current_version(registry_dir=REGISTRY_DIR):
+    """Version the CURRENT pointer refers to, or None if no version was published."""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """Published versions, oldest first."""
+    root = os.path.join(registry_dir, VERSIONS_DIR)
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if not d.startswith('.') and os.path.isdir(os.path.join(root, d)))
+
+def create_version(registry_dir=REGISTRY_DIR):
+    """Allocate a new version and the staging directory a training run writes into."""
+    version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    staging_path = os.path.join(registry_dir, VERSIONS_DIR, f".{version}.tmp")
+    os.makedirs(staging_path)
+    return version, staging_path
+
+def set_current(version, registry_dir=REGISTRY_DIR):
+    """
+    Atomically point CURRENT at an existing version (also used for rollback). Only names
+    listed by list_versions() are accepted, so a path can never point outside the registry.
+    """
+    if version not in list_versions(registry_dir):
+        raise FileNotFoundError(f"Unknown model version {version}")
+    pointer_tmp = os.path.join(registry_dir, f".{CURRENT_FILE}.tmp")
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(registry_dir, CURRENT_FILE))
+
+def publish_version(staging_path, version, registry_dir=REGISTRY_DIR, keep=KEEP_VERSIONS):
+    """Move a finished training run into place, make it current and prune old versions."""
+    os.replace(staging_path, version_path(version, registry_dir))
+    set_current(version, registry_dir)
+    print(f"Published model version {version}")
+
+    # Keep the newest `keep` versions for rollback, never the one being served
+    current = current_version(registry_dir)
+    for old in list_versions(registry_dir)[:-keep] if keep > 0 else []:
+        if old != current:
+            shutil.rmtree(version_path(old, registry_dir), ignore_errors=True)
+
+def previous_version(registry_dir=REGISTRY_DIR):
+    """The version published before the current one, the default rollback target."""
+    versions = list_versions(registry_dir)
+    current = current_version(registry_dir)
+    if current not in versions:
+        return None
+    idx = versions.index(current)
+    return versions[idx - 1] if idx > 0 else None
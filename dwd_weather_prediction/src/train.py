@@ -1,8 +1,8 @@
-import duckdb
-import pandas as pd
 import numpy as np
 import torch
 import torch.nn as nn
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression, LogisticRegression
@@ -12,10 +12,67 @@ import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 import joblib
+from export_onnx import export_onnx_bundles
+from feature_store import FeatureStore, MODEL_TARGETS
+from tuning import load_search_results
+from model_registry import create_version, publish_version, KEEP_VERSIONS
+from datetime import datetime
+import argparse
+import copy
+import json
 import os
 
-DB_PATH = "data/processed/weather.duckdb"
 MODEL_DIR = "models"
+MODEL_MANIFEST = "model_manifest.json"
+
+# XGBoost configuration for targets without a hyperparameter search result (see tuning.py)
+DEFAULT_XGB_PARAMS = {'n_estimators': 100, 'learning_rate': 0.1}
+
+# LSTM defaults: days of context per sample, mini-batch size and early stopping patience
+SEQ_LEN = 7
+BATCH_SIZE = 64
+PATIENCE = 10
+
+class WindowedSequenceDataset(Dataset):
+    """
+    Sliding windows of `seq_len` consecutive days over a (n_days, n_features) matrix.
+
+    Windows are strided views into the feature array, so no window is ever copied;
+    only the rows of a requested mini-batch get materialized. Sample i is the window
+    ending at row `self.ends[i]`, labelled with the target of that same row.
+    Windows containing a missing feature or ending on a missing target are skipped.
+    """
+    def __init__(self, X, y, seq_len=SEQ_LEN):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        y = np.asarray(y, dtype=np.float32)
+        if len(X) < seq_len:
+            raise ValueError(f"Need at least {seq_len} rows for a window, got {len(X)}")
+
+        self.seq_len = seq_len
+        self.y = y
+        # (n_days - seq_len + 1, seq_len, n_features) view, window k covers rows k..k+seq_len-1
+        self.windows = sliding_window_view(X, seq_len, axis=0).transpose(0, 2, 1)
+
+        row_ok = ~np.isnan(X).any(axis=1)
+        window_ok = sliding_window_view(row_ok, seq_len).all(axis=1)
+        target_ok = ~np.isnan(y[seq_len - 1:])
+        self.starts = np.flatnonzero(window_ok & target_ok)
+        self.ends = self.starts + seq_len - 1
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, idx):
+        # Called with a list of indices by the BatchSampler; fancy indexing copies just this batch
+        starts = self.starts[idx]
+        X_batch = torch.from_numpy(self.windows[starts])
+        y_batch = torch.from_numpy(self.y[starts + self.seq_len - 1]).unsqueeze(1)
+        return X_batch, y_batch
+
+def make_loader(dataset, batch_size=BATCH_SIZE, shuffle=False):
+    """DataLoader that fetches whole mini-batches from the dataset in one indexing call."""
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False), batch_size=None)
 
 class LSTMModel(nn.Module):
     def __init__(self, input_size, hidden_size=50, num_layers=1):
@@ -30,51 +87,85 @@ class LSTMModel(nn.Module):
         out = self.fc(out[:, -1, :])
         return out
 
-def train_lstm(X_train, y_train, X_test, y_test, name, epochs=50):
-    # Prepare data for LSTM (samples, time_steps, features)
-    # We will treat the input features as one time step for simplicity in this hybrid approach,
-    # or ideally we should reshape data to have sequence length.
-    # Given the current feature set (lag_1), we effectively have a sequence of length 2 (t-1, t).
-    # But let's keep it simple: Treat current features as a single vector input to LSTM (seq_len=1).
-    # This acts more like a dense network but uses LSTM cells.
+def train_lstm(X_train, y_train, X_test, y_test, name, epochs=50,
+               seq_len=SEQ_LEN, batch_size=BATCH_SIZE, patience=PATIENCE, model_dir=MODEL_DIR):
+    """
+    Train an LSTM on sliding windows of the last `seq_len` days.
 
+    X/y are the chronological, unfiltered train and test frames (rows with missing values
+    are dropped per window by WindowedSequenceDataset). The last 20% of training windows
+    are held out for early stopping, mirroring the TensorFlow path.
+    """
     scaler = StandardScaler()
+    # StandardScaler ignores NaNs when fitting and passes them through on transform
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
 
-    # Reshape to (batch, seq_len, input_size)
-    X_train_tensor = torch.FloatTensor(X_train_scaled).unsqueeze(1)
-    X_test_tensor = torch.FloatTensor(X_test_scaled).unsqueeze(1)
-    y_train_tensor = torch.FloatTensor(y_train.values).unsqueeze(1)
-    y_test_tensor = torch.FloatTensor(y_test.values).unsqueeze(1)
+    train_set = WindowedSequenceDataset(X_train_scaled, y_train.values, seq_len)
+    test_set = WindowedSequenceDataset(X_test_scaled, y_test.values, seq_len)
+
+    # Chronological validation split: the most recent training windows
+    n_val = max(1, int(len(train_set) * 0.2))
+    fit_set = torch.utils.data.Subset(train_set, range(len(train_set) - n_val))
+    val_set = torch.utils.data.Subset(train_set, range(len(train_set) - n_val, len(train_set)))
+
+    # Subset forwards index lists to the underlying dataset, so batches stay single lookups
+    fit_loader = make_loader(fit_set, batch_size, shuffle=True)
+    val_loader = make_loader(val_set, batch_size)
 
     model = LSTMModel(input_size=X_train.shape[1])
     criterion = nn.MSELoss()
     optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
 
-    print(f"Training LSTM for {name}...")
+    print(f"Training LSTM for {name} (seq_len={seq_len}, {len(fit_set)} train / {len(val_set)} val windows)...")
+    best_loss = float('inf')
+    best_state = copy.deepcopy(model.state_dict())
+    epochs_without_improvement = 0
+
     for epoch in range(epochs):
         model.train()
-        optimizer.zero_grad()
-        outputs = model(X_train_tensor)
-        loss = criterion(outputs, y_train_tensor)
-        loss.backward()
-        optimizer.step()
+        train_loss = 0.0
+        for X_batch, y_batch in fit_loader:
+            optimizer.zero_grad()
+            loss = criterion(model(X_batch), y_batch)
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item() * len(X_batch)
+        train_loss /= len(fit_set)
+
+        model.eval()
+        val_loss = 0.0
+        with torch.no_grad():
+            for X_batch, y_batch in val_loader:
+                val_loss += criterion(model(X_batch), y_batch).item() * len(X_batch)
+        val_loss /= len(val_set)
 
         if (epoch+1) % 10 == 0:
-            print(f"Epoch [{epoch+1}/{epochs}], Loss: {loss.item():.4f}")
+            print(f"Epoch [{epoch+1}/{epochs}], Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}")
 
+        if val_loss < best_loss:
+            best_loss = val_loss
+            best_state = copy.deepcopy(model.state_dict())
+            epochs_without_improvement = 0
+        else:
+            epochs_without_improvement += 1
+            if epochs_without_improvement >= patience:
+                print(f"Early stopping at epoch {epoch+1}, best Val Loss: {best_loss:.4f}")
+                break
+
+    model.load_state_dict(best_state)
     model.eval()
     with torch.no_grad():
-        preds = model(X_test_tensor).numpy()
-        mae = mean_absolute_error(y_test, preds)
+        preds = np.concatenate([model(X_batch).numpy() for X_batch, _ in make_loader(test_set, batch_size)])
+        mae = mean_absolute_error(y_test.values[test_set.ends], preds)
         print(f"LSTM MAE: {mae:.4f}")
 
     # Save model and scaler
-    torch.save(model.state_dict(), os.path.join(MODEL_DIR, f"lstm_{name}.pth"))
-    joblib.dump(scaler, os.path.join(MODEL_DIR, f"scaler_{name}.pkl"))
+    torch.save(model.state_dict(), os.path.join(model_dir, f"lstm_{name}.pth"))
+    joblib.dump(scaler, os.path.join(model_dir, f"scaler_{name}.pkl"))
+    return model, scaler
 
-def train_tensorflow(X_train, y_train, X_test, y_test, name, task_type='regression', epochs=50):
+def train_tensorflow(X_train, y_train, X_test, y_test, name, task_type='regression', epochs=50, model_dir=MODEL_DIR):
     """Train a TensorFlow/Keras model"""
 
     # Scale features
@@ -124,45 +215,47 @@ def train_tensorflow(X_train, y_train, X_test, y_test, name, task_type='regressi
         print(f"TensorFlow Accuracy: {acc:.4f}, AUC: {auc:.4f}")
 
     # Save model
-    model.save(os.path.join(MODEL_DIR, f"tf_{name}.keras"))
-    joblib.dump(scaler, os.path.join(MODEL_DIR, f"scaler_tf_{name}.pkl"))
-
-def train_model():
-    print("Loading data from DuckDB...")
-    con = duckdb.connect(DB_PATH)
-    df = con.execute("SELECT * FROM int_weather_features").fetch_df()
-    con.close()
-
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.set_index('date').sort_index()
-
-    feature_cols = [
-        'temp_mean', 'temp_max', 'temp_min',
-        'wind_speed', 'humidity', 'precipitation', 'sunshine', 'pressure_surface',
-        'month', 'day_of_year',
-        'temp_mean_lag_1', 'temp_max_lag_1', 'temp_min_lag_1',
-        'pressure_surface_lag_1'
-    ]
-
-    feature_cols = [c for c in feature_cols if c in df.columns]
+    model.save(os.path.join(model_dir, f"tf_{name}.keras"))
+    joblib.dump(scaler, os.path.join(model_dir, f"scaler_tf_{name}.pkl"))
+    return model, scaler
+
+def train_model(seq_len=SEQ_LEN, batch_size=BATCH_SIZE, keep=KEEP_VERSIONS):
+    print("Loading data from the feature store...")
+    store = FeatureStore.open()
+    print(f"Feature store version {store.version} ({len(store)} rows)")
+
+    # Zero-copy views over the memory-mapped store, sorted by date
+    feature_cols = store.feature_cols
+    X = store.feature_frame()
     print(f"Features: {feature_cols}")
 
-    targets = {}
-    for i in range(1, 8):
-        targets[f'temp_min_day_{i}'] = (f'target_temp_min_day_{i}', 'regression')
-        targets[f'temp_max_day_{i}'] = (f'target_temp_max_day_{i}', 'regression')
-        targets[f'wind_speed_day_{i}'] = (f'target_wind_speed_day_{i}', 'regression')
-        targets[f'humidity_day_{i}'] = (f'target_humidity_day_{i}', 'regression')
-        targets[f'rain_prob_day_{i}'] = (f'target_is_raining_day_{i}', 'classification')
+    # Best configuration per target from `src/tuning.py`, if a search has been run
+    tuned = load_search_results(MODEL_DIR)
+    if tuned:
+        print(f"Using tuned XGBoost configurations for {len(tuned)} targets")
 
+    # Every run writes a new registry version; the API switches over once it is published
     os.makedirs(MODEL_DIR, exist_ok=True)
-
-    for name, (target_col, task_type) in targets.items():
-        if target_col not in df.columns:
+    version, model_dir = create_version(MODEL_DIR)
+    print(f"Training model version {version}")
+
+    manifest = {
+        'version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'feature_store_version': store.version,
+        'feature_cols': feature_cols,
+        'targets': {}
+    }
+
+    # Trained networks, exported to ONNX for the API once all targets are done
+    lstm_models = {}
+    tf_models = {}
+
+    for name, (target_col, task_type) in MODEL_TARGETS.items():
+        if target_col not in store.target_cols:
             continue
 
-        y = df[target_col]
-        X = df[feature_cols]
+        y = store.target_series(target_col)
 
         valid_idx = X.notna().all(axis=1) & y.notna()
         X_valid = X[valid_idx]
@@ -175,34 +268,61 @@ def train_model():
 
         print(f"\nTraining {name} ({task_type})...")
 
+        if name in tuned:
+            xgb_params = {**tuned[name]['params'], 'n_estimators': tuned[name]['n_estimators']}
+            xgb_entry = {'params': xgb_params, 'source': 'search',
+                         'metric': tuned[name]['metric'], 'cv_score': tuned[name]['cv_score']}
+        else:
+            xgb_params = DEFAULT_XGB_PARAMS
+            xgb_entry = {'params': xgb_params, 'source': 'default'}
+        manifest['targets'][name] = {'target_col': target_col, 'task_type': task_type, 'xgboost': xgb_entry}
+
         if task_type == 'regression':
             # XGBoost
-            xgb = XGBRegressor(n_estimators=100, learning_rate=0.1, random_state=42)
+            xgb = XGBRegressor(**xgb_params, random_state=42)
             xgb.fit(X_train, y_train)
             preds = xgb.predict(X_test)
             mae = mean_absolute_error(y_test, preds)
             print(f"XGBoost MAE: {mae:.4f}")
-            joblib.dump(xgb, os.path.join(MODEL_DIR, f"xgb_{name}.pkl"))
+            xgb_entry['holdout'] = {'mae': float(mae)}
+            joblib.dump(xgb, os.path.join(model_dir, f"xgb_{name}.pkl"))
 
-            # LSTM
-            train_lstm(X_train, y_train, X_test, y_test, name)
+            # LSTM: windows need contiguous days, so split the unfiltered frames at the same date
+            split_date = X_test.index[0]
+            lstm_models[name] = train_lstm(X[X.index < split_date], y[y.index < split_date],
+                       X[X.index >= split_date], y[y.index >= split_date], name,
+                       seq_len=seq_len, batch_size=batch_size, model_dir=model_dir)
 
             # TensorFlow
-            train_tensorflow(X_train, y_train, X_test, y_test, name, task_type='regression')
+            tf_models[name] = train_tensorflow(X_train, y_train, X_test, y_test, name, task_type='regression', model_dir=model_dir)
 
         else:
             # Classification (Rain)
-            xgb = XGBClassifier(n_estimators=100, learning_rate=0.1, random_state=42)
+            xgb = XGBClassifier(**xgb_params, random_state=42)
             xgb.fit(X_train, y_train)
             preds = xgb.predict(X_test)
             probs = xgb.predict_proba(X_test)[:, 1]
             acc = accuracy_score(y_test, preds)
             auc = roc_auc_score(y_test, probs)
             print(f"XGBoost Accuracy: {acc:.4f}, AUC: {auc:.4f}")
-            joblib.dump(xgb, os.path.join(MODEL_DIR, f"xgb_{name}.pkl"))
+            xgb_entry['holdout'] = {'accuracy': float(acc), 'auc': float(auc)}
+            joblib.dump(xgb, os.path.join(model_dir, f"xgb_{name}.pkl"))
 
             # TensorFlow
-            train_tensorflow(X_train, y_train, X_test, y_test, name, task_type='classification')
+            tf_models[name] = train_tensorflow(X_train, y_train, X_test, y_test, name, task_type='classification', model_dir=model_dir)
+
+    export_onnx_bundles(feature_cols, seq_len, lstm_models, tf_models, model_dir)
+
+    with open(os.path.join(model_dir, MODEL_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    publish_version(model_dir, version, MODEL_DIR, keep=keep)
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train weather forecast models")
+    parser.add_argument("--seq-len", type=int, default=SEQ_LEN, help="Days of context per LSTM sample")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="LSTM mini-batch size")
+    parser.add_argument("--keep", type=int, default=KEEP_VERSIONS, help="Model versions to keep for rollback")
+    args = parser.parse_args()
+
+    train_model(seq_len=args.seq_len, batch_size=args.batch_size, keep=args.keep)
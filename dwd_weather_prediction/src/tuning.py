@@ -0,0 +1,234 @@
+import numpy as np
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from datetime import datetime
+from sklearn.metrics import mean_absolute_error, log_loss
+import argparse
+import json
+import math
+import os
+import time
+
+from feature_store import FeatureStore, MODEL_TARGETS, STORE_DIR, current_version
+
+MODEL_DIR = "models"
+SEARCH_FILE = "xgb_search.json"
+
+# Walk-forward CV: expanding training window, validation blocks in chronological order.
+# The gap purges training rows whose 7-day-ahead targets overlap the validation block.
+N_FOLDS = 5
+FOLD_GAP = 7
+
+# Successive halving: every candidate gets MIN_ROUNDS boosting rounds, the best
+# 1/HALVING_FACTOR move on with HALVING_FACTOR times the rounds, up to MAX_ROUNDS.
+# Survivors continue their previous rung's boosters rather than retraining from zero.
+N_CANDIDATES = 27
+MIN_ROUNDS = 50
+MAX_ROUNDS = 450
+HALVING_FACTOR = 3
+
+SEARCH_SPACE = {
+    'max_depth': [3, 4, 6, 8],
+    'learning_rate': [0.02, 0.05, 0.1, 0.2],
+    'subsample': [0.6, 0.8, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'min_child_weight': [1, 3, 10],
+    'reg_lambda': [0.5, 1.0, 5.0],
+}
+
+OBJECTIVES = {
+    'regression': {'objective': 'reg:squarederror'},
+    'classification': {'objective': 'binary:logistic'},
+}
+METRICS = {'regression': 'mae', 'classification': 'logloss'}
+
+def walk_forward_folds(n_rows, n_folds=N_FOLDS, gap=FOLD_GAP):
+    """(train_end, valid_start, valid_end) row positions for each expanding-window fold."""
+    block = n_rows // (n_folds + 1)
+    folds = []
+    for k in range(1, n_folds + 1):
+        valid_start = k * block
+        valid_end = n_rows if k == n_folds else valid_start + block
+        train_end = valid_start - gap
+        if train_end > 0 and valid_end > valid_start:
+            folds.append((train_end, valid_start, valid_end))
+    return folds
+
+def halving_rungs(min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS, factor=HALVING_FACTOR):
+    """Boosting rounds per rung, e.g. [50, 150, 450]."""
+    rungs = [min_rounds]
+    while rungs[-1] < max_rounds:
+        rungs.append(min(rungs[-1] * factor, max_rounds))
+    return rungs
+
+def sample_candidates(n=N_CANDIDATES, seed=42):
+    """Distinct random configurations from SEARCH_SPACE."""
+    rng = np.random.default_rng(seed)
+    n = min(n, math.prod(len(v) for v in SEARCH_SPACE.values()))
+    candidates = []
+    seen = set()
+    while len(candidates) < n:
+        params = {key: values[rng.integers(len(values))] for key, values in SEARCH_SPACE.items()}
+        key = tuple(params.values())
+        if key not in seen:
+            seen.add(key)
+            candidates.append({k: v.item() if hasattr(v, 'item') else v for k, v in params.items()})
+    return candidates
+
+def valid_rows(store, target_col):
+    """Positions of rows with complete features and a known target, like train_model()."""
+    return np.flatnonzero(~np.isnan(store.features()).any(axis=1) & ~np.isnan(store.column(target_col)))
+
+# Per-worker state: the mapped store and the DMatrix pairs built so far, keyed by (target, fold)
+_store = None
+_dmatrix_cache = {}
+
+def _init_worker(store_path):
+    global _store
+    _store = FeatureStore(store_path)
+
+def _fold_dmatrices(target_col, fold):
+    """Build a fold's train/valid DMatrix once per worker and reuse it for every candidate and rung."""
+    key = (target_col, fold)
+    if key not in _dmatrix_cache:
+        rows = valid_rows(_store, target_col)
+        train_end, valid_start, valid_end = walk_forward_folds(len(rows))[fold]
+        X = _store.features()
+        y = _store.column(target_col)
+        train_rows, eval_rows = rows[:train_end], rows[valid_start:valid_end]
+        _dmatrix_cache[key] = (
+            xgb.DMatrix(X[train_rows], label=y[train_rows], feature_names=_store.feature_cols),
+            xgb.DMatrix(X[eval_rows], label=y[eval_rows], feature_names=_store.feature_cols),
+            y[eval_rows]
+        )
+    return _dmatrix_cache[key]
+
+def _evaluate_fold(target_col, task_type, params, num_rounds, fold, prev_model=None):
+    """
+    Validation score (lower is better) of one candidate on one fold after `num_rounds`
+    boosting rounds, and the booster as raw bytes. `prev_model` (raw bytes of the previous
+    rung's booster) is trained on for the missing rounds instead of starting over.
+    """
+    dtrain, dvalid, y_valid = _fold_dmatrices(target_col, fold)
+    # One thread per task, the pool provides the parallelism
+    train_params = {**params, **OBJECTIVES[task_type], 'nthread': 1, 'seed': 42}
+    booster = None if prev_model is None else xgb.Booster(train_params, model_file=bytearray(prev_model))
+    done = 0 if booster is None else booster.num_boosted_rounds()
+    booster = xgb.train(train_params, dtrain, num_boost_round=num_rounds - done, xgb_model=booster)
+    preds = booster.predict(dvalid)
+    if task_type == 'regression':
+        score = mean_absolute_error(y_valid, preds)
+    else:
+        score = log_loss(y_valid, preds, labels=[0, 1])
+    return score, bytes(booster.save_raw("ubj"))
+
+def search(store_dir=STORE_DIR, n_candidates=N_CANDIDATES, max_workers=None, targets=None):
+    """
+    Successive-halving search over walk-forward CV for every XGBoost target.
+
+    All (target, candidate, fold) evaluations of a rung run in one process pool; each
+    worker maps the feature store itself, so no data is pickled to the workers. Boosters
+    travel back as raw bytes and the survivors' are sent out again, so each rung only
+    trains the rounds added since the last one.
+    Returns the search report with the best configuration per target.
+    """
+    version = current_version(store_dir)
+    if version is None:
+        raise FileNotFoundError(f"No feature store published in {store_dir}")
+    store_path = os.path.join(store_dir, version)
+    store = FeatureStore(store_path)
+
+    targets = {
+        name: spec for name, spec in MODEL_TARGETS.items()
+        if spec[0] in store.target_cols and (targets is None or name in targets)
+    }
+    n_folds = {name: len(walk_forward_folds(len(valid_rows(store, target_col)))) for name, (target_col, _) in targets.items()}
+    candidates = sample_candidates(n_candidates)
+    rungs = halving_rungs()
+
+    print(f"Searching {len(candidates)} candidates x {len(targets)} targets, rungs {rungs}, "
+          f"feature store version {version}")
+    start = time.perf_counter()
+
+    survivors = {name: list(range(len(candidates))) for name in targets if n_folds[name] > 0}
+    leaderboard = {name: [] for name in survivors}
+    boosters = {}  # (target, candidate, fold) -> raw booster of the last rung, survivors only
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(store_path,)) as pool:
+        for rung, num_rounds in enumerate(rungs):
+            futures = []
+            for name, candidate_ids in survivors.items():
+                target_col, task_type = targets[name]
+                for c in candidate_ids:
+                    for fold in range(n_folds[name]):
+                        future = pool.submit(_evaluate_fold, target_col, task_type, candidates[c], num_rounds, fold,
+                                             boosters.get((name, c, fold)))
+                        futures.append((name, c, fold, future))
+
+            fold_scores = defaultdict(list)
+            boosters = {}
+            for name, c, fold, future in futures:
+                score, boosters[(name, c, fold)] = future.result()
+                fold_scores[(name, c)].append(score)
+
+            for name, candidate_ids in survivors.items():
+                scores = {c: float(np.mean(fold_scores[(name, c)])) for c in candidate_ids}
+                ranked = sorted(candidate_ids, key=scores.get)
+                leaderboard[name] = [{'candidate': c, 'n_estimators': num_rounds, 'cv_score': scores[c]} for c in ranked]
+                survivors[name] = ranked[:max(1, math.ceil(len(ranked) / HALVING_FACTOR))]
+            # Only the survivors' boosters are continued in the next rung
+            boosters = {key: raw for key, raw in boosters.items() if key[1] in survivors[key[0]]}
+
+            print(f"Rung {rung} ({num_rounds} rounds): {len(futures)} fold fits, "
+                  f"{time.perf_counter() - start:.1f}s elapsed")
+
+    results = {}
+    for name, board in leaderboard.items():
+        best = board[0]
+        results[name] = {
+            'params': candidates[best['candidate']],
+            'n_estimators': best['n_estimators'],
+            'metric': METRICS[targets[name][1]],
+            'cv_score': best['cv_score'],
+            'leaderboard': [{**entry, 'params': candidates[entry['candidate']]} for entry in board[:5]]
+        }
+        print(f"{name}: {results[name]['metric']}={best['cv_score']:.4f} with {results[name]['params']}, "
+              f"{best['n_estimators']} rounds")
+
+    elapsed = time.perf_counter() - start
+    print(f"Search finished in {elapsed:.1f}s")
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'feature_store_version': version,
+        'n_folds': N_FOLDS,
+        'fold_gap': FOLD_GAP,
+        'rungs': rungs,
+        'n_candidates': len(candidates),
+        'elapsed_sec': elapsed,
+        'targets': results
+    }
+
+def load_search_results(model_dir=MODEL_DIR):
+    """Best XGBoost configuration per target from the last search, or {} if none was run."""
+    path = os.path.join(model_dir, SEARCH_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)['targets']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward CV hyperparameter search for the XGBoost targets")
+    parser.add_argument("--candidates", type=int, default=N_CANDIDATES, help="Number of sampled configurations")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--targets", nargs="*", default=None, help="Only search these targets, e.g. temp_min_day_1")
+    args = parser.parse_args()
+
+    report = search(n_candidates=args.candidates, max_workers=args.workers, targets=args.targets)
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    tmp_path = os.path.join(MODEL_DIR, f".{SEARCH_FILE}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, os.path.join(MODEL_DIR, SEARCH_FILE))
+    print(f"Saved search results to {os.path.join(MODEL_DIR, SEARCH_FILE)}")